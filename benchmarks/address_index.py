@@ -0,0 +1,57 @@
+# compares find_utxos against the full utxo set scan it used to do.
+# run with `python -m benchmarks.address_index`
+
+import itertools
+
+from domepieces import Transaction, TransactionOutput, generate_address, select_coins
+
+from .common import new_chain, next_block, timed
+
+ADDRESSES = 10_000
+UTXOS = 100_000
+OUTPUTS_PER_BLOCK = 1_000
+LOOKUPS = 1_000
+
+
+def main() -> None:
+    addresses = [generate_address() for _ in range(ADDRESSES)]
+    recipients = itertools.cycle(addresses)
+    chain = new_chain()
+
+    for _ in range(UTXOS // OUTPUTS_PER_BLOCK):
+        coinbase = Transaction(
+            height=len(chain),
+            inputs=[],
+            outputs=[
+                TransactionOutput(next(recipients), amount=100)
+                for _ in range(OUTPUTS_PER_BLOCK)
+            ],
+        )
+        chain.add_block(next_block(chain.head, [coinbase]))
+
+    print(f"{len(chain.utxos):,} utxos over {ADDRESSES:,} addresses")
+
+    def scan() -> None:
+        for address in addresses[:LOOKUPS]:
+            select_coins(
+                spend_target=150,
+                available_utxos=[
+                    utxo
+                    for utxo in chain.iter_utxos()
+                    if utxo.output.recipient == address
+                ],
+            )
+
+    def indexed() -> None:
+        for address in addresses[:LOOKUPS]:
+            chain.find_utxos(address, amount=150)
+
+    _, scan_seconds = timed(scan)
+    _, indexed_seconds = timed(indexed)
+
+    print(f"scan:    {LOOKUPS / scan_seconds:12,.0f} lookups/s")
+    print(f"indexed: {LOOKUPS / indexed_seconds:12,.0f} lookups/s")
+
+
+if __name__ == "__main__":
+    main()
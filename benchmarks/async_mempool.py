@@ -0,0 +1,112 @@
+# compares ways for an asyncio process to take bursts of submissions into the mempool:
+# writing each one from the event loop, writing each one on an executor, and an
+# AsyncMempool coalescing them into write batches. every write is synced to disk.
+# run with `python -m benchmarks.async_mempool`
+
+import asyncio
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Coroutine
+
+from domepieces import AsyncMempool, Mempool, PendingTransaction, generate_address
+
+SUBMITTERS = 20
+BURSTS = 5
+BURST_SIZE = 50
+TICK = 0.001
+
+Submit = Callable[[PendingTransaction], Awaitable[None]]
+Method = Callable[[Mempool], Coroutine[Any, Any, float]]
+
+
+async def submitter(submit: Submit) -> None:
+    sender = generate_address()
+    recipient = generate_address()
+    for _ in range(BURSTS):
+        for amount in range(BURST_SIZE):
+            await submit(PendingTransaction(sender, recipient, amount, fee=amount))
+        await asyncio.sleep(0.01)
+
+
+async def measure_lag(stop: asyncio.Event) -> float:
+    """
+    Returns the longest the event loop took to wake a task that slept for a tick.
+    """
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        worst = max(worst, time.perf_counter() - start - TICK)
+    return worst
+
+
+async def submit_all(submit: Submit) -> float:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_lag(stop))
+    await asyncio.gather(*(submitter(submit) for _ in range(SUBMITTERS)))
+    stop.set()
+    return await lag
+
+
+def run(method: Method) -> tuple[float, float]:
+    """
+    Returns how many transactions per second were written, and the worst event loop
+    lag seen while doing it.
+    """
+    path = tempfile.mkdtemp()
+    try:
+        with Mempool(path) as pool:
+            start = time.perf_counter()
+            lag = asyncio.run(method(pool))
+            seconds = time.perf_counter() - start
+            assert len(pool) == SUBMITTERS * BURSTS * BURST_SIZE
+    finally:
+        shutil.rmtree(path)
+
+    return SUBMITTERS * BURSTS * BURST_SIZE / seconds, lag
+
+
+async def in_event_loop(pool: Mempool) -> float:
+    async def submit(transaction: PendingTransaction) -> None:
+        pool.create_transactions([transaction], sync=True)
+
+    return await submit_all(submit)
+
+
+async def on_executor(pool: Mempool) -> float:
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        async def submit(transaction: PendingTransaction) -> None:
+            await loop.run_in_executor(
+                executor, lambda: pool.create_transactions([transaction], sync=True)
+            )
+
+        return await submit_all(submit)
+
+
+async def coalesced(pool: Mempool) -> float:
+    async with AsyncMempool(pool, queue_size=1_000, sync=True) as async_pool:
+        return await submit_all(async_pool.submit)
+
+
+def main() -> None:
+    total = SUBMITTERS * BURSTS * BURST_SIZE
+    print(f"{SUBMITTERS} submitters, {BURSTS} bursts of {BURST_SIZE}, {total:,} total")
+
+    methods: dict[str, Method] = {
+        "write in event loop": in_event_loop,
+        "write on executor": on_executor,
+        "AsyncMempool": coalesced,
+    }
+    for name, method in methods.items():
+        rate, lag = run(method)
+        print(
+            f"{name + ':':<20} {rate:9,.0f} tx/s  worst loop lag {lag * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# compares building a block from a mempool that reserved coins for its transactions
+# when they were admitted against one that leaves picking coins to the miner.
+# run with `python -m benchmarks.block_building`
+
+import random
+import shutil
+import tempfile
+from typing import Optional
+
+from domepieces import (
+    Blockchain,
+    Mempool,
+    Miner,
+    PendingTransaction,
+    Transaction,
+    TransactionOutput,
+    generate_address,
+)
+
+from .common import new_chain, next_block, timed
+
+SENDERS = 200
+COINS_PER_SENDER = 20
+TRANSACTIONS_PER_SENDER = 5
+
+
+def fund(senders: list[str]) -> Blockchain:
+    rng = random.Random(0)
+    chain = new_chain()
+    coinbase = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[
+            TransactionOutput(sender, rng.randrange(1_000, 100_000))
+            for sender in senders
+            for _ in range(COINS_PER_SENDER)
+        ],
+    )
+    chain.add_block(next_block(chain.head, [coinbase]))
+    return chain
+
+
+def run(checked: bool) -> tuple[float, float, int]:
+    """
+    Returns how long it took to admit every transaction and to mine a block of them,
+    and how many transactions the block holds.
+    """
+    senders = [generate_address() for _ in range(SENDERS)]
+    chain = fund(senders)
+    recipient = generate_address()
+    transactions = [
+        PendingTransaction(sender, recipient, 500, fee=i)
+        for i in range(TRANSACTIONS_PER_SENDER)
+        for sender in senders
+    ]
+
+    path = tempfile.mkdtemp()
+    try:
+        blockchain: Optional[Blockchain] = chain if checked else None
+        with Mempool(path, blockchain=blockchain) as pool:
+            _, admit_seconds = timed(lambda: pool.create_transactions(transactions))
+
+            miner = Miner(mempool=pool, blockchain=chain, address=recipient)
+            block, mine_seconds = timed(miner.mine)
+            chain.add_block(block)
+    finally:
+        shutil.rmtree(path)
+
+    return admit_seconds, mine_seconds, len(block.transactions) - 1
+
+
+def main() -> None:
+    total = SENDERS * TRANSACTIONS_PER_SENDER
+    print(
+        f"{total:,} pending transactions from {SENDERS} senders "
+        f"with {COINS_PER_SENDER} coins each"
+    )
+
+    for name, checked in (
+        ("picked by the miner", False),
+        ("reserved on admission", True),
+    ):
+        admit, mine, included = run(checked)
+        print(
+            f"{name + ':':<22} admit {admit * 1000:7.1f} ms  "
+            f"build and mine block {mine * 1000:7.1f} ms  ({included:,} included)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# replays the same synthetic wallet workload against each coin selection strategy and
+# reports selection latency, inputs per payment and how the wallet's utxo set grows.
+# run with `python -m benchmarks.coin_selection`
+
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from domepieces import (
+    STRATEGIES,
+    UTXO,
+    CoinSelector,
+    Transaction,
+    TransactionOutput,
+    generate_address,
+)
+
+SEED = 1234
+STEPS = 5_000
+INITIAL_DEPOSITS = 200
+DEPOSIT_PROBABILITY = 0.5
+
+# payments are typically a bit smaller than deposits, so the wallet slowly grows
+DEPOSIT_MU = 10.0
+PAYMENT_MU = 9.5
+
+# how often to record the size of the utxo set
+SAMPLE_INTERVAL = STEPS // 10
+
+
+@dataclass
+class Report:
+    latencies: list[float] = field(default_factory=list)
+    inputs: list[int] = field(default_factory=list)
+    utxo_counts: list[int] = field(default_factory=list)
+    change_outputs: int = 0
+    failures: int = 0
+
+
+def random_amount(rng: random.Random, mu: float) -> int:
+    # lots of small amounts, a few large ones
+    return int(rng.lognormvariate(mu, 1.5)) + 1
+
+
+def new_utxo(address: str, amount: int) -> UTXO:
+    return UTXO(
+        Transaction(height=0, inputs=[], outputs=[TransactionOutput(address, amount)]),
+        output_index=0,
+    )
+
+
+def simulate(coin_selector: CoinSelector, address: str) -> Report:
+    rng = random.Random(SEED)
+    report = Report()
+
+    # keyed by id so selected utxos can be removed cheaply
+    wallet: dict[int, UTXO] = {}
+    for _ in range(INITIAL_DEPOSITS):
+        utxo = new_utxo(address, random_amount(rng, DEPOSIT_MU))
+        wallet[id(utxo)] = utxo
+
+    balance = sum(utxo.output.amount for utxo in wallet.values())
+
+    for step in range(STEPS):
+        if step % SAMPLE_INTERVAL == 0:
+            report.utxo_counts.append(len(wallet))
+
+        # draw both up front so every strategy sees the same workload
+        is_deposit = rng.random() < DEPOSIT_PROBABILITY
+        amount = random_amount(rng, DEPOSIT_MU if is_deposit else PAYMENT_MU)
+
+        if is_deposit or amount > balance:
+            utxo = new_utxo(address, amount)
+            wallet[id(utxo)] = utxo
+            balance += amount
+            continue
+
+        start = time.perf_counter()
+        selected_utxos = coin_selector(amount, list(wallet.values()))
+        report.latencies.append(time.perf_counter() - start)
+
+        if not selected_utxos:
+            report.failures += 1
+            continue
+
+        report.inputs.append(len(selected_utxos))
+        for utxo in selected_utxos:
+            del wallet[id(utxo)]
+
+        change = sum(utxo.output.amount for utxo in selected_utxos) - amount
+        if change:
+            utxo = new_utxo(address, change)
+            wallet[id(utxo)] = utxo
+            report.change_outputs += 1
+
+        balance -= amount
+
+    report.utxo_counts.append(len(wallet))
+    return report
+
+
+def main() -> None:
+    address = generate_address()
+
+    print(f"{STEPS:,} steps, {INITIAL_DEPOSITS} initial deposits")
+    print(
+        f"{'strategy':<16} {'mean us':>9} {'p99 us':>9} {'inputs':>7} "
+        f"{'change':>7} {'failed':>7}  utxo set size over time"
+    )
+
+    for name, coin_selector in STRATEGIES.items():
+        report = simulate(coin_selector, address)
+
+        latencies = sorted(report.latencies)
+        mean = statistics.mean(latencies) * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        inputs = statistics.mean(report.inputs)
+        growth = " ".join(str(count) for count in report.utxo_counts)
+
+        print(
+            f"{name:<16} {mean:9.1f} {p99:9.1f} {inputs:7.2f} "
+            f"{report.change_outputs:7} {report.failures:7}  {growth}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import time
+from typing import Callable, TypeVar
+
+from domepieces import (
+    Block,
+    Blockchain,
+    Difficulty,
+    Target,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+)
+
+T = TypeVar("T")
+
+# lets benchmarks add blocks without mining them
+NO_DIFFICULTY = Difficulty(initial_target=Target.from_bits(0))
+
+
+def next_block(parent: Block, transactions: list[Transaction]) -> Block:
+    """
+    Builds an unmined child of the given block. Blocks are timestamped exactly on
+    schedule, so the target never changes.
+    """
+    return Block(
+        height=parent.height + 1,
+        proof=0,
+        transactions=transactions,
+        previous=parent.hash,
+        timestamp=parent.timestamp + NO_DIFFICULTY.block_time,
+    )
+
+
+def pass_on_block(parent: Block, outputs: list[TransactionOutput]) -> Block:
+    """
+    Builds an unmined child of the given block whose coinbase pays the given outputs.
+    The rest of the block passes on each output of the parent's coinbase but the
+    first, so a block has as many transactions as its coinbase has outputs.
+    """
+    height = parent.height + 1
+    coinbase = Transaction(height=height, inputs=[], outputs=outputs)
+    previous = parent.transactions[0]
+    spends = [
+        Transaction(
+            height=height,
+            inputs=[TransactionInput(previous.hash, i)],
+            outputs=[previous.outputs[i]],
+        )
+        for i in range(1, len(previous.outputs))
+    ]
+    return next_block(parent, [coinbase, *spends])
+
+
+def new_chain() -> Blockchain:
+    return Blockchain(NO_DIFFICULTY)
+
+
+def timed(func: Callable[[], T]) -> tuple[T, float]:
+    """
+    Calls func and returns its result along with how many seconds it took.
+    """
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
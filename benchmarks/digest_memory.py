@@ -0,0 +1,42 @@
+# compares the memory taken by a million utxo outpoints keyed by hex string hashes
+# against the same outpoints keyed by raw digests.
+# run with `python -m benchmarks.digest_memory`
+
+import os
+import tracemalloc
+from typing import Callable, Hashable
+
+from domepieces import Digest
+from domepieces.encoding import DIGEST_SIZE
+
+UTXOS = 1_000_000
+
+
+def measure(make_hash: Callable[[bytes], Hashable]) -> int:
+    """
+    Returns how many bytes a dict of outpoints takes when built with the given hash
+    representation. Each outpoint has its own transaction, which is the worst case.
+    """
+    raw_hashes = [os.urandom(DIGEST_SIZE) for _ in range(UTXOS)]
+
+    tracemalloc.start()
+    outpoints = {(make_hash(raw), 0): None for raw in raw_hashes}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(outpoints) == UTXOS
+    return size
+
+
+def main() -> None:
+    hex_size = measure(lambda raw: raw.hex())
+    digest_size = measure(Digest)
+
+    print(f"{UTXOS:,} outpoints")
+    print(f"hex strings: {hex_size / 2 ** 20:8.1f} MiB")
+    print(f"digests:     {digest_size / 2 ** 20:8.1f} MiB")
+    print(f"saved:       {(hex_size - digest_size) / 2 ** 20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# measures add_block and find_utxos throughput with and without hash caching.
+# run with `python -m benchmarks.hash_cache`
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from domepieces import Block, Transaction, TransactionOutput, generate_address
+
+from .common import new_chain, pass_on_block
+
+BLOCKS = 50
+TRANSACTIONS_PER_BLOCK = 100
+LOOKUPS = 200
+
+
+@contextmanager
+def uncached() -> Iterator[None]:
+    """
+    Temporarily swaps the cached hash properties for plain ones, restoring the old
+    recompute-on-every-access behaviour.
+    """
+    originals = {cls: cls.__dict__["hash"] for cls in (Transaction, Block)}
+    try:
+        for cls, cached in originals.items():
+            setattr(cls, "hash", property(cached.func))
+        yield
+    finally:
+        for cls, cached in originals.items():
+            setattr(cls, "hash", cached)
+
+
+def build_blocks(addresses: list[str]) -> list[Block]:
+    blocks: list[Block] = []
+    previous = Block.genesis()
+
+    for _ in range(BLOCKS):
+        block = pass_on_block(
+            previous,
+            [
+                TransactionOutput(addresses[i % len(addresses)], i + 1)
+                for i in range(TRANSACTIONS_PER_BLOCK)
+            ],
+        )
+        blocks.append(block)
+        previous = block
+
+    return blocks
+
+
+def run(addresses: list[str]) -> tuple[float, float]:
+    # blocks are rebuilt for every run so no hashes are carried over between runs
+    blocks = build_blocks(addresses)
+    chain = new_chain()
+
+    start = time.perf_counter()
+    for block in blocks:
+        chain.add_block(block)
+    add_block_rate = len(blocks) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        chain.find_utxos(addresses[i % len(addresses)], amount=1)
+    find_utxos_rate = LOOKUPS / (time.perf_counter() - start)
+
+    return add_block_rate, find_utxos_rate
+
+
+def main() -> None:
+    addresses = [generate_address() for _ in range(100)]
+
+    print(f"{BLOCKS} blocks x {TRANSACTIONS_PER_BLOCK} transactions")
+
+    with uncached():
+        add_block_rate, find_utxos_rate = run(addresses)
+    print(
+        f"uncached: {add_block_rate:10.1f} blocks/s {find_utxos_rate:10.1f} lookups/s"
+    )
+
+    add_block_rate, find_utxos_rate = run(addresses)
+    print(
+        f"cached:   {add_block_rate:10.1f} blocks/s {find_utxos_rate:10.1f} lookups/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
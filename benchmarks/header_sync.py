@@ -0,0 +1,73 @@
+# measures how fast a header chain ingests headers, both decoded and straight from
+# their serialized form, against syncing the same chain as full blocks.
+# run with `python -m benchmarks.header_sync`
+
+import gc
+
+from domepieces import (
+    Block,
+    HeaderChain,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.serialization import decode_headers, encode_block, encode_headers
+
+from .common import NO_DIFFICULTY, new_chain, pass_on_block, timed
+
+HEADERS = 50_000
+
+# only a slice of the chain is synced as full blocks, which is much slower
+BLOCKS = 2_000
+TRANSACTIONS_PER_BLOCK = 10
+
+
+def build_blocks(count: int) -> list[Block]:
+    addresses = [generate_address() for _ in range(TRANSACTIONS_PER_BLOCK)]
+    blocks = [Block.genesis()]
+
+    for _ in range(count):
+        height = blocks[-1].height + 1
+        outputs = [TransactionOutput(address, height) for address in addresses]
+        blocks.append(pass_on_block(blocks[-1], outputs))
+
+    return blocks
+
+
+def main() -> None:
+    blocks = build_blocks(HEADERS)
+    encoded_headers = encode_headers(block.header for block in blocks[1:])
+    encoded_blocks = [encode_block(block) for block in blocks[1 : BLOCKS + 1]]
+    tip_hash = blocks[-1].hash
+    block_tip_hash = blocks[BLOCKS].hash
+
+    # a header client never holds the full blocks, and keeping them alive would
+    # only slow down the garbage collector during the runs
+    del blocks
+    gc.collect()
+
+    print(
+        f"{HEADERS:,} headers ({len(encoded_headers) / HEADERS:.0f} bytes each), "
+        f"{TRANSACTIONS_PER_BLOCK} transactions per block"
+    )
+
+    headers = decode_headers(encoded_headers)
+    chain = HeaderChain(NO_DIFFICULTY)
+    _, seconds = timed(lambda: chain.add_headers(headers))
+    assert chain.tip.hash == tip_hash
+    print(f"decoded headers:    {HEADERS / seconds:9,.0f} headers/s")
+
+    del headers, chain
+    chain = HeaderChain(NO_DIFFICULTY)
+    _, seconds = timed(lambda: chain.add_headers(decode_headers(encoded_headers)))
+    assert chain.tip.hash == tip_hash
+    print(f"serialized headers: {HEADERS / seconds:9,.0f} headers/s")
+
+    del chain
+    block_chain = new_chain()
+    _, seconds = timed(lambda: block_chain.sync(encoded_blocks))
+    assert block_chain.head.hash == block_tip_hash
+    print(f"serialized blocks:  {BLOCKS / seconds:9,.0f} blocks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# measures a synthetic initial sync from serialized blocks, checking blocks on the
+# main thread, a thread pool and a process pool.
+# with a single cpu, the pools only add overhead.
+# run with `python -m benchmarks.initial_sync`
+
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+from domepieces import (
+    Block,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.serialization import encode_block
+
+from .common import new_chain, next_block, timed
+
+T = TypeVar("T")
+
+BLOCKS = 200
+TRANSACTIONS_PER_BLOCK = 200
+
+
+def build_blocks() -> list[bytes]:
+    """
+    Builds a chain where every block pays a coinbase to many addresses, and spends
+    each of its parent's coinbase outputs in its own transaction.
+    """
+    addresses = [generate_address() for _ in range(TRANSACTIONS_PER_BLOCK)]
+    chain = new_chain()
+    encoded: list[bytes] = []
+
+    for _ in range(BLOCKS):
+        parent = chain.head
+        height = parent.height + 1
+        transactions = [
+            Transaction(
+                height=height,
+                inputs=[],
+                outputs=[TransactionOutput(address, 100) for address in addresses],
+            )
+        ]
+
+        if parent.height > 0:
+            parent_coinbase = parent.transactions[0]
+            transactions += [
+                Transaction(
+                    height=height,
+                    inputs=[TransactionInput(parent_coinbase.hash, output_index)],
+                    outputs=[TransactionOutput(address, 100)],
+                )
+                for output_index, address in enumerate(addresses)
+            ]
+
+        block = next_block(parent, transactions)
+        chain.add_block(block)
+        encoded.append(encode_block(block))
+
+    return encoded
+
+
+class ReplayExecutor(Executor):
+    """
+    Runs work inline and records the results. Once replaying, it hands the recorded
+    results back instantly, as if there were always enough workers to keep up,
+    which shows the most that checking blocks in parallel could give.
+    """
+
+    def __init__(self) -> None:
+        self.results: list[Any] = []
+        self.replaying = False
+
+    def map(
+        self,
+        fn: Callable[..., T],
+        *iterables: Iterable[Any],
+        timeout: Optional[float] = None,
+        chunksize: int = 1,
+    ) -> Iterator[T]:
+        if not self.replaying:
+            results = list(map(fn, *iterables))
+            self.results += results
+            return iter(results)
+
+        count = len(list(iterables[0]))
+        results, self.results = self.results[:count], self.results[count:]
+        return iter(results)
+
+
+def sync(encoded: list[bytes], executor: Optional[Executor]) -> Block:
+    chain = new_chain()
+    chain.sync(encoded, executor=executor)
+    return chain.head
+
+
+def main() -> None:
+    workers = os.cpu_count() or 1
+    encoded = build_blocks()
+    print(
+        f"{BLOCKS} blocks, {TRANSACTIONS_PER_BLOCK * 2} transactions per block, "
+        f"{workers} cpus"
+    )
+
+    head, seconds = timed(lambda: sync(encoded, None))
+    print(f"sequential:            {BLOCKS / seconds:7.1f} blocks/s")
+
+    with ThreadPoolExecutor(workers) as threads:
+        thread_head, seconds = timed(lambda: sync(encoded, threads))
+    print(f"{workers} threads:             {BLOCKS / seconds:7.1f} blocks/s")
+
+    with ProcessPoolExecutor(workers) as processes:
+        # start the workers before timing
+        list(processes.map(abs, range(workers)))
+        process_head, seconds = timed(lambda: sync(encoded, processes))
+    print(f"{workers} processes:           {BLOCKS / seconds:7.1f} blocks/s")
+
+    replay = ReplayExecutor()
+    sync(encoded, replay)
+    replay.replaying = True
+    ideal_head, seconds = timed(lambda: sync(encoded, replay))
+    print(
+        f"unlimited workers:     {BLOCKS / seconds:7.1f} blocks/s (main process only)"
+    )
+
+    assert head == thread_head == process_head == ideal_head
+
+
+if __name__ == "__main__":
+    main()
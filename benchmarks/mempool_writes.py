@@ -0,0 +1,91 @@
+# compares adding and removing pending transactions one write at a time against
+# doing it in write batches, with and without syncing each write to disk.
+# run with `python -m benchmarks.mempool_writes`
+
+import shutil
+import tempfile
+from typing import Callable
+
+from domepieces import Mempool, PendingTransaction, generate_address
+
+from .common import timed
+
+TRANSACTIONS = 5_000
+BATCH_SIZE = 500
+
+
+def make_transactions() -> list[PendingTransaction]:
+    senders = [generate_address() for _ in range(100)]
+    recipient = generate_address()
+    return [
+        PendingTransaction(senders[i % 100], recipient, 10, fee=i % 1_000)
+        for i in range(TRANSACTIONS)
+    ]
+
+
+def batches(transactions: list[PendingTransaction]) -> list[list[PendingTransaction]]:
+    return [
+        transactions[start : start + BATCH_SIZE]
+        for start in range(0, len(transactions), BATCH_SIZE)
+    ]
+
+
+def run(
+    create: Callable[[Mempool, list[PendingTransaction]], None],
+    delete: Callable[[Mempool, list[PendingTransaction]], None],
+) -> tuple[float, float]:
+    """
+    Returns how many transactions per second create and delete got through.
+    """
+    path = tempfile.mkdtemp()
+    try:
+        with Mempool(path) as pool:
+            transactions = make_transactions()
+            _, create_seconds = timed(lambda: create(pool, transactions))
+            assert len(pool) == TRANSACTIONS
+
+            _, delete_seconds = timed(lambda: delete(pool, transactions))
+            assert len(pool) == 0
+    finally:
+        shutil.rmtree(path)
+
+    return TRANSACTIONS / create_seconds, TRANSACTIONS / delete_seconds
+
+
+def main() -> None:
+    print(f"{TRANSACTIONS:,} transactions, batches of {BATCH_SIZE}")
+
+    for sync in (False, True):
+
+        def create_one_by_one(pool: Mempool, txs: list[PendingTransaction]) -> None:
+            for transaction in txs:
+                pool.create_transactions([transaction], sync=sync)
+
+        def delete_one_by_one(pool: Mempool, txs: list[PendingTransaction]) -> None:
+            for transaction in txs:
+                pool.delete_transactions([transaction], sync=sync)
+
+        def create_batched(pool: Mempool, txs: list[PendingTransaction]) -> None:
+            for batch in batches(txs):
+                pool.create_transactions(batch, sync=sync)
+
+        def delete_batched(pool: Mempool, txs: list[PendingTransaction]) -> None:
+            for batch in batches(txs):
+                pool.delete_transactions(batch, sync=sync)
+
+        single = run(create_one_by_one, delete_one_by_one)
+        batched = run(create_batched, delete_batched)
+
+        label = "synced" if sync else "unsynced"
+        for name, (single_rate, batched_rate) in zip(
+            ("create", "delete"), zip(single, batched)
+        ):
+            print(
+                f"{label:<8} {name}: single {single_rate:9,.0f} tx/s  "
+                f"batched {batched_rate:9,.0f} tx/s  "
+                f"({batched_rate / single_rate:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# compares the memory taken by transactions and utxos before and after the models
+# were slotted and switched to tuples.
+# run with `python -m benchmarks.model_memory`
+
+import gc
+import tracemalloc
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable
+
+from domepieces import (
+    UTXO,
+    Digest,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.encoding import Encoder
+
+COUNT = 100_000
+
+
+# the models as they were: frozen dataclasses with an instance dict and lists
+@dataclass(frozen=True)
+class OldTransactionInput:
+    transaction: Digest
+    output_index: int
+
+
+@dataclass(frozen=True)
+class OldTransactionOutput:
+    recipient: str
+    amount: int
+
+
+@dataclass(frozen=True)
+class OldTransaction:
+    height: int
+    inputs: list[OldTransactionInput]
+    outputs: list[OldTransactionOutput]
+
+    @cached_property
+    def hash(self) -> Digest:
+        # only the size of the cached digest matters here
+        enc = Encoder()
+        enc.add_int(self.height)
+        return enc.digest()
+
+
+@dataclass(frozen=True)
+class OldUTXO:
+    transaction: OldTransaction
+    output_index: int
+
+
+def measure(build: Callable[[], list[Any]]) -> int:
+    """
+    Returns how many bytes the objects returned by build take up.
+    """
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert objects
+    return size
+
+
+def main() -> None:
+    # the shared parts are built up front, so only the models themselves are measured
+    recipients = [generate_address() for _ in range(1_000)]
+    spent_hash = Transaction(height=0, inputs=[], outputs=[]).hash
+
+    def old_transaction(i: int) -> OldTransaction:
+        transaction = OldTransaction(
+            height=1,
+            inputs=[OldTransactionInput(spent_hash, i)],
+            outputs=[
+                OldTransactionOutput(recipients[i % 1_000], i),
+                OldTransactionOutput(recipients[(i + 1) % 1_000], i),
+            ],
+        )
+        # every transaction has its hash cached once it's been validated
+        transaction.hash
+        return transaction
+
+    def new_transaction(i: int) -> Transaction:
+        transaction = Transaction(
+            height=1,
+            inputs=[TransactionInput(spent_hash, i)],
+            outputs=[
+                TransactionOutput(recipients[i % 1_000], i),
+                TransactionOutput(recipients[(i + 1) % 1_000], i),
+            ],
+        )
+        transaction.hash
+        return transaction
+
+    old_parent = old_transaction(0)
+    new_parent = new_transaction(0)
+
+    results = {
+        "transaction (1 in, 2 out)": (
+            measure(lambda: [old_transaction(i) for i in range(COUNT)]),
+            measure(lambda: [new_transaction(i) for i in range(COUNT)]),
+        ),
+        "utxo": (
+            measure(lambda: [OldUTXO(old_parent, i) for i in range(COUNT)]),
+            measure(lambda: [UTXO(new_parent, i) for i in range(COUNT)]),
+        ),
+    }
+
+    print(f"{COUNT:,} of each")
+    for name, (old, new) in results.items():
+        print(
+            f"{name:<26} before {old / COUNT:6.0f} B  "
+            f"after {new / COUNT:6.0f} B  "
+            f"({1 - new / old:.0%} smaller)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# compares the original per-nonce Block construction loop against ProofOfWork.
+# the engine only hashes the merkle root, so its hashrate doesn't depend on how many
+# transactions the block has.
+# run with `python -m benchmarks.proof_of_work`
+
+import itertools
+import time
+
+from domepieces import (
+    Block,
+    Digest,
+    Target,
+    Transaction,
+    TransactionOutput,
+    generate_address,
+    merkle_root,
+)
+from domepieces.proof_of_work import ProofOfWork
+
+ATTEMPTS = 20_000
+
+
+def naive_hashrate(transactions: list[Transaction], previous: Digest) -> float:
+    start = time.perf_counter()
+
+    # the loop Miner._mine_block used to run, with an impossible target
+    for proof in itertools.islice(itertools.count(), ATTEMPTS):
+        block = Block(
+            height=1,
+            proof=proof,
+            transactions=transactions,
+            previous=previous,
+        )
+
+        if Target(0).is_met_by(block.hash):
+            break
+
+    return ATTEMPTS / (time.perf_counter() - start)
+
+
+def engine_hashrate(transactions: list[Transaction], previous: Digest) -> float:
+    pow_engine = ProofOfWork(
+        height=1,
+        previous=previous,
+        merkle_root=merkle_root([transaction.hash for transaction in transactions]),
+        timestamp=0,
+        target=Target(0),
+    )
+    return pow_engine.mine(0, ATTEMPTS).hashrate
+
+
+def main() -> None:
+    previous = Block.genesis().hash
+
+    for count in (1, 10, 100, 1000):
+        transactions = [
+            Transaction(
+                height=1,
+                inputs=[],
+                outputs=[TransactionOutput(generate_address(), i + 1)],
+            )
+            for i in range(count)
+        ]
+
+        naive = naive_hashrate(transactions, previous)
+        engine = engine_hashrate(transactions, previous)
+        print(
+            f"{count:5} transactions: "
+            f"naive {naive:12,.0f} H/s  engine {engine:12,.0f} H/s  "
+            f"({engine / naive:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
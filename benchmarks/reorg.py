@@ -0,0 +1,98 @@
+# measures reorganizations of different depths, against rebuilding the utxo set from
+# genesis for the new chain.
+# run with `python -m benchmarks.reorg`
+
+from domepieces import (
+    Block,
+    Blockchain,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+
+from .common import new_chain, next_block, timed
+
+CHAIN_LENGTH = 500
+OUTPUTS_PER_BLOCK = 100
+DEPTHS = (1, 10, 100)
+
+
+def make_block(parent: Block, addresses: list[str]) -> Block:
+    """
+    Builds a block paying out to every address, which also spends half of its
+    parent's coinbase outputs so the block has inputs to undo.
+    """
+    height = parent.height + 1
+    coinbase = Transaction(
+        height=height,
+        inputs=[],
+        outputs=[TransactionOutput(address, 100) for address in addresses],
+    )
+
+    transactions = [coinbase]
+    if parent.height > 0:
+        parent_coinbase = parent.transactions[0]
+        transactions.append(
+            Transaction(
+                height=height,
+                inputs=[
+                    TransactionInput(parent_coinbase.hash, output_index)
+                    for output_index in range(0, len(addresses), 2)
+                ],
+                outputs=[TransactionOutput(addresses[0], 100 * len(addresses) // 2)],
+            )
+        )
+
+    return next_block(parent, transactions)
+
+
+def build_chain(addresses: list[str]) -> Blockchain:
+    chain = new_chain()
+    for _ in range(CHAIN_LENGTH):
+        chain.add_block(make_block(chain.head, addresses))
+    return chain
+
+
+def rebuild(blocks: list[Block]) -> None:
+    chain = new_chain()
+    for block in blocks[1:]:
+        chain.add_block(block)
+
+
+def main() -> None:
+    # separate addresses per branch, so sibling blocks never share a hash
+    main_addresses = [generate_address() for _ in range(OUTPUTS_PER_BLOCK)]
+    branch_addresses = [generate_address() for _ in range(OUTPUTS_PER_BLOCK)]
+
+    print(
+        f"{CHAIN_LENGTH} block chain, {OUTPUTS_PER_BLOCK} outputs per block "
+        f"({OUTPUTS_PER_BLOCK * CHAIN_LENGTH:,} utxos created)"
+    )
+
+    for depth in DEPTHS:
+        chain = build_chain(main_addresses)
+
+        # a branch one block longer than the blocks it replaces
+        branch = [chain.blocks[chain.head.height - depth]]
+        for _ in range(depth + 1):
+            branch.append(make_block(branch[-1], branch_addresses))
+
+        # all but the last branch block are only stored on the side
+        for block in branch[1:-1]:
+            chain.add_block(block)
+
+        _, reorg_seconds = timed(lambda: chain.add_block(branch[-1]))
+        assert chain.head == branch[-1]
+
+        _, rebuild_seconds = timed(lambda: rebuild(list(chain.blocks)))
+
+        print(
+            f"depth {depth:>3}: reorg {reorg_seconds * 1000:8.1f} ms  "
+            f"rebuild from genesis {rebuild_seconds * 1000:8.1f} ms  "
+            f"({rebuild_seconds / reorg_seconds:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
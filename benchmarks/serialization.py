@@ -0,0 +1,105 @@
+# compares the compact block format against asdict + msgpack and pickle.
+# run with `python -m benchmarks.serialization`
+
+import pickle
+from dataclasses import asdict
+from typing import Any, Callable
+
+import msgpack
+
+from domepieces import (
+    Block,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.serialization import decode_block, encode_block
+
+from .common import timed
+
+TRANSACTIONS_PER_BLOCK = 500
+ROUNDS = 50
+
+
+def make_block() -> Block:
+    genesis = Block.genesis()
+    return Block(
+        height=1,
+        proof=123456,
+        transactions=[
+            Transaction(
+                height=1,
+                inputs=[TransactionInput(genesis.transactions[0].hash, i)],
+                outputs=[
+                    TransactionOutput(generate_address(), 1_00000000 + i),
+                    TransactionOutput(generate_address(), 49_00000000 - i),
+                ],
+            )
+            for i in range(TRANSACTIONS_PER_BLOCK)
+        ],
+        previous=genesis.hash,
+        timestamp=1633046460,
+    )
+
+
+def asdict_encode(block: Block) -> bytes:
+    data: bytes = msgpack.packb(asdict(block))
+    return data
+
+
+def asdict_decode(data: bytes) -> Block:
+    fields = msgpack.unpackb(data)
+    fields["transactions"] = [
+        Transaction(
+            height=tx["height"],
+            inputs=[TransactionInput(**tx_input) for tx_input in tx["inputs"]],
+            outputs=[TransactionOutput(**output) for output in tx["outputs"]],
+        )
+        for tx in fields["transactions"]
+    ]
+    return Block(**fields)
+
+
+def pickle_encode(block: Block) -> bytes:
+    return pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def pickle_decode(data: bytes) -> Block:
+    block: Block = pickle.loads(data)
+    return block
+
+
+FORMATS: dict[str, tuple[Callable[[Block], bytes], Callable[[bytes], Block]]] = {
+    "asdict+msgpack": (asdict_encode, asdict_decode),
+    "pickle": (pickle_encode, pickle_decode),
+    "compact": (encode_block, decode_block),
+}
+
+
+def repeat(func: Callable[[Any], Any], arg: Any) -> None:
+    for _ in range(ROUNDS):
+        func(arg)
+
+
+def main() -> None:
+    print(f"block with {TRANSACTIONS_PER_BLOCK} transactions, {ROUNDS} rounds")
+
+    for name, (encode, decode) in FORMATS.items():
+        # fresh block each time so pickle doesn't get to reuse cached hashes
+        block = make_block()
+        data = encode(block)
+        assert decode(data) == block
+
+        _, encode_seconds = timed(lambda: repeat(encode, block))
+        _, decode_seconds = timed(lambda: repeat(decode, data))
+
+        print(
+            f"{name:<15} {len(data):>9,} bytes  "
+            f"encode {encode_seconds / ROUNDS * 1000:7.2f} ms  "
+            f"decode {decode_seconds / ROUNDS * 1000:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# compares the single random draw fallback against the version that reshuffled the
+# whole pool after every draw.
+# run with `python -m benchmarks.single_random_draw`
+
+import random
+from copy import copy
+from functools import partial
+
+from domepieces import UTXO, Transaction, TransactionOutput, generate_address
+from domepieces.coin_selection import _single_random_draw
+
+from .common import timed
+
+POOL_SIZES = [10_000, 100_000, 1_000_000]
+
+# the old version takes minutes beyond this
+MAX_QUADRATIC_POOL_SIZE = 100_000
+
+# dust outputs average 500, so this takes a few hundred draws
+SPEND_TARGET = 100_000
+
+
+def quadratic_single_random_draw(
+    spend_target: int, available_utxos: list[UTXO], rng: random.Random
+) -> list[UTXO]:
+    shuffled_pool = copy(available_utxos)
+    rng.shuffle(shuffled_pool)
+
+    selected_utxos: list[UTXO] = []
+
+    def sum_selected() -> int:
+        return sum(utxo.output.amount for utxo in selected_utxos)
+
+    while sum_selected() < spend_target:
+        if not shuffled_pool:
+            return []
+
+        selected_utxos.append(shuffled_pool.pop())
+        rng.shuffle(shuffled_pool)
+
+    return selected_utxos
+
+
+def main() -> None:
+    address = generate_address()
+
+    for size in POOL_SIZES:
+        # one transaction with lots of outputs keeps the pool cheap to build
+        transaction = Transaction(
+            height=0,
+            inputs=[],
+            outputs=[
+                TransactionOutput(address, random.randint(1, 1000)) for _ in range(size)
+            ],
+        )
+        pool = [UTXO(transaction, i) for i in range(size)]
+
+        _, linear = timed(
+            partial(_single_random_draw, SPEND_TARGET, pool, random.Random(1))
+        )
+
+        if size <= MAX_QUADRATIC_POOL_SIZE:
+            _, quadratic = timed(
+                partial(
+                    quadratic_single_random_draw, SPEND_TARGET, pool, random.Random(1)
+                )
+            )
+            old = f"{quadratic * 1000:10.1f} ms"
+        else:
+            old = "   skipped"
+
+        print(f"{size:>9,} utxos: old {old}  new {linear * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
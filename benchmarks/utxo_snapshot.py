@@ -0,0 +1,127 @@
+# compares bootstrapping a node's utxo set from a snapshot against replaying every
+# block from genesis, for both utxo stores.
+# run with `python -m benchmarks.utxo_snapshot`
+
+import io
+import shutil
+import tempfile
+import tracemalloc
+from typing import Callable
+
+from domepieces import (
+    Blockchain,
+    LevelDBUTXOStore,
+    MemoryBlockStore,
+    MemoryUTXOStore,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    UTXOStore,
+    generate_address,
+)
+from domepieces.snapshot import export_snapshot, import_snapshot
+from domepieces.storage import open_db
+
+from .common import NO_DIFFICULTY, next_block, timed
+
+BLOCKS = 200
+OUTPUTS_PER_BLOCK = 1_000
+
+
+def build_blocks() -> MemoryBlockStore:
+    """
+    Builds a chain where every block pays out to many addresses and spends half of
+    its parent's coinbase outputs, and returns its blocks.
+    """
+    addresses = [generate_address() for _ in range(OUTPUTS_PER_BLOCK)]
+    blocks = MemoryBlockStore()
+    chain = Blockchain(NO_DIFFICULTY, block_store=blocks)
+
+    for _ in range(BLOCKS):
+        parent = chain.head
+        height = parent.height + 1
+        transactions = [
+            Transaction(
+                height=height,
+                inputs=[],
+                outputs=[TransactionOutput(address, 100) for address in addresses],
+            )
+        ]
+        if parent.height > 0:
+            transactions.append(
+                Transaction(
+                    height=height,
+                    inputs=[
+                        TransactionInput(parent.transactions[0].hash, output_index)
+                        for output_index in range(0, OUTPUTS_PER_BLOCK, 2)
+                    ],
+                    outputs=[TransactionOutput(addresses[0], 50 * OUTPUTS_PER_BLOCK)],
+                )
+            )
+        chain.add_block(next_block(parent, transactions))
+
+    return blocks
+
+
+def replay(blocks: MemoryBlockStore, utxos: UTXOStore) -> None:
+    # an empty utxo store is caught up by applying every block from genesis
+    Blockchain(NO_DIFFICULTY, block_store=blocks, utxo_store=utxos)
+
+
+def into_leveldb(load: Callable[[UTXOStore], object]) -> tuple[float, int]:
+    """
+    Fills a new leveldb utxo store with load, and returns how many seconds it took and
+    the peak memory allocated while doing it, which is measured in a separate run.
+    """
+    results = []
+    for trace in (False, True):
+        path = tempfile.mkdtemp()
+        try:
+            with open_db(path) as db:
+                utxos = LevelDBUTXOStore(db)
+                if trace:
+                    tracemalloc.start()
+                _, seconds = timed(lambda: load(utxos))
+                results.append(tracemalloc.get_traced_memory()[1] if trace else seconds)
+                tracemalloc.stop()
+        finally:
+            shutil.rmtree(path)
+
+    seconds, peak = results
+    return seconds, int(peak)
+
+
+def main() -> None:
+    blocks = build_blocks()
+    source = MemoryUTXOStore()
+    replay(blocks, source)
+
+    file = io.BytesIO()
+    info, export_seconds = timed(lambda: export_snapshot(source, file))
+    snapshot = file.getvalue()
+
+    print(
+        f"{BLOCKS} blocks, {info.coin_count:,} coins, "
+        f"snapshot {len(snapshot) / 2**20:.1f} MiB "
+        f"(exported in {export_seconds:.2f} s)"
+    )
+
+    _, seconds = timed(lambda: replay(blocks, MemoryUTXOStore()))
+    print(f"memory store,  replay from genesis: {seconds:6.2f} s")
+    _, seconds = timed(lambda: import_snapshot(io.BytesIO(snapshot), MemoryUTXOStore()))
+    print(f"memory store,  import snapshot:     {seconds:6.2f} s")
+
+    loaders: dict[str, Callable[[UTXOStore], object]] = {
+        "replay from genesis": lambda utxos: replay(blocks, utxos),
+        "import snapshot": lambda utxos: import_snapshot(io.BytesIO(snapshot), utxos),
+    }
+    for name, load in loaders.items():
+        seconds, peak = into_leveldb(load)
+        print(
+            f"leveldb store, {name + ':':<20} {seconds:6.2f} s "
+            f"(peak {peak / 2**20:.1f} MiB allocated)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,73 @@
 from .address import generate_address
-from .block import Block
-from .blockchain import Blockchain, BlockMismatchError, TransactionError
-from .coin_selection import select_coins
-from .encoding import zero_hash
-from .mempool import Mempool, MempoolClosedError
+from .async_mempool import AsyncMempool, MempoolBusyError, SubscriberLaggedError
+from .block import Block, BlockHeader
+from .block_store import BlockStore, LevelDBBlockStore, MemoryBlockStore
+from .blockchain import (
+    BLOCK_REWARD,
+    Blockchain,
+    BlockMismatchError,
+    ProofOfWorkError,
+    TimestampError,
+    TransactionError,
+    check_block,
+    check_timestamp,
+)
+from .coin_selection import STRATEGIES, CoinSelector, select_coins
+from .difficulty import Difficulty, Target
+from .encoding import Digest, zero_hash
+from .header_chain import HeaderChain
+from .mempool import Mempool, MempoolClosedError, MempoolFullError, PendingTransaction
+from .merkle import MerkleProof, merkle_proof, merkle_root
 from .miner import Miner
-from .transaction import UTXO, Transaction, TransactionInput, TransactionOutput
+from .transaction import (
+    UTXO,
+    Coin,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+)
+from .utxo_store import LevelDBUTXOStore, MemoryUTXOStore, UTXOStore
 
 __all__ = [
     "generate_address",
+    "AsyncMempool",
+    "MempoolBusyError",
+    "SubscriberLaggedError",
     "Block",
+    "BlockHeader",
+    "BlockStore",
+    "MemoryBlockStore",
+    "LevelDBBlockStore",
+    "BLOCK_REWARD",
     "Blockchain",
     "BlockMismatchError",
+    "ProofOfWorkError",
+    "TimestampError",
     "TransactionError",
+    "check_block",
+    "check_timestamp",
+    "CoinSelector",
+    "STRATEGIES",
     "select_coins",
+    "Difficulty",
+    "Target",
+    "Digest",
     "zero_hash",
+    "HeaderChain",
     "Mempool",
     "MempoolClosedError",
+    "MempoolFullError",
+    "PendingTransaction",
+    "MerkleProof",
+    "merkle_proof",
+    "merkle_root",
     "Miner",
+    "Coin",
     "Transaction",
     "TransactionInput",
     "TransactionOutput",
     "UTXO",
+    "UTXOStore",
+    "MemoryUTXOStore",
+    "LevelDBUTXOStore",
 ]
@@ -0,0 +1,241 @@
+import asyncio
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+from .mempool import MAX_FEE, Mempool, PendingTransaction
+
+DEFAULT_QUEUE_SIZE = 10_000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 10_000
+
+T = TypeVar("T")
+
+
+class MempoolBusyError(Exception):
+    def __init__(self) -> None:
+        super().__init__("the submission queue is full")
+
+
+class SubscriberLaggedError(Exception):
+    def __init__(self) -> None:
+        super().__init__("the subscriber fell too far behind and was disconnected")
+
+
+class _Subscriber:
+    """
+    The transactions waiting to be handed to one subscriber.
+    """
+
+    def __init__(self, queue_size: int) -> None:
+        self.queue_size = queue_size
+
+        # unbounded so the closing None always fits, but never holds more than
+        # queue_size transactions
+        self.queue: asyncio.Queue[Optional[PendingTransaction]] = asyncio.Queue()
+
+        # set once the queue overflowed, after which nothing more is added
+        self.lagged = False
+
+    def put(self, transactions: Iterable[PendingTransaction]) -> bool:
+        """
+        Queues the transactions, or returns False if they don't all fit.
+        """
+        for transaction in transactions:
+            if self.queue.qsize() >= self.queue_size:
+                self.lagged = True
+                return False
+            self.queue.put_nowait(transaction)
+        return True
+
+
+class AsyncMempool:
+    """
+    An asyncio front end to an open mempool.
+
+    Submissions wait on a bounded queue. A background task takes whatever has queued
+    up, up to batch_size at a time, and adds it to the mempool in one write batch on
+    an executor, so the event loop never waits on the disk. When the queue is full,
+    submit waits for room and submit_nowait raises MempoolBusyError.
+
+    The transactions the mempool kept are handed to every subscriber. A subscriber
+    that falls subscriber_queue_size transactions behind is disconnected, rather than
+    holding on to everything written since.
+
+    While the async pool is running, the mempool should only be written to through it:
+    by submitting, with remove, or with run for anything else that writes to it, such
+    as Miner.mine.
+    """
+
+    def __init__(
+        self,
+        mempool: Mempool,
+        *,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        subscriber_queue_size: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE,
+        sync: bool = False,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.mempool = mempool
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.subscriber_queue_size = subscriber_queue_size
+
+        # whether each write batch is flushed to disk
+        self.sync = sync
+
+        # writes must not overlap, so the default executor has a single thread
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1)
+
+        # created on entering, inside the running event loop
+        self._queue: Optional[asyncio.Queue[PendingTransaction]] = None
+        self._writer: Optional[asyncio.Task[None]] = None
+
+        # held weakly, so a subscription dropped without being iterated goes with it
+        self._subscribers: weakref.WeakSet[_Subscriber] = weakref.WeakSet()
+
+        # the error that stopped the writer, raised again to anyone submitting
+        self._error: Optional[BaseException] = None
+
+    async def __aenter__(self) -> "AsyncMempool":
+        self._queue = asyncio.Queue(self.queue_size)
+        self._writer = asyncio.create_task(self._write_batches(self._queue))
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        # self._writer will only be none if someone fiddled with it
+        assert self._writer is not None
+        try:
+            await self.flush()
+        finally:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._queue = self._writer = None
+
+            for subscriber in self._subscribers:
+                subscriber.queue.put_nowait(None)
+
+            if self._own_executor:
+                self._executor.shutdown()
+
+    async def submit(self, transaction: PendingTransaction) -> None:
+        """
+        Queues a transaction to be added to the mempool, waiting for room in the queue
+        if it's full.
+        """
+        queue = self._open_queue(transaction)
+        await queue.put(transaction)
+
+    def submit_nowait(self, transaction: PendingTransaction) -> None:
+        """
+        Queues a transaction to be added to the mempool, or raises MempoolBusyError if
+        the queue is full.
+        """
+        queue = self._open_queue(transaction)
+        try:
+            queue.put_nowait(transaction)
+        except asyncio.QueueFull as ex:
+            raise MempoolBusyError from ex
+
+    async def remove(
+        self, transactions: Iterable[PendingTransaction], *, sync: bool = False
+    ) -> None:
+        """
+        Removes transactions from the mempool on the writer's executor, as
+        Mempool.delete_transactions. Transactions still waiting in the submission
+        queue aren't removed.
+        """
+        transactions = list(transactions)
+        await self.run(
+            lambda: self.mempool.delete_transactions(transactions, sync=sync)
+        )
+
+    async def run(self, function: Callable[[], T]) -> T:
+        """
+        Runs a function that uses the mempool on the writer's executor, so it never
+        overlaps a write batch, and returns its result. Submissions keep queueing up
+        while it runs.
+        """
+        self._open_queue()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function)
+
+    async def flush(self) -> None:
+        """
+        Waits until everything submitted so far has been written to the mempool.
+        """
+        await self._open_queue().join()
+        self._raise_error()
+
+    def subscribe(self) -> AsyncIterator[PendingTransaction]:
+        """
+        Returns an async iterator over the transactions the mempool keeps from now on,
+        which ends when the async pool is closed. Transactions evicted by later
+        submissions are still handed out.
+
+        If it falls subscriber_queue_size transactions behind it's disconnected, and
+        raises SubscriberLaggedError once it has handed out what it already had.
+        """
+        subscriber = _Subscriber(self.subscriber_queue_size)
+        self._subscribers.add(subscriber)
+        return self._iter_subscriber(subscriber)
+
+    async def _iter_subscriber(
+        self, subscriber: _Subscriber
+    ) -> AsyncIterator[PendingTransaction]:
+        try:
+            while True:
+                if subscriber.lagged and subscriber.queue.empty():
+                    raise SubscriberLaggedError
+                transaction = await subscriber.queue.get()
+                if transaction is None:
+                    return
+                yield transaction
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def _open_queue(
+        self, transaction: Optional[PendingTransaction] = None
+    ) -> asyncio.Queue[PendingTransaction]:
+        """
+        Returns the submission queue, checking the transaction on the way so that one
+        bad submission can't fail the batch it would be written in.
+        """
+        if self._queue is None:
+            raise RuntimeError("AsyncMempool is not running")
+        self._raise_error()
+
+        if transaction is not None and not 0 <= transaction.fee <= MAX_FEE:
+            raise ValueError(f"fee must be between 0 and {MAX_FEE}")
+
+        return self._queue
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("AsyncMempool stopped writing") from self._error
+
+    async def _write_batches(self, queue: asyncio.Queue[PendingTransaction]) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            try:
+                if self._error is None:
+                    kept = await loop.run_in_executor(
+                        self._executor,
+                        lambda: self.mempool.create_transactions(batch, sync=self.sync),
+                    )
+                    for subscriber in list(self._subscribers):
+                        if not subscriber.put(kept):
+                            self._subscribers.discard(subscriber)
+            except Exception as ex:  # pylint: disable=broad-except
+                # nothing more will be written, so later batches are dropped
+                self._error = ex
+            finally:
+                for _ in batch:
+                    queue.task_done()
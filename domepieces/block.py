@@ -1,36 +1,106 @@
+import hashlib
+import struct
 from dataclasses import dataclass
+from typing import Sequence
 
-from .encoding import Encoder, zero_hash
+from .encoding import DIGEST_SIZE, Digest, check_digest, zero_hash
+from .merkle import MerkleProof, merkle_proof, merkle_root
+from .slots import cached_slot, slotted
 from .transaction import Transaction, TransactionOutput
 
+# height, proof, previous, merkle root, timestamp
+_pack_header = struct.Struct(f">QQ{DIGEST_SIZE}s{DIGEST_SIZE}sQ").pack
 
+
+@slotted
+@dataclass(frozen=True)
+class BlockHeader:
+    """
+    Everything a block's hash and proof of work cover. The transactions are only
+    committed to through their merkle root, so a chain of headers can be followed and
+    checked without them.
+    """
+
+    height: int
+    proof: int
+    previous: Digest
+    merkle_root: Digest
+
+    # see Block.timestamp
+    timestamp: int = 0
+
+    def __str__(self) -> str:
+        return f"block {self.hash.hex()[:8]} @ {self.height}"
+
+    def __post_init__(self) -> None:
+        check_digest("previous", self.previous)
+        check_digest("merkle_root", self.merkle_root)
+
+    # see Transaction.hash
+    @cached_slot
+    def hash(self) -> Digest:
+        # the same bytes an Encoder would be fed, but packed and hashed in one call.
+        # hashing headers is most of the work of a header sync.
+        data = _pack_header(
+            self.height, self.proof, self.previous, self.merkle_root, self.timestamp
+        )
+        return Digest(hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest())
+
+
+@slotted
 @dataclass(frozen=True)
 class Block:
     height: int
     proof: int
-    transactions: list[Transaction]
-    previous: str
+    transactions: Sequence[Transaction]
+    previous: Digest
+
+    # seconds since the unix epoch, used to retarget the difficulty
+    timestamp: int = 0
 
     def __str__(self) -> str:
-        return f"block {self.hash[:8]} @ {self.height}"
+        return f"block {self.hash.hex()[:8]} @ {self.height}"
+
+    def __post_init__(self) -> None:
+        # see Transaction.inputs
+        object.__setattr__(self, "transactions", tuple(self.transactions))
+        check_digest("previous", self.previous)
+
+    # the header commits to the transactions through their merkle root, so hashing it
+    # takes the same time however many transactions the block has
+    @cached_slot
+    def merkle_root(self) -> Digest:
+        return merkle_root([transaction.hash for transaction in self.transactions])
 
     @property
-    def hash(self) -> str:
-        enc = Encoder()
-        enc.add_int(self.height)
-        enc.add_int(self.proof)
-        enc.add_str(self.previous)
+    def header(self) -> BlockHeader:
+        return BlockHeader(
+            height=self.height,
+            proof=self.proof,
+            previous=self.previous,
+            merkle_root=self.merkle_root,
+            timestamp=self.timestamp,
+        )
 
-        for transaction in self.transactions:
-            enc.add_str(transaction.hash)
+    # a block's hash is the hash of its header. see Transaction.hash for the caching.
+    @cached_slot
+    def hash(self) -> Digest:
+        return self.header.hash
 
-        return enc.digest()
+    def merkle_proof(self, transaction_hash: Digest) -> MerkleProof:
+        """
+        Returns a proof that the transaction is in this block, which can be checked
+        against the block's merkle root with MerkleProof.verify.
+        Raises ValueError if the transaction isn't in the block.
+        """
+        hashes = [transaction.hash for transaction in self.transactions]
+        return merkle_proof(hashes, hashes.index(transaction_hash))
 
     @staticmethod
     def genesis() -> "Block":
         return Block(
             height=0,
-            proof=123796,
+            proof=149239,
             transactions=[
                 Transaction(
                     height=0,
@@ -44,4 +114,5 @@ class Block:
                 )
             ],
             previous=zero_hash(),
+            timestamp=1633046400,
         )
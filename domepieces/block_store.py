@@ -0,0 +1,302 @@
+from typing import Iterator, Optional, Protocol
+
+import msgpack
+import plyvel
+
+from .block import Block
+from .difficulty import Target
+from .encoding import Digest
+from .serialization import decode_block, encode_block
+
+
+class BlockStore(Protocol):
+    """
+    Holds the blocks of the main chain, along with the target each was mined against
+    and the total work of the chain up to each block.
+    """
+
+    def __len__(self) -> int:
+        ...
+
+    def __iter__(self) -> Iterator[Block]:
+        ...
+
+    def __getitem__(self, height: int) -> Block:
+        ...
+
+    @property
+    def tip(self) -> Optional[Block]:
+        """
+        The most recently appended block, or None if the store is empty.
+        """
+
+    def get(self, block_hash: Digest) -> Optional[Block]:
+        ...
+
+    def height_of(self, block_hash: Digest) -> Optional[int]:
+        ...
+
+    def target_at(self, height: int) -> Target:
+        ...
+
+    def work_at(self, height: int) -> int:
+        """
+        Returns the total work of the chain up to and including the given height.
+        """
+
+    def timestamp_at(self, height: int) -> int:
+        ...
+
+    def transaction_location(
+        self, transaction_hash: Digest
+    ) -> Optional[tuple[Digest, int]]:
+        """
+        Returns the hash of the block containing the given transaction, and the
+        transaction's position within that block.
+        """
+
+    def append(self, block: Block, target: Target) -> None:
+        ...
+
+    def pop(self) -> Block:
+        """
+        Removes and returns the tip, making its parent the new tip.
+        """
+
+
+class MemoryBlockStore:
+    def __init__(self) -> None:
+        self.blocks: list[Block] = []
+        self.targets: list[Target] = []
+
+        # cumulative work of the chain at each height
+        self.work: list[int] = []
+
+        # maps block hash to height
+        self.heights: dict[Digest, int] = {}
+
+        # maps transaction hash to (block hash, position)
+        self.transaction_locations: dict[Digest, tuple[Digest, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def __iter__(self) -> Iterator[Block]:
+        return iter(self.blocks)
+
+    def __getitem__(self, height: int) -> Block:
+        return self.blocks[height]
+
+    @property
+    def tip(self) -> Optional[Block]:
+        return self.blocks[-1] if self.blocks else None
+
+    def get(self, block_hash: Digest) -> Optional[Block]:
+        height = self.heights.get(block_hash)
+        return None if height is None else self.blocks[height]
+
+    def height_of(self, block_hash: Digest) -> Optional[int]:
+        return self.heights.get(block_hash)
+
+    def target_at(self, height: int) -> Target:
+        return self.targets[height]
+
+    def work_at(self, height: int) -> int:
+        return self.work[height]
+
+    def timestamp_at(self, height: int) -> int:
+        return self.blocks[height].timestamp
+
+    def transaction_location(
+        self, transaction_hash: Digest
+    ) -> Optional[tuple[Digest, int]]:
+        return self.transaction_locations.get(transaction_hash)
+
+    def append(self, block: Block, target: Target) -> None:
+        self.blocks.append(block)
+        self.targets.append(target)
+        self.work.append((self.work[-1] if self.work else 0) + target.work)
+        self.heights[block.hash] = block.height
+
+        for position, transaction in enumerate(block.transactions):
+            self.transaction_locations[transaction.hash] = (block.hash, position)
+
+    def pop(self) -> Block:
+        block = self.blocks.pop()
+        self.targets.pop()
+        self.work.pop()
+        del self.heights[block.hash]
+
+        for transaction in block.transactions:
+            del self.transaction_locations[transaction.hash]
+
+        return block
+
+
+# key prefixes for each kind of record in the database
+BLOCK_PREFIX = b"k"
+INDEX_PREFIX = b"i"
+HEIGHT_PREFIX = b"h"
+TRANSACTION_PREFIX = b"t"
+TIP_KEY = b"m:tip"
+
+
+def _height_key(height: int) -> bytes:
+    # big endian, so heights sort numerically
+    return height.to_bytes(8, "big")
+
+
+class LevelDBBlockStore:
+    """
+    Keeps the chain in LevelDB so it survives restarts.
+
+    Blocks are stored by hash. Alongside each one is a small index record with its
+    height, target, cumulative work and timestamp, so those can be looked up without
+    decoding the block. Secondary indexes map each height to its block hash and each
+    transaction hash to its block and position, and a tip pointer records the head of
+    the chain. Each block is written in one batch.
+
+    Nothing is read up front: opening a store with a million blocks only reads the tip,
+    and other blocks are loaded when they're asked for.
+    """
+
+    def __init__(self, db: plyvel.DB) -> None:
+        self.db = db
+        self.blocks_db = db.prefixed_db(BLOCK_PREFIX)
+        self.index_db = db.prefixed_db(INDEX_PREFIX)
+        self.heights_db = db.prefixed_db(HEIGHT_PREFIX)
+        self.transactions_db = db.prefixed_db(TRANSACTION_PREFIX)
+
+        self._tip: Optional[Block] = None
+        tip_hash = db.get(TIP_KEY)
+        if tip_hash is not None:
+            self._tip = self.get(Digest(tip_hash))
+
+    def __len__(self) -> int:
+        return 0 if self._tip is None else self._tip.height + 1
+
+    def __iter__(self) -> Iterator[Block]:
+        for height in range(len(self)):
+            yield self[height]
+
+    def __getitem__(self, height: int) -> Block:
+        if not 0 <= height < len(self):
+            raise IndexError(height)
+
+        # the tip is the block asked for most, when adding its children
+        assert self._tip is not None
+        if height == self._tip.height:
+            return self._tip
+
+        block_hash = self.heights_db.get(_height_key(height))
+        block = self.get(Digest(block_hash))
+        assert block is not None
+        return block
+
+    @property
+    def tip(self) -> Optional[Block]:
+        return self._tip
+
+    def get(self, block_hash: Digest) -> Optional[Block]:
+        if self._tip is not None and block_hash == self._tip.hash:
+            return self._tip
+
+        data = self.blocks_db.get(bytes(block_hash))
+        return None if data is None else decode_block(data)
+
+    def height_of(self, block_hash: Digest) -> Optional[int]:
+        data = self.index_db.get(bytes(block_hash))
+        if data is None:
+            return None
+
+        height, _, _, _ = msgpack.unpackb(data)
+        return int(height)
+
+    def target_at(self, height: int) -> Target:
+        _, target, _, _ = self._index_at(height)
+        return Target(int.from_bytes(target, "big"))
+
+    def work_at(self, height: int) -> int:
+        _, _, work, _ = self._index_at(height)
+        return int.from_bytes(work, "big")
+
+    def timestamp_at(self, height: int) -> int:
+        _, _, _, timestamp = self._index_at(height)
+        return timestamp
+
+    def transaction_location(
+        self, transaction_hash: Digest
+    ) -> Optional[tuple[Digest, int]]:
+        data = self.transactions_db.get(bytes(transaction_hash))
+        if data is None:
+            return None
+
+        block_hash, position = msgpack.unpackb(data)
+        return Digest(block_hash), position
+
+    def append(self, block: Block, target: Target) -> None:
+        # plyvel only accepts exact bytes, not subclasses like Digest
+        block_hash = bytes(block.hash)
+
+        work = target.work
+        if block.height > 0:
+            work += self.work_at(block.height - 1)
+
+        with self.db.write_batch(transaction=True) as batch:
+            batch.put(BLOCK_PREFIX + block_hash, encode_block(block))
+            batch.put(
+                INDEX_PREFIX + block_hash,
+                msgpack.packb(
+                    (
+                        block.height,
+                        target.to_bytes(),
+                        # work can outgrow msgpack's 64 bit integers
+                        work.to_bytes((work.bit_length() + 7) // 8, "big"),
+                        block.timestamp,
+                    )
+                ),
+            )
+            batch.put(HEIGHT_PREFIX + _height_key(block.height), block_hash)
+
+            for position, transaction in enumerate(block.transactions):
+                batch.put(
+                    TRANSACTION_PREFIX + transaction.hash,
+                    msgpack.packb((block_hash, position)),
+                )
+
+            batch.put(TIP_KEY, block_hash)
+
+        self._tip = block
+
+    def pop(self) -> Block:
+        block = self._tip
+        if block is None:
+            raise IndexError("pop from empty block store")
+
+        with self.db.write_batch(transaction=True) as batch:
+            batch.delete(BLOCK_PREFIX + bytes(block.hash))
+            batch.delete(INDEX_PREFIX + bytes(block.hash))
+            batch.delete(HEIGHT_PREFIX + _height_key(block.height))
+
+            for transaction in block.transactions:
+                batch.delete(TRANSACTION_PREFIX + bytes(transaction.hash))
+
+            if block.height > 0:
+                batch.put(TIP_KEY, bytes(block.previous))
+            else:
+                batch.delete(TIP_KEY)
+
+        self._tip = self.get(block.previous) if block.height > 0 else None
+        return block
+
+    def _index_at(self, height: int) -> tuple[int, bytes, bytes, int]:
+        """
+        Returns the height, target, work and timestamp stored for the block at the
+        given height.
+        """
+        block_hash = self.heights_db.get(_height_key(height))
+        if block_hash is None:
+            raise IndexError(height)
+
+        height, target, work, timestamp = msgpack.unpackb(self.index_db.get(block_hash))
+        return height, target, work, timestamp
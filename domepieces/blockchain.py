@@ -1,8 +1,27 @@
-from typing import Iterator
+import itertools
+import threading
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Container, Iterable, Iterator, Optional, Sequence, Union
 
-from .block import Block
-from .coin_selection import select_coins
-from .transaction import UTXO, Transaction
+from .block import Block, BlockHeader
+from .block_store import BlockStore, MemoryBlockStore
+from .coin_selection import CoinSelector, select_coins
+from .difficulty import Difficulty, Target
+from .encoding import DIGEST_SIZE, MAX_INT, Digest
+from .serialization import decode_block
+from .transaction import Coin, Transaction
+from .utxo_store import MemoryUTXOStore, Outpoint, UTXOStore
+
+# what a block's coinbase may pay its miner, on top of the fees of its transactions
+BLOCK_REWARD = 50_00000000
+
+# how many serialized blocks sync decodes and checks at a time
+DEFAULT_SYNC_BATCH_SIZE = 256
+
+# how many blocks sync sends to each worker at once
+DEFAULT_SYNC_CHUNK_SIZE = 8
 
 
 class BlockMismatchError(Exception):
@@ -13,78 +32,654 @@ class TransactionError(Exception):
     pass
 
 
+class ProofOfWorkError(Exception):
+    pass
+
+
+class TimestampError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SideBlock:
+    """
+    A block that isn't on the main chain, kept in case its branch overtakes it.
+    """
+
+    block: Block
+    target: Target
+
+    # the total work of the branch up to and including this block
+    work: int
+
+
 class Blockchain:
-    def __init__(self) -> None:
-        self.blocks = [Block.genesis()]
+    def __init__(
+        self,
+        difficulty: Difficulty = Difficulty(),
+        *,
+        coin_selector: CoinSelector = select_coins,
+        utxo_store: Optional[UTXOStore] = None,
+        block_store: Optional[BlockStore] = None,
+    ) -> None:
+        self.difficulty = difficulty
 
-        # maps (previous_transaction, index) to utxo
-        self.utxos: dict[tuple[str, int], UTXO] = {
-            (self.blocks[0].transactions[0].hash, 0): UTXO(
-                self.blocks[0].transactions[0], 0
-            )
-        }
+        # how find_utxos picks utxos when no selector is given
+        self.coin_selector = coin_selector
+
+        # the blocks of the chain and the target each was mined against
+        self.blocks: BlockStore = (
+            block_store if block_store is not None else MemoryBlockStore()
+        )
+
+        # the unspent outputs as of self.head
+        self.utxos: UTXOStore = (
+            utxo_store if utxo_store is not None else MemoryUTXOStore()
+        )
+
+        # blocks on competing branches, by hash. together with the main chain these
+        # make up the block tree.
+        self.side_blocks: dict[Digest, SideBlock] = {}
+
+        # held while the chain changes. anything reading the utxo set from another
+        # thread, such as a mempool admitting transactions on an executor, holds it too.
+        self.lock = threading.RLock()
+
+        if self.blocks.tip is None:
+            self.blocks.append(Block.genesis(), difficulty.initial_target)
+
+        self._catch_up_utxos()
 
     def __len__(self) -> int:
         return self.head.height + 1
 
     @property
     def head(self) -> Block:
-        return self.blocks[-1]
+        # the block store is never empty once the chain has been created
+        tip = self.blocks.tip
+        assert tip is not None
+        return tip
+
+    @property
+    def work(self) -> int:
+        """
+        The total work of the main chain.
+        """
+        return self.blocks.work_at(self.head.height)
 
     def add_block(self, block: Block) -> None:
-        self._validate_block_params(block)
-        self._validate_block_transactions(block)
-        self._update_utxos(block)
-        self.blocks.append(block)
+        """
+        Adds a block to the block tree.
 
-    def iter_utxos(self) -> Iterator[UTXO]:
-        return iter(self.utxos.values())
+        Blocks extending the head are connected straight away. Blocks extending any
+        other known block are kept on a side branch, and once a branch has more work
+        than the main chain the chain reorganizes onto it. If a block on the branch
+        turns out to be invalid, the reorganization is rolled back and the invalid
+        block and its descendants are forgotten.
+        """
+        check_block(block)
+        self._add_checked_block(block)
+
+    def sync(
+        self,
+        encoded_blocks: Iterable[bytes],
+        *,
+        executor: Optional[Executor] = None,
+        batch_size: int = DEFAULT_SYNC_BATCH_SIZE,
+        chunk_size: int = DEFAULT_SYNC_CHUNK_SIZE,
+    ) -> int:
+        """
+        Adds a run of serialized blocks, such as those downloaded during an initial
+        sync. Returns how many blocks were added.
 
-    def find_utxos(self, address: str, amount: int) -> list[UTXO]:
+        If an executor is given, blocks are hashed and checked with check_block on it
+        in parallel, since none of that depends on the chain. Only the order-dependent
+        part of validation and the utxo updates happen here, one block at a time.
+        Blocks are handed out in batches, so the whole run never has to be in memory
+        at once.
+        """
+        added = 0
+        encoded_blocks = iter(encoded_blocks)
+
+        while True:
+            batch = list(itertools.islice(encoded_blocks, batch_size))
+            if not batch:
+                return added
+
+            if executor is None:
+                for data in batch:
+                    block = decode_block(data)
+                    check_block(block)
+                    self._add_checked_block(block)
+                    added += 1
+                continue
+
+            # decoding a block again is cheaper than sending the decoded block back
+            # from the worker, so workers only return the hashes
+            hashes = executor.map(_check_encoded_block, batch, chunksize=chunk_size)
+            for data, block_hashes in zip(batch, hashes):
+                block = decode_block(data)
+                _set_hashes(block, block_hashes)
+                self._add_checked_block(block)
+                added += 1
+
+    def _add_checked_block(self, block: Block) -> None:
+        """
+        add_block for a block that has already passed check_block.
+        """
+        with self.lock:
+            parent, parent_target, parent_work = self._parent_of(block)
+            self._validate_block_params(block, parent)
+
+            target = self._next_target(parent, parent_target)
+            self._validate_block_proof(block, target)
+            check_timestamp(block, self._recent_timestamps(parent), self.difficulty)
+
+            if parent.hash == self.head.hash:
+                self._connect_block(block, target)
+                self._prune_side_blocks()
+                return
+
+            # the utxo store only has undo records for so many blocks, none at all
+            # straight after loading a snapshot, so the chain could never reorganize
+            # onto a branch that forks any deeper
+            depth = self.head.height - self._fork_height(parent)
+            undo_depth = self.utxos.undo_depth
+            if depth > undo_depth:
+                raise BlockMismatchError(
+                    f"{block} forks {depth} blocks below the head, deeper than the "
+                    f"{undo_depth} blocks that can be undone."
+                )
+
+            side_block = SideBlock(block, target, parent_work + target.work)
+            self.side_blocks[block.hash] = side_block
+
+            # ties go to the branch we saw first
+            if side_block.work > self.work:
+                self._reorganize(side_block)
+                self._prune_side_blocks()
+
+    def disconnect_block(self) -> Block:
+        """
+        Removes the head block from the chain, reverting its changes to the utxo set
+        from the undo record the utxo store kept for it. Returns the removed block.
+        """
+        with self.lock:
+            block = self.head
+            if block.height == 0:
+                raise BlockMismatchError("the genesis block can't be disconnected")
+
+            # the utxos are reverted first, so if we stop before the block is removed
+            # it is simply reconnected from the block store on the next start.
+            self.utxos.revert(_created_outpoints(block), block.previous)
+            self.blocks.pop()
+            return block
+
+    def get_block(self, block_hash: Digest) -> Optional[Block]:
+        return self.blocks.get(block_hash)
+
+    def get_transaction(self, transaction_hash: Digest) -> Optional[Transaction]:
+        location = self.blocks.transaction_location(transaction_hash)
+        if location is None:
+            return None
+
+        block_hash, position = location
+        block = self.blocks.get(block_hash)
+        assert block is not None
+        return block.transactions[position]
+
+    def next_target(self) -> Target:
+        """
+        Returns the target that the next block added to the chain must meet.
+        """
+        return self._next_target(self.head, self.blocks.target_at(self.head.height))
+
+    def median_time_past(self) -> int:
+        """
+        Returns the median timestamp of the last blocks of the chain. The next block
+        added to the chain must have a later timestamp.
+        """
+        return median_time(self._recent_timestamps(self.head))
+
+    def iter_utxos(self, address: Optional[str] = None) -> Iterator[Coin]:
+        """
+        Iterates over all UTXOs, or only those belonging to the given address.
+        """
+        if address is None:
+            return iter(self.utxos)
+
+        return self.utxos.coins_for(address)
+
+    def balance(self, address: str) -> int:
+        return self.utxos.balance(address)
+
+    def balances(self) -> dict[str, int]:
+        """
+        Returns the balance of every address that has any unspent outputs.
+        """
+        return self.utxos.balances()
+
+    def find_utxos(
+        self,
+        address: str,
+        amount: int,
+        coin_selector: Optional[CoinSelector] = None,
+        exclude: Container[Outpoint] = (),
+    ) -> list[Coin]:
         """
         Finds UTXOs for the given address with a total value of at least the given amount.
         Raises TransactionError if the address doesn't exist or has insufficient funds.
+        Uses the chain's coin selector unless another one is given. UTXOs whose outpoints
+        are in exclude, such as ones already promised to other transactions, are skipped.
         """
-        utxos = select_coins(
-            available_utxos=[
-                utxo for utxo in self.iter_utxos() if utxo.output.recipient == address
-            ],
-            spend_target=amount,
-        )
+        if coin_selector is None:
+            coin_selector = self.coin_selector
+
+        available = [
+            coin for coin in self.iter_utxos(address) if coin.outpoint not in exclude
+        ]
+        utxos = coin_selector(amount, available)
 
         if not utxos:
             raise TransactionError(f"{address} has insufficient funds.")
 
         return utxos
 
-    def _validate_block_params(self, block: Block) -> None:
-        if block.previous != self.head.hash:
-            raise BlockMismatchError(f"{block} must have {self.head} as its parent.")
+    def _parent_of(self, block: Block) -> tuple[Block, Target, int]:
+        """
+        Finds the block's parent in the block tree, along with the parent's target and
+        the total work of its branch.
+        """
+        side_block = self.side_blocks.get(block.previous)
+        if side_block is not None:
+            return side_block.block, side_block.target, side_block.work
 
-        if block.height != len(self):
-            raise BlockMismatchError(f"{block} must have height {len(self)}")
+        height = self.blocks.height_of(block.previous)
+        if height is None:
+            raise BlockMismatchError(f"{block} must have a known block as its parent.")
 
-    def _validate_block_transactions(self, block: Block) -> None:
-        for transaction in block.transactions:
-            self._validate_transaction(transaction)
+        return (
+            self.blocks[height],
+            self.blocks.target_at(height),
+            self.blocks.work_at(height),
+        )
 
-    def _validate_transaction(self, transaction: Transaction) -> None:
-        # ensure all inputs reference spendable UTXOs
-        for transaction_input in transaction.inputs:
-            key = (transaction_input.transaction, transaction_input.output_index)
-            if key not in self.utxos:
-                raise TransactionError(
-                    f"{transaction} output #{transaction_input.output_index} is already spent."
+    def _fork_height(self, block: Block) -> int:
+        """
+        Returns the height of the last main chain block the given block descends from.
+        """
+        while block.hash in self.side_blocks:
+            side_block = self.side_blocks.get(block.previous)
+            if side_block is None:
+                return block.height - 1
+            block = side_block.block
+
+        return block.height
+
+    def _ancestor(self, block: Block, height: int) -> Block:
+        """
+        Returns the ancestor of the given block at the given height, following side
+        branches back to the main chain.
+        """
+        while block.height > height:
+            if block.hash not in self.side_blocks:
+                # blocks on the main chain only have main chain ancestors
+                return self.blocks[height]
+
+            side_block = self.side_blocks.get(block.previous)
+            if side_block is None:
+                block = self.blocks[block.height - 1]
+            else:
+                block = side_block.block
+
+        return block
+
+    def _recent_timestamps(self, parent: Block) -> list[int]:
+        """
+        Returns the timestamps of the given block and the blocks before it, up to the
+        difficulty's median time span, following side branches back to the main chain.
+        """
+        span = self.difficulty.median_time_span
+        timestamps = [parent.timestamp]
+        block = parent
+
+        while len(timestamps) < span and block.height > 0:
+            side_block = self.side_blocks.get(block.previous)
+            if side_block is None:
+                # the rest are on the main chain, where the store has their timestamps
+                # without decoding the blocks
+                lowest = max(block.height - (span - len(timestamps)), 0)
+                timestamps.extend(
+                    self.blocks.timestamp_at(height)
+                    for height in range(block.height - 1, lowest - 1, -1)
                 )
+                break
+
+            block = side_block.block
+            timestamps.append(block.timestamp)
+
+        return timestamps
+
+    def _next_target(self, parent: Block, parent_target: Target) -> Target:
+        """
+        Returns the target that a child of the given block must meet.
+        """
+        height = parent.height + 1
+        if not self.difficulty.is_retarget_height(height):
+            return parent_target
+
+        first = self._ancestor(parent, height - self.difficulty.interval)
+        return self.difficulty.retarget(
+            parent_target, parent.timestamp - first.timestamp
+        )
+
+    def _validate_block_params(self, block: Block, parent: Block) -> None:
+        if block.height != parent.height + 1:
+            raise BlockMismatchError(f"{block} must have height {parent.height + 1}")
+
+        if (
+            block.hash in self.side_blocks
+            or self.blocks.height_of(block.hash) is not None
+        ):
+            raise BlockMismatchError(f"{block} is already in the block tree.")
+
+    def _validate_block_proof(self, block: Block, target: Target) -> None:
+        if not target.is_met_by(block.hash):
+            raise ProofOfWorkError(f"{block} does not meet the required target")
+
+    def _block_delta(self, block: Block) -> tuple[list[Outpoint], list[Coin]]:
+        """
+        Validates the block's transactions against the utxo set, and returns the
+        outpoints the block spends from it and the coins it adds to it. The block must
+        already have passed check_block.
+        Nothing is changed, so an invalid block leaves the chain untouched.
+        """
+        spent: list[Outpoint] = []
+        created: dict[Outpoint, Coin] = {}
+        coinbase_amount = 0
+        fees = 0
+
+        for position, transaction in enumerate(block.transactions):
+            input_amount = 0
 
-    def _update_utxos(self, block: Block) -> None:
-        for transaction in block.transactions:
-            # spend all inputs
             for transaction_input in transaction.inputs:
                 key = (transaction_input.transaction, transaction_input.output_index)
-                del self.utxos[key]
 
-            # add new unspent outputs
+                # outputs spent in the same block they're created in never hit the store
+                coin = created.pop(key, None)
+                if coin is None:
+                    coin = self.utxos.get(key)
+                    if coin is None:
+                        raise TransactionError(
+                            f"{transaction} output #{transaction_input.output_index} is already spent."
+                        )
+                    spent.append(key)
+
+                input_amount += coin.amount
+
+            output_amount = sum(output.amount for output in transaction.outputs)
+            if not transaction.inputs:
+                # only the first transaction can be a coinbase, paying out new coins
+                if position > 0:
+                    raise TransactionError(
+                        f"{transaction} has no inputs, but only the first transaction "
+                        f"of {block} can be a coinbase."
+                    )
+                coinbase_amount = output_amount
+            elif output_amount > input_amount:
+                raise TransactionError(
+                    f"{transaction} spends {output_amount} but its inputs are only worth {input_amount}."
+                )
+            else:
+                fees += input_amount - output_amount
+
             for output_index in range(len(transaction.outputs)):
-                key = (transaction.hash, output_index)
-                self.utxos[key] = UTXO(transaction, output_index)
+                coin = Coin.from_transaction(transaction, output_index)
+
+                # a repeated transaction would overwrite a coin that's still unspent
+                if coin.outpoint in created or coin.outpoint in self.utxos:
+                    raise TransactionError(
+                        f"{transaction} output #{output_index} already exists."
+                    )
+                created[coin.outpoint] = coin
+
+        if coinbase_amount > BLOCK_REWARD + fees:
+            raise TransactionError(
+                f"the coinbase of {block} pays {coinbase_amount}, but the block reward "
+                f"and fees are only worth {BLOCK_REWARD + fees}."
+            )
+
+        return spent, list(created.values())
+
+    def _connect_block(self, block: Block, target: Target) -> None:
+        """
+        Validates the block's transactions and adds it to the end of the main chain.
+        """
+        spent, created = self._block_delta(block)
+
+        # the block is stored first, so if we stop before the utxos are updated they
+        # can be caught up from the block store on the next start.
+        self.blocks.append(block, target)
+        self.utxos.apply(spent, created, block.hash)
+
+    def _connect_side_block(self, side_block: SideBlock) -> None:
+        self._connect_block(side_block.block, side_block.target)
+        del self.side_blocks[side_block.block.hash]
+
+    def _disconnect_to(self, height: int) -> list[SideBlock]:
+        """
+        Disconnects blocks until the head is at the given height, keeping them as side
+        blocks. Returns the disconnected blocks, lowest first.
+        """
+        disconnected: list[SideBlock] = []
+        while self.head.height > height:
+            target = self.blocks.target_at(self.head.height)
+            work = self.blocks.work_at(self.head.height)
+            side_block = SideBlock(self.disconnect_block(), target, work)
+            self.side_blocks[side_block.block.hash] = side_block
+            disconnected.append(side_block)
+
+        disconnected.reverse()
+        return disconnected
+
+    def _reorganize(self, tip: SideBlock) -> None:
+        """
+        Makes the branch ending at the given side block the main chain.
+        Only the blocks after the fork are disconnected and connected, using the undo
+        records in the utxo store rather than rebuilding the utxo set.
+        """
+        branch = [tip]
+        while branch[-1].block.previous in self.side_blocks:
+            branch.append(self.side_blocks[branch[-1].block.previous])
+        branch.reverse()
+
+        fork_height = branch[0].block.height - 1
+        disconnected = self._disconnect_to(fork_height)
+
+        for side_block in branch:
+            try:
+                self._connect_side_block(side_block)
+            except TransactionError:
+                # put the old main chain back exactly as it was
+                self._disconnect_to(fork_height)
+                for old_block in disconnected:
+                    self._connect_side_block(old_block)
+
+                self._forget(side_block.block.hash)
+                raise
+
+    def _forget(self, *block_hashes: Digest) -> None:
+        """
+        Removes side blocks and all of their descendants from the block tree.
+        """
+        children: dict[Digest, list[Digest]] = {}
+        for side_hash, side_block in self.side_blocks.items():
+            children.setdefault(side_block.block.previous, []).append(side_hash)
+
+        forgotten = list(block_hashes)
+        while forgotten:
+            side_hash = forgotten.pop()
+            self.side_blocks.pop(side_hash, None)
+            forgotten.extend(children.get(side_hash, ()))
+
+    def _prune_side_blocks(self) -> None:
+        """
+        Forgets side blocks that fork too far below the head to ever be reorganized
+        onto. A side block forks below its own height, so any at or below the lowest
+        height the utxo store can undo to can go, along with their descendants.
+        """
+        if not self.side_blocks:
+            return
+
+        lowest = self.head.height - self.utxos.undo_depth
+        self._forget(
+            *(
+                side_hash
+                for side_hash, side_block in self.side_blocks.items()
+                if side_block.block.height <= lowest
+            )
+        )
+
+    def _catch_up_utxos(self) -> None:
+        """
+        Applies any stored blocks that the utxo store hasn't seen yet.
+        This rebuilds an empty utxo store, or finishes an interrupted add_block.
+        """
+        if self.utxos.best_block is None:
+            start = 0
+        else:
+            height = self.blocks.height_of(self.utxos.best_block)
+            if height is None:
+                raise BlockMismatchError(
+                    f"utxo store is at unknown block {self.utxos.best_block.hex()[:8]}"
+                )
+            start = height + 1
+
+        for height in range(start, len(self)):
+            block = self.blocks[height]
+            spent, created = self._block_delta(block)
+            self.utxos.apply(spent, created, block.hash)
+
+
+def check_block(block: Block) -> None:
+    """
+    Runs the checks on a block's transactions that don't depend on the chain, and
+    computes and caches the hash of the block and every transaction in it.
+    Raises TransactionError if a check fails.
+    """
+    # integers that don't fit in 8 unsigned bytes can't be hashed, so they're checked
+    # before anything else
+    if not all(
+        0 <= value <= MAX_INT for value in (block.height, block.proof, block.timestamp)
+    ):
+        raise TransactionError(
+            f"block @ {block.height} has a height, proof or timestamp out of range."
+        )
+
+    for position, transaction in enumerate(block.transactions):
+        # a transaction is only unique to the block it's at the height of
+        if transaction.height != block.height:
+            raise TransactionError(
+                f"transaction #{position} of block @ {block.height} is at height "
+                f"{transaction.height}."
+            )
+        if any(output.amount < 0 for output in transaction.outputs):
+            raise TransactionError(
+                f"transaction #{position} of block @ {block.height} has a negative output."
+            )
+        if any(output.amount > MAX_INT for output in transaction.outputs):
+            raise TransactionError(
+                f"transaction #{position} of block @ {block.height} has an output too "
+                "large to hash."
+            )
+        if not all(
+            0 <= transaction_input.output_index <= MAX_INT
+            for transaction_input in transaction.inputs
+        ):
+            raise TransactionError(
+                f"transaction #{position} of block @ {block.height} has an input with "
+                "an output index out of range."
+            )
+
+    # every outpoint spent by the block so far, to catch double spends within it
+    spent_in_block: set[Outpoint] = set()
+
+    for transaction in block.transactions:
+        for transaction_input in transaction.inputs:
+            key = (transaction_input.transaction, transaction_input.output_index)
+            if key in spent_in_block:
+                raise TransactionError(
+                    f"{transaction} output #{transaction_input.output_index} is spent twice in {block}."
+                )
+            spent_in_block.add(key)
+
+    # hashes every transaction too
+    block.hash
+
+
+def median_time(timestamps: Sequence[int]) -> int:
+    return sorted(timestamps)[len(timestamps) // 2]
+
+
+def check_timestamp(
+    block: Union[Block, BlockHeader],
+    recent_timestamps: Sequence[int],
+    difficulty: Difficulty,
+) -> None:
+    """
+    Checks that a block's timestamp is later than the median of the given timestamps
+    of the blocks before it, and not too far ahead of our clock.
+    Raises TimestampError if it isn't.
+    """
+    median = median_time(recent_timestamps)
+    if block.timestamp <= median:
+        raise TimestampError(
+            f"{block} must have a timestamp after {median}, the median of the blocks "
+            "before it."
+        )
+
+    latest = int(time.time()) + difficulty.max_future_drift
+    if block.timestamp > latest:
+        raise TimestampError(
+            f"{block} has a timestamp more than {difficulty.max_future_drift} seconds "
+            "in the future."
+        )
+
+
+def _check_encoded_block(data: bytes) -> bytes:
+    """
+    Runs check_block on a serialized block in one of sync's workers, returning the
+    hashes of its transactions followed by the hash of the block, back to back.
+    """
+    block = decode_block(data)
+    check_block(block)
+    return b"".join(transaction.hash for transaction in block.transactions) + block.hash
+
+
+def _set_hashes(block: Block, hashes: bytes) -> None:
+    """
+    Caches the hashes returned by _check_encoded_block on the block.
+    """
+    view = memoryview(hashes)
+    for position, transaction in enumerate(block.transactions):
+        start = position * DIGEST_SIZE
+        Transaction.hash.set(transaction, Digest(view[start : start + DIGEST_SIZE]))
+    Block.hash.set(block, Digest(view[-DIGEST_SIZE:]))
+
+
+def _created_outpoints(block: Block) -> list[Outpoint]:
+    """
+    Returns the outpoints a block added to the utxo set: all of its outputs, except
+    those spent within the block itself.
+    """
+    spent_in_block = {
+        (transaction_input.transaction, transaction_input.output_index)
+        for transaction in block.transactions
+        for transaction_input in transaction.inputs
+    }
+    return [
+        (transaction.hash, output_index)
+        for transaction in block.transactions
+        for output_index in range(len(transaction.outputs))
+        if (transaction.hash, output_index) not in spent_in_block
+    ]
@@ -1,107 +1,344 @@
 # implements a simplified version of the branch & bound algorithm described in
 # https://murch.one/wp-content/uploads/2016/11/erhardt2016coinselection.pdf
+# along with a few simpler strategies to compare it against.
 
+import itertools
 import random
 from copy import copy
+from typing import Generic, Optional, Protocol, TypeVar
 
-from .transaction import UTXO
+from .transaction import Spendable
+
+# coins can be selected from anything with an output, such as UTXOs or stored coins
+T = TypeVar("T", bound=Spendable)
+
+
+class CoinSelector(Protocol):
+    """
+    Picks utxos from the available ones to meet a spend target.
+    Returns an empty list if the target can't be met.
+    """
+
+    def __call__(self, spend_target: int, available_utxos: list[T]) -> list[T]:
+        ...
+
+
+# roughly what it would cost to create a change output and spend it later.
+# change-avoiding selection accepts overshooting the target by up to this much.
+DEFAULT_COST_OF_CHANGE = 1000
 
 
 # the algorithm is implemented as a class to allow it to track the number of attempts
-class BranchAndBound:
-    def __init__(self, attempts: int, available_utxos: list[UTXO]) -> None:
+class BranchAndBound(Generic[T]):
+    def __init__(
+        self, attempts: int, available_utxos: list[T], rng: random.Random
+    ) -> None:
         self.attempts = attempts
-        self.available_utxos = available_utxos
-
-    # this needs refactoring. currently it follows the algorithm described in the paper
-    # pylint: disable=too-many-return-statements
-    def run(
-        self,
-        depth: int,
-        selected_utxos: list[UTXO],
-        amount: int,
-        spend_target: int,
-    ) -> list[UTXO]:
-        utxos_sorted = sorted(
-            self.available_utxos, key=lambda utxo: utxo.output.amount, reverse=True
+        self.rng = rng
+
+        # sorted once up front, largest first
+        self.utxos = sorted(
+            available_utxos, key=lambda utxo: utxo.output.amount, reverse=True
         )
-        self.attempts -= 1
+        self.amounts = [utxo.output.amount for utxo in self.utxos]
 
-        if amount >= spend_target:
-            # we have enough value to reach the spend target
-            return selected_utxos
-
-        if self.attempts <= 0:
-            # we ran out of attempts
-            return []
-
-        if depth >= len(utxos_sorted):
-            # we ran out of utxos
-            return []
-
-        def with_this() -> list[UTXO]:
-            utxo = utxos_sorted[depth]
-            return self.run(
-                depth + 1,
-                selected_utxos + [utxo],
-                amount + utxo.output.amount,
-                spend_target,
-            )
-
-        def without_this() -> list[UTXO]:
-            return self.run(depth + 1, selected_utxos, amount, spend_target)
-
-        # randomly explore next branch
-        if random.choice([True, False]):
-            # explore inclusion branch first, then omission branch
-            if utxos := with_this():
-                return utxos
-
-            if utxos := without_this():
-                return utxos
-        else:
-            # explore omission branch first, then inclusion branch
-            if utxos := without_this():
-                return utxos
-
-            if utxos := with_this():
-                return utxos
+        # remaining[i] is the total value of utxos[i:].
+        # this lets us skip branches that can't reach the target anymore.
+        self.remaining = list(itertools.accumulate(reversed(self.amounts), initial=0))
+        self.remaining.reverse()
+
+    def run(self, spend_target: int) -> list[T]:
+        """
+        Searches depth-first for a set of UTXOs that meets the spend target.
+
+        The search tree is walked with an explicit stack rather than recursion, so
+        large wallets can't hit the recursion limit. Each stack entry is a node in the
+        tree: the depth, the amount selected so far, and whether the UTXO at depth - 1
+        was included on the way there.
+        """
+        # selected[i] is whether utxos[i] is included on the path to the current node.
+        # only the entries before the current depth are meaningful.
+        selected = [False] * len(self.utxos)
+        stack = [(0, 0, False)]
+
+        while stack:
+            depth, amount, included = stack.pop()
+            if depth > 0:
+                selected[depth - 1] = included
+
+            self.attempts -= 1
+
+            if amount >= spend_target:
+                # we have enough value to reach the spend target
+                return [
+                    utxo for utxo, chosen in zip(self.utxos[:depth], selected) if chosen
+                ]
+
+            if self.attempts <= 0:
+                # we ran out of attempts
+                return []
+
+            if depth >= len(self.utxos):
+                # we ran out of utxos on this branch
+                continue
+
+            if amount + self.remaining[depth] < spend_target:
+                # even taking every remaining utxo wouldn't be enough
+                continue
+
+            with_this = (depth + 1, amount + self.amounts[depth], True)
+            without_this = (depth + 1, amount, False)
+
+            # randomly explore next branch. the last one pushed is explored first.
+            if self.rng.random() < 0.5:
+                stack.append(without_this)
+                stack.append(with_this)
+            else:
+                stack.append(with_this)
+                stack.append(without_this)
 
         # if we got here, we ran out of branches to search
         return []
 
 
-def _single_random_draw(spend_target: int, available_utxos: list[UTXO]) -> list[UTXO]:
-    shuffled_pool = copy(available_utxos)
-    random.shuffle(shuffled_pool)
+def _single_random_draw(
+    spend_target: int, available_utxos: list[T], rng: random.Random
+) -> list[T]:
+    if sum(utxo.output.amount for utxo in available_utxos) < spend_target:
+        # the amount cannot be made up, no matter what we draw
+        return []
 
-    selected_utxos: list[UTXO] = []
+    # the front of the pool holds the utxos drawn so far, like a partial fisher-yates
+    # shuffle. only as much of the pool as we need gets shuffled.
+    pool = copy(available_utxos)
+    selected_utxos: list[T] = []
+    selected_amount = 0
 
-    def sum_selected() -> int:
-        return sum(utxo.output.amount for utxo in selected_utxos)
+    for i in range(len(pool)):
+        if selected_amount >= spend_target:
+            break
 
-    while sum_selected() < spend_target:
-        if not shuffled_pool:
-            # ran out of utxos, the amount cannot be made up.
-            return []
+        j = rng.randrange(i, len(pool))
+        pool[i], pool[j] = pool[j], pool[i]
 
-        selected_utxos.append(shuffled_pool.pop())
-        random.shuffle(shuffled_pool)
+        selected_utxos.append(pool[i])
+        selected_amount += pool[i].output.amount
 
     return selected_utxos
 
 
-def select_coins(spend_target: int, available_utxos: list[UTXO]) -> list[UTXO]:
+def select_coins(
+    spend_target: int,
+    available_utxos: list[T],
+    rng: Optional[random.Random] = None,
+) -> list[T]:
     """
     Selects UTXOs ("coins") from a list of unspent transaction outputs to meet a spend target.
+    Pass a seeded rng to make the selection reproducible.
     """
-    bnb = BranchAndBound(attempts=1_000_000, available_utxos=available_utxos)
-    selected_utxos = bnb.run(
-        depth=0, selected_utxos=[], amount=0, spend_target=spend_target
-    )
+    if rng is None:
+        rng = random.Random()
+
+    bnb = BranchAndBound(attempts=1_000_000, available_utxos=available_utxos, rng=rng)
+    selected_utxos = bnb.run(spend_target)
 
     if not selected_utxos:
         # branch & bound failed, resort to single random draw
-        selected_utxos = _single_random_draw(spend_target, available_utxos)
+        selected_utxos = _single_random_draw(spend_target, available_utxos, rng)
 
     return selected_utxos
+
+
+def _take_until(spend_target: int, utxos: list[T]) -> list[T]:
+    selected_utxos: list[T] = []
+    selected_amount = 0
+
+    for utxo in utxos:
+        if selected_amount >= spend_target:
+            break
+        selected_utxos.append(utxo)
+        selected_amount += utxo.output.amount
+
+    if selected_amount < spend_target:
+        return []
+
+    return selected_utxos
+
+
+def largest_first(spend_target: int, available_utxos: list[T]) -> list[T]:
+    """
+    Spends the largest UTXOs first. Uses as few inputs as possible, but leaves the
+    wallet with an ever growing pile of small UTXOs.
+    """
+    return _take_until(
+        spend_target,
+        sorted(available_utxos, key=lambda utxo: utxo.output.amount, reverse=True),
+    )
+
+
+def smallest_first(spend_target: int, available_utxos: list[T]) -> list[T]:
+    """
+    Spends the smallest UTXOs first, consolidating dust into change as it goes.
+    """
+    return _take_until(
+        spend_target, sorted(available_utxos, key=lambda utxo: utxo.output.amount)
+    )
+
+
+def knapsack(
+    spend_target: int,
+    available_utxos: list[T],
+    rng: Optional[random.Random] = None,
+    iterations: int = 1000,
+) -> list[T]:
+    """
+    The stochastic approximation of the smallest sufficient subset that bitcoin core
+    used before branch & bound. Repeatedly includes UTXOs smaller than the target at
+    random, remembering the subset that overshoots the target the least. The smallest
+    single UTXO larger than the target is used instead if it overshoots less.
+    """
+    if rng is None:
+        rng = random.Random()
+
+    smaller: list[T] = []
+    smallest_larger: Optional[T] = None
+
+    for utxo in available_utxos:
+        if utxo.output.amount == spend_target:
+            return [utxo]
+
+        if utxo.output.amount < spend_target:
+            smaller.append(utxo)
+        elif (
+            smallest_larger is None
+            or utxo.output.amount < smallest_larger.output.amount
+        ):
+            smallest_larger = utxo
+
+    smaller_total = sum(utxo.output.amount for utxo in smaller)
+    if smaller_total == spend_target:
+        return smaller
+
+    if smaller_total < spend_target:
+        return [smallest_larger] if smallest_larger is not None else []
+
+    smaller.sort(key=lambda utxo: utxo.output.amount, reverse=True)
+    amounts = [utxo.output.amount for utxo in smaller]
+
+    best = [True] * len(smaller)
+    best_total = smaller_total
+
+    for _ in range(iterations):
+        if best_total == spend_target:
+            break
+
+        included = [False] * len(smaller)
+        total = 0
+        reached_target = False
+
+        # first pass includes utxos at random, second pass fills in the rest
+        for random_pass in (True, False):
+            if reached_target:
+                break
+
+            for i, amount in enumerate(amounts):
+                if included[i] or (random_pass and rng.random() < 0.5):
+                    continue
+
+                total += amount
+                included[i] = True
+
+                if total >= spend_target:
+                    reached_target = True
+                    if total < best_total:
+                        best_total = total
+                        best = copy(included)
+
+                    # back out and see if a smaller utxo gets closer
+                    total -= amount
+                    included[i] = False
+
+    if smallest_larger is not None and smallest_larger.output.amount <= best_total:
+        return [smallest_larger]
+
+    return [utxo for utxo, chosen in zip(smaller, best) if chosen]
+
+
+def _least_waste_match(
+    spend_target: int, available_utxos: list[T], cost_of_change: int, attempts: int
+) -> list[T]:
+    """
+    Depth-first search for the subset closest to the spend target without exceeding
+    it by more than the cost of change. Such a subset needs no change output.
+    """
+    utxos = sorted(available_utxos, key=lambda utxo: utxo.output.amount, reverse=True)
+    amounts = [utxo.output.amount for utxo in utxos]
+    remaining = list(itertools.accumulate(reversed(amounts), initial=0))
+    remaining.reverse()
+
+    upper_bound = spend_target + cost_of_change
+    best: list[T] = []
+    best_waste = cost_of_change + 1
+
+    # same node layout as BranchAndBound.run, but always trying inclusion first
+    selected = [False] * len(utxos)
+    stack = [(0, 0, False)]
+
+    while stack and attempts > 0:
+        depth, amount, included = stack.pop()
+        if depth > 0:
+            selected[depth - 1] = included
+
+        attempts -= 1
+
+        if amount > upper_bound or amount + remaining[depth] < spend_target:
+            continue
+
+        if amount >= spend_target:
+            if amount - spend_target < best_waste:
+                best_waste = amount - spend_target
+                best = [u for u, chosen in zip(utxos[:depth], selected) if chosen]
+
+                if best_waste == 0:
+                    break
+
+            # adding more can only increase the waste
+            continue
+
+        if depth < len(utxos):
+            stack.append((depth + 1, amount, False))
+            stack.append((depth + 1, amount + amounts[depth], True))
+
+    return best
+
+
+def change_avoiding(
+    cost_of_change: int = DEFAULT_COST_OF_CHANGE, attempts: int = 100_000
+) -> CoinSelector:
+    """
+    Builds a branch & bound selector that only accepts selections within cost_of_change
+    of the target, preferring the one that wastes the least. These don't need a change
+    output at all. Falls back to knapsack when no such selection exists.
+    """
+
+    def select(spend_target: int, available_utxos: list[T]) -> list[T]:
+        selected_utxos = _least_waste_match(
+            spend_target, available_utxos, cost_of_change, attempts
+        )
+
+        if not selected_utxos:
+            selected_utxos = knapsack(spend_target, available_utxos)
+
+        return selected_utxos
+
+    return select
+
+
+# the built-in coin selectors by name
+STRATEGIES: dict[str, CoinSelector] = {
+    "default": select_coins,
+    "largest-first": largest_first,
+    "smallest-first": smallest_first,
+    "knapsack": knapsack,
+    "change-avoiding": change_avoiding(),
+}
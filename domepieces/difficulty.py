@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+
+from .encoding import DIGEST_BITS, DIGEST_SIZE
+
+# the easiest possible target; every digest meets it
+MAX_TARGET = (1 << DIGEST_BITS) - 1
+
+
+@dataclass(frozen=True, order=True)
+class Target:
+    """
+    A digest meets the target if, read as a big-endian integer, it is no greater than
+    value. Smaller values are harder to meet.
+    """
+
+    value: int
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.value <= MAX_TARGET:
+            raise ValueError(f"target must be between 0 and {MAX_TARGET:#x}")
+
+    @staticmethod
+    def from_bits(leading_zero_bits: int) -> "Target":
+        """
+        Returns the target that requires the given number of leading zero bits.
+        """
+        return Target(MAX_TARGET >> leading_zero_bits)
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the target as a digest-sized big-endian byte string.
+        Digests meet the target if they compare less than or equal to this.
+        """
+        return self.value.to_bytes(DIGEST_SIZE, "big")
+
+    def is_met_by(self, digest: bytes) -> bool:
+        return int.from_bytes(digest, "big") <= self.value
+
+    @property
+    def work(self) -> int:
+        """
+        The expected number of hashes needed to meet this target.
+        """
+        return (MAX_TARGET + 1) // (self.value + 1)
+
+
+@dataclass(frozen=True)
+class Difficulty:
+    """
+    Controls how the target changes over time.
+
+    Every `interval` blocks the target is scaled by how long the last `interval` blocks
+    actually took compared to how long they should have taken, so block times drift
+    back towards `block_time` as hash power comes and goes. Each adjustment is limited
+    to a factor of `max_adjustment` in either direction.
+
+    Since retargeting trusts block timestamps, a block's timestamp must be later than
+    the median of the `median_time_span` blocks before it, and no more than
+    `max_future_drift` seconds ahead of the clock of the node checking it.
+    """
+
+    initial_target: Target = Target.from_bits(16)
+    interval: int = 10
+    block_time: int = 60
+    max_adjustment: int = 4
+    median_time_span: int = 11
+
+    # kept well below the length of an interval, so a late timestamp can only ease
+    # the target a little
+    max_future_drift: int = 2 * 60
+
+    def __post_init__(self) -> None:
+        if self.interval < 2:
+            raise ValueError("retarget interval must be at least 2 blocks")
+        if self.median_time_span < 1:
+            raise ValueError("median time span must be at least 1 block")
+        if self.max_future_drift < 0:
+            raise ValueError("max future drift can't be negative")
+
+    def is_retarget_height(self, height: int) -> bool:
+        return height >= self.interval and height % self.interval == 0
+
+    def retarget(self, target: Target, timespan: int) -> Target:
+        """
+        Adjusts the target given how many seconds the last interval took.
+        The timespan is measured between the first and last blocks of the interval.
+        """
+        expected = (self.interval - 1) * self.block_time
+        timespan = max(
+            expected // self.max_adjustment,
+            min(timespan, expected * self.max_adjustment),
+            1,
+        )
+        return Target(min(target.value * timespan // expected, MAX_TARGET))
@@ -2,8 +2,27 @@ from Cryptodome.Hash import BLAKE2b
 
 ALGO = BLAKE2b
 DIGEST_BITS = 512
+DIGEST_SIZE = DIGEST_BITS // 8
 HEX_DIGEST_LENGTH = DIGEST_BITS // 4
 
+# integers are hashed as 8 unsigned bytes, so they must fit in them
+MAX_INT = (1 << 64) - 1
+
+
+class Digest(bytes):
+    """
+    A raw hash digest. Digests are kept as bytes everywhere, and only rendered as hex
+    when they're displayed.
+    """
+
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return self.hex()
+
+    def __repr__(self) -> str:
+        return f"Digest.fromhex({self.hex()!r})"
+
 
 class Encoder:
     def __init__(self) -> None:
@@ -15,9 +34,23 @@ class Encoder:
     def add_str(self, string: str) -> None:
         self.hasher.update(string.encode())
 
-    def digest(self) -> str:
-        return self.hasher.hexdigest()
+    def add_digest(self, digest: bytes) -> None:
+        self.hasher.update(digest)
+
+    def digest(self) -> Digest:
+        return Digest(self.hasher.digest())
+
+
+def check_digest(name: str, digest: bytes) -> None:
+    """
+    Raises ValueError if the digest isn't exactly DIGEST_SIZE bytes. Headers are
+    packed with fixed-width digest fields, which would silently pad or truncate it.
+    """
+    if len(digest) != DIGEST_SIZE:
+        raise ValueError(
+            f"{name} must be a {DIGEST_SIZE} byte digest, not {len(digest)} bytes"
+        )
 
 
-def zero_hash() -> str:
-    return "0" * HEX_DIGEST_LENGTH
+def zero_hash() -> Digest:
+    return Digest(DIGEST_SIZE)
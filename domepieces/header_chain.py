@@ -0,0 +1,192 @@
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from .block import Block, BlockHeader
+from .blockchain import (
+    BlockMismatchError,
+    ProofOfWorkError,
+    check_timestamp,
+    median_time,
+)
+from .difficulty import Difficulty, Target
+from .encoding import Digest
+from .slots import slotted
+
+
+@slotted
+@dataclass(frozen=True)
+class HeaderEntry:
+    """
+    A header in the header tree, with the target it was mined against.
+    """
+
+    header: BlockHeader
+    target: Target
+
+    # the total work of the branch up to and including this header
+    work: int
+
+
+class HeaderChain:
+    """
+    Follows the chain with the most work using only block headers.
+
+    Headers are checked for linkage, height, proof of work and timestamp, exactly as
+    Blockchain.add_block checks blocks, but nothing about their transactions. The full
+    blocks can be fetched and added to a Blockchain afterwards, in the order given by
+    the main chain here.
+    """
+
+    def __init__(self, difficulty: Difficulty = Difficulty()) -> None:
+        self.difficulty = difficulty
+
+        genesis = Block.genesis().header
+        target = difficulty.initial_target
+
+        # every known header by hash, on any branch
+        self.entries: dict[Digest, HeaderEntry] = {
+            genesis.hash: HeaderEntry(genesis, target, target.work)
+        }
+
+        # the headers of the main chain, by height
+        self.headers: list[BlockHeader] = [genesis]
+
+    def __len__(self) -> int:
+        return len(self.headers)
+
+    def __iter__(self) -> Iterator[BlockHeader]:
+        return iter(self.headers)
+
+    def __getitem__(self, height: int) -> BlockHeader:
+        return self.headers[height]
+
+    @property
+    def tip(self) -> BlockHeader:
+        return self.headers[-1]
+
+    @property
+    def work(self) -> int:
+        """
+        The total work of the main chain.
+        """
+        return self.entries[self.tip.hash].work
+
+    def get(self, block_hash: Digest) -> Optional[BlockHeader]:
+        entry = self.entries.get(block_hash)
+        return None if entry is None else entry.header
+
+    def height_of(self, block_hash: Digest) -> Optional[int]:
+        """
+        Returns the height of the header with the given hash if it's on the main
+        chain, or None otherwise.
+        """
+        entry = self.entries.get(block_hash)
+        if entry is None or not self._on_main_chain(entry.header):
+            return None
+        return entry.header.height
+
+    def next_target(self) -> Target:
+        return self._next_target(self.entries[self.tip.hash])
+
+    def median_time_past(self) -> int:
+        """
+        See Blockchain.median_time_past.
+        """
+        return median_time(self._recent_timestamps(self.tip))
+
+    def add_header(self, header: BlockHeader) -> None:
+        """
+        Adds a header to the header tree, switching the main chain to its branch if
+        that branch now has the most work.
+        """
+        parent = self.entries.get(header.previous)
+        if parent is None:
+            raise BlockMismatchError(f"{header} must have a known block as its parent.")
+
+        if header.height != parent.header.height + 1:
+            raise BlockMismatchError(
+                f"{header} must have height {parent.header.height + 1}"
+            )
+
+        if header.hash in self.entries:
+            raise BlockMismatchError(f"{header} is already in the header tree.")
+
+        target = self._next_target(parent)
+        if not target.is_met_by(header.hash):
+            raise ProofOfWorkError(f"{header} does not meet the required target")
+
+        check_timestamp(header, self._recent_timestamps(parent.header), self.difficulty)
+
+        entry = HeaderEntry(header, target, parent.work + target.work)
+        self.entries[header.hash] = entry
+
+        if parent.header is self.tip:
+            self.headers.append(header)
+        elif entry.work > self.work:
+            self._reorganize(entry)
+
+    def add_headers(self, headers: Iterable[BlockHeader]) -> int:
+        """
+        Adds a run of headers in order, such as a batch received during a header
+        sync. Returns how many were added. Headers before an invalid one are kept.
+        """
+        added = 0
+        for header in headers:
+            self.add_header(header)
+            added += 1
+        return added
+
+    def _on_main_chain(self, header: BlockHeader) -> bool:
+        height = header.height
+        return height < len(self.headers) and self.headers[height] is header
+
+    def _ancestor(self, entry: HeaderEntry, height: int) -> BlockHeader:
+        """
+        Returns the ancestor of the given header at the given height, following side
+        branches back to the main chain.
+        """
+        header = entry.header
+        while header.height > height:
+            if self._on_main_chain(header):
+                return self.headers[height]
+            header = self.entries[header.previous].header
+        return header
+
+    def _recent_timestamps(self, parent: BlockHeader) -> list[int]:
+        """
+        Returns the timestamps of the given header and the headers before it, up to
+        the difficulty's median time span.
+        """
+        timestamps = [parent.timestamp]
+        header = parent
+        while len(timestamps) < self.difficulty.median_time_span and header.height > 0:
+            header = self.entries[header.previous].header
+            timestamps.append(header.timestamp)
+        return timestamps
+
+    def _next_target(self, parent: HeaderEntry) -> Target:
+        """
+        Returns the target that a child of the given header must meet.
+        See Blockchain._next_target.
+        """
+        height = parent.header.height + 1
+        if not self.difficulty.is_retarget_height(height):
+            return parent.target
+
+        first = self._ancestor(parent, height - self.difficulty.interval)
+        return self.difficulty.retarget(
+            parent.target, parent.header.timestamp - first.timestamp
+        )
+
+    def _reorganize(self, tip: HeaderEntry) -> None:
+        """
+        Makes the branch ending at the given header the main chain.
+        """
+        branch: list[BlockHeader] = []
+        header = tip.header
+        while not self._on_main_chain(header):
+            branch.append(header)
+            header = self.entries[header.previous].header
+
+        del self.headers[header.height + 1 :]
+        self.headers.extend(reversed(branch))
@@ -1,11 +1,32 @@
+import heapq
+import itertools
 import uuid
-from dataclasses import asdict, dataclass, field
-from typing import Any, Iterator, Optional
+from collections import ChainMap
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from typing import Any, Iterable, Iterator, Literal, Optional
 
 import msgpack
 import plyvel
 
-from .encoding import Encoder
+from .blockchain import Blockchain, TransactionError
+from .coin_selection import CoinSelector
+from .encoding import DIGEST_SIZE, Digest, Encoder
+from .utxo_store import Outpoint
+
+# key prefixes for each kind of record in the database
+TRANSACTION_PREFIX = b"t"
+FEE_PREFIX = b"f"
+ARRIVAL_PREFIX = b"a"
+SEQUENCE_KEY = b"m:sequence"
+
+# fees are stored as 8 bytes in the fee index
+MAX_FEE = (1 << 64) - 1
+
+# the orders a mempool can hand out its transactions in:
+# "fee" is highest fee first, and oldest first among equal fees.
+# "arrival" is oldest first.
+Order = Literal["fee", "arrival"]
 
 
 @dataclass(frozen=True)
@@ -13,15 +34,29 @@ class PendingTransaction:
     sender: str
     recipient: str
     amount: int
+
+    # what the sender pays on top of the amount to the miner that includes it.
+    # every pending transaction becomes a transaction of much the same size, so the
+    # fee doubles as the fee rate.
+    fee: int = 0
+
     uid: str = field(default_factory=lambda: uuid.uuid4().hex)
 
-    @property
-    def hash(self) -> str:
+    # the coins the transaction spends and their total value, reserved for it when a
+    # pool that checks funds admits it. they aren't part of the hash, so a transaction
+    # is the same one whether or not its coins have been picked yet.
+    inputs: tuple[Outpoint, ...] = ()
+    input_amount: int = 0
+
+    # computed once, since the hash keys the transaction's record and index entries
+    @cached_property
+    def hash(self) -> Digest:
         enc = Encoder()
         enc.add_str(self.uid)
         enc.add_str(self.sender)
         enc.add_str(self.recipient)
         enc.add_int(self.amount)
+        enc.add_int(self.fee)
         return enc.digest()
 
 
@@ -30,13 +65,110 @@ class MempoolClosedError(Exception):
         super().__init__("Mempool is not open")
 
 
+class MempoolFullError(Exception):
+    pass
+
+
+def _encode_record(transaction: PendingTransaction, sequence: int) -> bytes:
+    # a plain tuple rather than asdict, which is slow and repeats the field names
+    packed: bytes = msgpack.packb(
+        (
+            transaction.sender,
+            transaction.recipient,
+            transaction.amount,
+            transaction.fee,
+            transaction.uid,
+            transaction.inputs,
+            transaction.input_amount,
+            sequence,
+        )
+    )
+    return packed
+
+
+def _decode_record(data: bytes) -> tuple[PendingTransaction, int]:
+    record = msgpack.unpackb(data)
+    sender, recipient, amount, fee, uid, inputs, input_amount, sequence = record
+    transaction = PendingTransaction(
+        sender,
+        recipient,
+        amount,
+        fee,
+        uid,
+        tuple((Digest(digest), index) for digest, index in inputs),
+        input_amount,
+    )
+    return transaction, sequence
+
+
+def _fee_key(transaction: PendingTransaction, sequence: int) -> bytes:
+    # fees are inverted so the highest fee sorts first
+    return (
+        FEE_PREFIX
+        + (MAX_FEE - transaction.fee).to_bytes(8, "big")
+        + sequence.to_bytes(8, "big")
+        + transaction.hash
+    )
+
+
+def _arrival_key(transaction: PendingTransaction, sequence: int) -> bytes:
+    return ARRIVAL_PREFIX + sequence.to_bytes(8, "big") + transaction.hash
+
+
 class Mempool:
-    def __init__(self, db_path: str) -> None:
+    """
+    Holds pending transactions in LevelDB until they're mined.
+
+    Besides the transactions themselves, keyed by hash, the pool keeps an index by fee
+    and an index by arrival, so transactions can be streamed in either order. Each
+    transaction's arrival is a sequence number stored with it. If max_size is given,
+    the cheapest transactions are evicted once the pool is full.
+
+    While open, the pool also keeps every transaction decoded in memory, updated after
+    each write, so counting, lookups and iterating don't decode records.
+
+    Given a blockchain, the pool only admits transactions its utxo set can pay for.
+    Each one is given coins, which are reserved for it until it leaves the pool, so no
+    two pending transactions ever spend the same coin.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        order: Order = "fee",
+        max_size: Optional[int] = None,
+        blockchain: Optional[Blockchain] = None,
+        coin_selector: Optional[CoinSelector] = None,
+    ) -> None:
         self.db_path = db_path
         self.db: Optional[plyvel.DB] = None
 
+        # the order iterating over the pool gives
+        self.order = order
+
+        # how many transactions the pool holds at most. None is unlimited.
+        self.max_size = max_size
+
+        # the chain transactions are checked against. None admits anything.
+        self.blockchain = blockchain
+
+        # how to pick coins for transactions that don't name them. None uses the
+        # blockchain's coin selector.
+        self.coin_selector = coin_selector
+
+        # every pooled transaction and its sequence number, by hash
+        self._cache: dict[Digest, tuple[PendingTransaction, int]] = {}
+
+        # the hash of the pooled transaction each reserved coin is promised to
+        self._reserved: dict[Outpoint, Digest] = {}
+
     def __enter__(self) -> "Mempool":
         self.db = plyvel.DB(self.db_path, create_if_missing=True)
+
+        for data in self.db.iterator(prefix=TRANSACTION_PREFIX, include_key=False):
+            self._cache_entry(*_decode_record(data))
+
         return self
 
     def __exit__(self, *args: Any) -> None:
@@ -44,28 +176,285 @@ class Mempool:
         assert self.db is not None
         self.db.close()
         self.db = None
+        self._cache.clear()
+        self._reserved.clear()
+
+    def __len__(self) -> int:
+        self._open_db()
+        return len(self._cache)
+
+    def __contains__(self, item: object) -> bool:
+        """
+        Checks whether a transaction, or a transaction hash, is in the pool.
+        """
+        self._open_db()
+        if isinstance(item, PendingTransaction):
+            item = item.hash
+        return item in self._cache
 
     def __iter__(self) -> Iterator[PendingTransaction]:
-        if self.db is None:
-            raise MempoolClosedError
+        """
+        Iterates over the pool in its order. Transactions can be deleted while
+        iterating, and are skipped if they haven't been reached yet.
+        """
+        prefix = FEE_PREFIX if self.order == "fee" else ARRIVAL_PREFIX
+        for transaction, _ in self._iter_index(prefix, reverse=False):
+            yield transaction
 
-        with self.db.snapshot() as snapshot:
-            for _, data in snapshot:
-                yield PendingTransaction(**msgpack.unpackb(data))
+    def get(self, transaction_hash: Digest) -> Optional[PendingTransaction]:
+        self._open_db()
+        entry = self._cache.get(transaction_hash)
+        return None if entry is None else entry[0]
 
     def create_transaction(
-        self, sender: str, recipient: str, amount: int
+        self, sender: str, recipient: str, amount: int, fee: int = 0
     ) -> PendingTransaction:
-        if self.db is None:
-            raise MempoolClosedError
+        """
+        Adds a new pending transaction to the pool. If the pool is full, the cheapest
+        transaction is evicted to make room, and if there is none cheaper than the new
+        one, MempoolFullError is raised and nothing is added.
 
-        transaction = PendingTransaction(sender, recipient, amount)
-        data = msgpack.packb(asdict(transaction))
-        self.db.put(transaction.hash.encode(), data)
+        If the pool checks funds, TransactionError is raised when the sender can't pay
+        with coins that aren't already reserved.
+        """
+        transaction = PendingTransaction(sender, recipient, amount, fee)
+        if self.blockchain is not None:
+            transaction = self._reserve(transaction, {})
+
+        if not self.create_transactions([transaction]):
+            raise MempoolFullError(
+                f"the pool is full, and a fee of {fee} doesn't beat any transaction in it."
+            )
         return transaction
 
+    def create_transactions(
+        self, transactions: Iterable[PendingTransaction], *, sync: bool = False
+    ) -> list[PendingTransaction]:
+        """
+        Adds many pending transactions to the pool in a single write batch, and returns
+        the ones that were kept. Transactions already in the pool are skipped.
+
+        If the pool checks funds, transactions that name their inputs must spend unspent
+        coins of the sender that no other pending transaction has reserved, and the
+        others are given coins. Transactions that can't be paid for are skipped.
+
+        If the pool overflows, the cheapest transactions are evicted, whether they were
+        already in the pool or are being added, newest first among equal fees.
+        With sync, the write is flushed to disk before returning.
+        """
+        db = self._open_db()
+
+        new: dict[Digest, PendingTransaction] = {}
+
+        # coins reserved by transactions in this batch
+        reserved: dict[Outpoint, Digest] = {}
+
+        for transaction in transactions:
+            if not 0 <= transaction.fee <= MAX_FEE:
+                raise ValueError(f"fee must be between 0 and {MAX_FEE}")
+            if transaction.hash in self._cache or transaction.hash in new:
+                continue
+
+            if self.blockchain is not None:
+                try:
+                    transaction = self._reserve(transaction, reserved)
+                except TransactionError:
+                    continue
+                reserved.update(dict.fromkeys(transaction.inputs, transaction.hash))
+
+            new[transaction.hash] = transaction
+
+        count = len(self._cache)
+        sequence_data = db.get(SEQUENCE_KEY)
+        first_sequence = (
+            0 if sequence_data is None else int(msgpack.unpackb(sequence_data))
+        )
+        entries = list(zip(new.values(), itertools.count(first_sequence)))
+
+        evicted: list[tuple[PendingTransaction, int]] = []
+        overflow = 0 if self.max_size is None else count + len(new) - self.max_size
+        if overflow > 0:
+            # both run from the cheapest transaction up, newest first among equal fees,
+            # so merging them gives the order to evict in
+            def eviction_order(
+                entry: tuple[PendingTransaction, int]
+            ) -> tuple[int, int]:
+                transaction, sequence = entry
+                return transaction.fee, -sequence
+
+            candidates = heapq.merge(
+                self._iter_index(FEE_PREFIX, reverse=True),
+                sorted(entries, key=eviction_order),
+                key=eviction_order,
+            )
+            evicted = list(itertools.islice(candidates, overflow))
+
+        evicted_sequences = {sequence for _, sequence in evicted}
+        kept = [entry for entry in entries if entry[1] not in evicted_sequences]
+
+        with db.write_batch(transaction=True, sync=sync) as batch:
+            for transaction, sequence in kept:
+                self._put(batch, transaction, sequence)
+
+            for transaction, sequence in evicted:
+                # transactions being added were never written
+                if sequence < first_sequence:
+                    self._delete(batch, transaction, sequence)
+
+            batch.put(SEQUENCE_KEY, msgpack.packb(first_sequence + len(new)))
+
+        # only once the batch is written, so a failed write leaves the cache as it was
+        for transaction, sequence in evicted:
+            self._uncache_entry(transaction)
+        for transaction, sequence in kept:
+            self._cache_entry(transaction, sequence)
+
+        return [transaction for transaction, _ in kept]
+
     def delete_transaction(self, transaction: PendingTransaction) -> None:
+        self.delete_transactions([transaction])
+
+    def delete_transactions(
+        self, transactions: Iterable[PendingTransaction], *, sync: bool = False
+    ) -> None:
+        """
+        Removes many transactions from the pool in a single write batch, such as the
+        ones just mined. Transactions that aren't in the pool are ignored.
+        With sync, the write is flushed to disk before returning.
+        """
+        db = self._open_db()
+        deleted: dict[Digest, tuple[PendingTransaction, int]] = {}
+
+        for transaction in transactions:
+            entry = self._cache.get(transaction.hash)
+            if entry is not None:
+                deleted[transaction.hash] = entry
+
+        if not deleted:
+            return
+
+        with db.write_batch(transaction=True, sync=sync) as batch:
+            for transaction, sequence in deleted.values():
+                self._delete(batch, transaction, sequence)
+
+        for transaction, _ in deleted.values():
+            self._uncache_entry(transaction)
+
+    def _open_db(self) -> plyvel.DB:
         if self.db is None:
             raise MempoolClosedError
+        return self.db
+
+    def _reserve(
+        self, transaction: PendingTransaction, reserved: dict[Outpoint, Digest]
+    ) -> PendingTransaction:
+        """
+        Checks that the sender can pay for the transaction with coins that neither the
+        pool nor the given batch has reserved, picking the coins if the transaction
+        doesn't name them. Returns the transaction with its coins, or raises
+        TransactionError.
+        """
+        assert self.blockchain is not None
+
+        # the chain may be changing on another thread, such as the event loop's while
+        # an AsyncMempool writes on its executor
+        with self.blockchain.lock:
+            unavailable = ChainMap(reserved, self._reserved)
+            cost = transaction.amount + transaction.fee
+
+            if not transaction.inputs:
+                coins = self.blockchain.find_utxos(
+                    transaction.sender,
+                    cost,
+                    coin_selector=self.coin_selector,
+                    exclude=unavailable,
+                )
+                return replace(
+                    transaction,
+                    inputs=tuple(coin.outpoint for coin in coins),
+                    input_amount=sum(coin.amount for coin in coins),
+                )
+
+            if len(set(transaction.inputs)) != len(transaction.inputs):
+                raise TransactionError("pending transaction spends a coin twice.")
+
+            input_amount = 0
+            for outpoint in transaction.inputs:
+                if outpoint in unavailable:
+                    raise TransactionError(
+                        f"coin {outpoint[0].hex()[:8]}:{outpoint[1]} is already "
+                        "reserved by pending transaction "
+                        f"{unavailable[outpoint].hex()[:8]}."
+                    )
+
+                coin = self.blockchain.utxos.get(outpoint)
+                if coin is None or coin.recipient != transaction.sender:
+                    raise TransactionError(
+                        f"{transaction.sender} has no unspent coin "
+                        f"{outpoint[0].hex()[:8]}:{outpoint[1]}."
+                    )
+                input_amount += coin.amount
+
+            if input_amount != transaction.input_amount:
+                raise TransactionError(
+                    f"pending transaction claims its inputs are worth "
+                    f"{transaction.input_amount}, but they are worth {input_amount}."
+                )
+            if input_amount < cost:
+                raise TransactionError(f"{transaction.sender} has insufficient funds.")
+
+            return transaction
+
+    def _cache_entry(self, transaction: PendingTransaction, sequence: int) -> None:
+        self._cache[transaction.hash] = transaction, sequence
+        self._reserved.update(dict.fromkeys(transaction.inputs, transaction.hash))
+
+    def _uncache_entry(self, transaction: PendingTransaction) -> None:
+        # transactions evicted from the batch they were added in were never cached
+        if self._cache.pop(transaction.hash, None) is None:
+            return
+        for outpoint in transaction.inputs:
+            del self._reserved[outpoint]
+
+    @staticmethod
+    def _put(
+        # a plyvel write batch, which plyvel doesn't export a type for
+        batch: Any,
+        transaction: PendingTransaction,
+        sequence: int,
+    ) -> None:
+        """
+        Writes a transaction and its index entries to the batch.
+        """
+        batch.put(
+            TRANSACTION_PREFIX + transaction.hash,
+            _encode_record(transaction, sequence),
+        )
+        batch.put(_fee_key(transaction, sequence), b"")
+        batch.put(_arrival_key(transaction, sequence), b"")
+
+    @staticmethod
+    def _delete(batch: Any, transaction: PendingTransaction, sequence: int) -> None:
+        """
+        Writes the deletion of a transaction and its index entries to the batch.
+        """
+        batch.delete(TRANSACTION_PREFIX + transaction.hash)
+        batch.delete(_fee_key(transaction, sequence))
+        batch.delete(_arrival_key(transaction, sequence))
+
+    def _iter_index(
+        self, prefix: bytes, *, reverse: bool
+    ) -> Iterator[tuple[PendingTransaction, int]]:
+        """
+        Iterates over the transactions in an index, along with their sequence numbers.
+        """
+        db = self._open_db()
 
-        self.db.delete(transaction.hash.encode())
+        with db.snapshot() as snapshot:
+            for key in snapshot.iterator(
+                prefix=prefix, include_value=False, reverse=reverse
+            ):
+                # deleted since the snapshot was taken
+                entry = self._cache.get(Digest(key[-DIGEST_SIZE:]))
+                if entry is not None:
+                    yield entry
@@ -0,0 +1,123 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Sequence
+
+from .encoding import DIGEST_SIZE, Digest, zero_hash
+from .slots import slotted
+
+# leaves and inner nodes are hashed with different prefixes, so a transaction hash
+# can never be passed off as the root of a subtree, or the other way around
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+def _hash_leaf(leaf: bytes) -> bytes:
+    # the same blake2b as Encoder, but hashlib's is much cheaper to set up
+    return hashlib.blake2b(_LEAF_PREFIX + leaf, digest_size=DIGEST_SIZE).digest()
+
+
+def _hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.blake2b(
+        _NODE_PREFIX + left + right, digest_size=DIGEST_SIZE
+    ).digest()
+
+
+def _next_level(level: list[bytes]) -> list[bytes]:
+    # a node without a sibling moves up a level unchanged, rather than being paired
+    # with a copy of itself, so two different lists of leaves never share a root
+    parents = [
+        _hash_node(level[index], level[index + 1])
+        for index in range(0, len(level) - 1, 2)
+    ]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(leaves: Sequence[bytes]) -> Digest:
+    """
+    Returns the root of the merkle tree over the given hashes, in order.
+    The root of an empty tree is the zero hash.
+    """
+    if not leaves:
+        return zero_hash()
+
+    level = [_hash_leaf(leaf) for leaf in leaves]
+    while len(level) > 1:
+        level = _next_level(level)
+
+    return Digest(level[0])
+
+
+@slotted
+@dataclass(frozen=True)
+class MerkleProof:
+    """
+    Proves that a hash is in a merkle tree, without the rest of the tree's leaves.
+    """
+
+    # the position of the proven leaf, and how many leaves the tree has. together
+    # they give the shape of the path up to the root.
+    index: int
+    leaf_count: int
+
+    # the sibling hashes on the path from the leaf up to the root, leaf first.
+    # levels where the path has no sibling are skipped.
+    siblings: Sequence[Digest]
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "siblings", tuple(self.siblings))
+
+    def verify(self, leaf: bytes, root: bytes) -> bool:
+        """
+        Returns whether leaf is in the tree with the given root, at this proof's index.
+        """
+        if not 0 <= self.index < self.leaf_count:
+            return False
+
+        node = _hash_leaf(leaf)
+        siblings = iter(self.siblings)
+        index = self.index
+        width = self.leaf_count
+
+        while width > 1:
+            if index % 2 or index + 1 < width:
+                sibling = next(siblings, None)
+                if sibling is None:
+                    return False
+
+                if index % 2:
+                    node = _hash_node(sibling, node)
+                else:
+                    node = _hash_node(node, sibling)
+
+            index //= 2
+            width = (width + 1) // 2
+
+        # every sibling has to be used exactly once
+        if next(siblings, None) is not None:
+            return False
+
+        return node == root
+
+
+def merkle_proof(leaves: Sequence[bytes], index: int) -> MerkleProof:
+    """
+    Returns a proof that the leaf at index is in the merkle tree over leaves.
+    """
+    if not 0 <= index < len(leaves):
+        raise IndexError(f"no leaf #{index} in a tree of {len(leaves)} leaves.")
+
+    siblings: list[Digest] = []
+    level = [_hash_leaf(leaf) for leaf in leaves]
+    position = index
+
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            siblings.append(Digest(level[sibling]))
+
+        level = _next_level(level)
+        position //= 2
+
+    return MerkleProof(index=index, leaf_count=len(leaves), siblings=siblings)
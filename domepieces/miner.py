@@ -1,17 +1,26 @@
 import itertools
-from dataclasses import dataclass
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Iterable, Optional
 
 from .block import Block
-from .blockchain import Blockchain
+from .blockchain import BLOCK_REWARD, Blockchain, TransactionError
+from .coin_selection import CoinSelector
+from .encoding import Digest
 from .mempool import Mempool, PendingTransaction
+from .merkle import merkle_root
+from .proof_of_work import ProofOfWork, mine_parallel
 from .transaction import Transaction, TransactionInput, TransactionOutput
+from .utxo_store import Outpoint
 
 
 @dataclass(frozen=True)
 class UnminedBlock:
     height: int
     transactions: list[Transaction]
-    previous: str
+    previous: Digest
+    timestamp: int
 
     def to_block(self, proof: int) -> Block:
         return Block(
@@ -19,55 +28,124 @@ class UnminedBlock:
             transactions=self.transactions,
             proof=proof,
             previous=self.previous,
+            timestamp=self.timestamp,
         )
 
 
 class Miner:
-    def __init__(self, *, mempool: Mempool, blockchain: Blockchain, address: str):
+    def __init__(
+        self,
+        *,
+        mempool: Mempool,
+        blockchain: Blockchain,
+        address: str,
+        workers: int = 1,
+        coin_selector: Optional[CoinSelector] = None,
+        max_transactions: Optional[int] = None,
+    ):
         self.mempool = mempool
         self.blockchain = blockchain
         self.address = address
 
+        # how many processes to search for a proof with
+        self.workers = workers
+
+        # how to pick the sender's utxos for transactions the mempool didn't reserve
+        # coins for. None uses the blockchain's coin selector.
+        self.coin_selector = coin_selector
+
+        # how many pending transactions to consider for each block, taken from the
+        # front of the mempool. None considers the whole pool.
+        self.max_transactions = max_transactions
+
+        # the worker pool searching for proofs, started on the first parallel block
+        # and kept until close so each block doesn't pay to spawn processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "Miner":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shuts down the worker pool, if one was started. Mining again starts a new one.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
     def mine(self) -> Block:
-        pending_transactions = list(self.mempool)
-        transactions, pending_transactions = self._build_transaction_set(
-            pending_transactions,
+        # streamed from the pool, so only the transactions considered are read
+        candidates = itertools.islice(self.mempool, self.max_transactions)
+        transactions, pending_transactions, stale = self._build_transaction_set(
+            candidates,
             height=len(self.blockchain),
         )
+        self.mempool.delete_transactions(stale)
+
         block = self._mine_block(transactions)
 
-        for transaction in pending_transactions:
-            self.mempool.delete_transaction(transaction)
+        self.mempool.delete_transactions(pending_transactions)
 
         return block
 
     def _build_transaction_set(
-        self, pending_transactions: list[PendingTransaction], *, height: int
-    ) -> tuple[list[Transaction], list[PendingTransaction]]:
-        # we start with our coinbase reward
-        transactions: list[Transaction] = [
-            Transaction(
-                height=height,
-                inputs=[],
-                outputs=[TransactionOutput(recipient=self.address, amount=int(50e8))],
-            )
-        ]
+        self, pending_transactions: Iterable[PendingTransaction], *, height: int
+    ) -> tuple[list[Transaction], list[PendingTransaction], list[PendingTransaction]]:
+        """
+        Turns pending transactions into the transactions of a block, and returns them
+        along with the pending transactions they came from and the ones that can no
+        longer be paid for.
+        """
+        # our coinbase reward goes first, once we know the fees it collects
+        transactions: list[Transaction] = []
 
         # which pending transactions are included in this block
         included_pending_transactions: list[PendingTransaction] = []
 
-        for pending_transaction in pending_transactions:
-            # find sender's UTXOs to make up the value of the transaction
-            utxos = self.blockchain.find_utxos(
-                address=pending_transaction.sender, amount=pending_transaction.amount
-            )
+        # pending transactions whose coins were spent since they were admitted
+        stale_pending_transactions: list[PendingTransaction] = []
 
-            if not utxos:
-                # this transaction cannot be spent, so ignore it.
-                continue
+        # coins spent by this block so far
+        spent: set[Outpoint] = set()
 
+        for pending_transaction in pending_transactions:
+            if pending_transaction.inputs:
+                # reserved when the transaction was admitted, so only blocks added
+                # since then can have spent them
+                if any(
+                    outpoint in spent or outpoint not in self.blockchain.utxos
+                    for outpoint in pending_transaction.inputs
+                ):
+                    stale_pending_transactions.append(pending_transaction)
+                    continue
+            else:
+                # the mempool doesn't check funds, so find sender's UTXOs to make up
+                # the value and fee of the transaction
+                try:
+                    utxos = self.blockchain.find_utxos(
+                        address=pending_transaction.sender,
+                        amount=pending_transaction.amount + pending_transaction.fee,
+                        coin_selector=self.coin_selector,
+                        exclude=spent,
+                    )
+                except TransactionError:
+                    # this transaction cannot be spent yet, so leave it in the pool
+                    continue
+
+                pending_transaction = replace(
+                    pending_transaction,
+                    inputs=tuple(utxo.outpoint for utxo in utxos),
+                    input_amount=sum(utxo.amount for utxo in utxos),
+                )
+
+            spent.update(pending_transaction.inputs)
             change = (
-                sum(utxo.output.amount for utxo in utxos) - pending_transaction.amount
+                pending_transaction.input_amount
+                - pending_transaction.amount
+                - pending_transaction.fee
             )
 
             outputs = [
@@ -83,8 +161,8 @@ class Miner:
             transaction = Transaction(
                 height=height,
                 inputs=[
-                    TransactionInput(utxo.transaction.hash, utxo.output_index)
-                    for utxo in utxos
+                    TransactionInput(transaction_hash, output_index)
+                    for transaction_hash, output_index in pending_transaction.inputs
                 ],
                 outputs=outputs,
             )
@@ -92,18 +170,48 @@ class Miner:
             transactions.append(transaction)
             included_pending_transactions.append(pending_transaction)
 
-        return transactions, included_pending_transactions
+        fees = sum(transaction.fee for transaction in included_pending_transactions)
+        coinbase = Transaction(
+            height=height,
+            inputs=[],
+            outputs=[
+                TransactionOutput(recipient=self.address, amount=BLOCK_REWARD + fees)
+            ],
+        )
+
+        return (
+            [coinbase, *transactions],
+            included_pending_transactions,
+            stale_pending_transactions,
+        )
 
     def _mine_block(self, transactions: list[Transaction]) -> Block:
-        for proof in itertools.count():
-            block = Block(
-                height=len(self.blockchain),
-                proof=proof,
-                transactions=transactions,
-                previous=self.blockchain.head.hash,
+        unmined_block = UnminedBlock(
+            height=len(self.blockchain),
+            transactions=transactions,
+            previous=self.blockchain.head.hash,
+            # the chain only takes timestamps after the median of the last blocks, even
+            # if our clock disagrees
+            timestamp=max(int(time.time()), self.blockchain.median_time_past() + 1),
+        )
+        pow_engine = ProofOfWork(
+            height=unmined_block.height,
+            previous=unmined_block.previous,
+            merkle_root=merkle_root(
+                [transaction.hash for transaction in unmined_block.transactions]
+            ),
+            timestamp=unmined_block.timestamp,
+            target=self.blockchain.next_target(),
+        )
+        if self.workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            result = mine_parallel(
+                pow_engine, workers=self.workers, executor=self._executor
             )
+        else:
+            result = pow_engine.mine()
 
-            if block.hash[:4] == "0000":
-                break
-
-        return block
+        # an unbounded search never gives up
+        assert result.proof is not None
+        return unmined_block.to_block(result.proof)
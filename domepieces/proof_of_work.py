@@ -0,0 +1,215 @@
+import hashlib
+import itertools
+import os
+import struct
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .difficulty import Difficulty, Target
+from .encoding import Digest, check_digest
+
+# how many proofs each parallel worker tries per task.
+# this also bounds how much work is wasted once a proof has been found.
+DEFAULT_CHUNK_SIZE = 50_000
+
+_pack_proof = struct.Struct(">Q").pack
+
+
+@dataclass(frozen=True)
+class MiningResult:
+    # None if the searched range contained no valid proof
+    proof: Optional[int]
+    attempts: int
+    seconds: float
+
+    @property
+    def hashrate(self) -> float:
+        """
+        Hashes per second achieved while searching for this result.
+        """
+        if self.seconds <= 0:
+            return float("inf")
+        return self.attempts / self.seconds
+
+
+class ProofOfWork:
+    """
+    Searches the proof space for a block header.
+
+    The header is laid out exactly as in BlockHeader.hash: height, proof, previous, the
+    merkle root of the transactions, then the timestamp. Everything except the proof
+    is fixed for the duration of a search, so the hasher state after the height is
+    computed once and cloned for each attempt, and the bytes after the proof are
+    encoded up front.
+    """
+
+    def __init__(
+        self,
+        *,
+        height: int,
+        previous: Digest,
+        merkle_root: Digest,
+        timestamp: int,
+        target: Target = Difficulty().initial_target,
+    ) -> None:
+        check_digest("previous", previous)
+        check_digest("merkle_root", merkle_root)
+        self.height = height
+        self.target = target
+
+        # digests are compared as raw bytes, which for equal lengths orders exactly
+        # like comparing them as big-endian integers
+        self.target_bytes = target.to_bytes()
+
+        self.midstate = hashlib.blake2b(height.to_bytes(8, "big"))
+        self.suffix = previous + merkle_root + timestamp.to_bytes(8, "big")
+
+    def __getstate__(self) -> dict[str, Any]:
+        # hasher objects can't be pickled, so workers rebuild the midstate themselves
+        state = self.__dict__.copy()
+        del state["midstate"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.midstate = hashlib.blake2b(self.height.to_bytes(8, "big"))
+
+    def digest(self, proof: int) -> bytes:
+        hasher = self.midstate.copy()
+        hasher.update(_pack_proof(proof))
+        hasher.update(self.suffix)
+        return hasher.digest()
+
+    def search(self, start: int = 0, stop: Optional[int] = None) -> Optional[int]:
+        """
+        Returns the lowest valid proof in [start, stop), or None if there isn't one.
+        If stop is None the search continues until a proof is found.
+        """
+        # locals are noticeably faster than attribute lookups in the hot loop
+        midstate = self.midstate
+        suffix = self.suffix
+        target = self.target_bytes
+        pack = _pack_proof
+
+        proofs = itertools.count(start) if stop is None else range(start, stop)
+        for proof in proofs:
+            hasher = midstate.copy()
+            hasher.update(pack(proof))
+            hasher.update(suffix)
+            if hasher.digest() <= target:
+                return proof
+
+        return None
+
+    def mine(self, start: int = 0, stop: Optional[int] = None) -> MiningResult:
+        """
+        Like search, but also reports how many proofs were tried and how long it took.
+        """
+        began = time.perf_counter()
+        proof = self.search(start, stop)
+        seconds = time.perf_counter() - began
+
+        if proof is not None:
+            attempts = proof - start + 1
+        else:
+            # search only gives up when it has exhausted a bounded range
+            assert stop is not None
+            attempts = stop - start
+
+        return MiningResult(proof=proof, attempts=attempts, seconds=seconds)
+
+
+def search_parallel(
+    pow_engine: ProofOfWork,
+    executor: Executor,
+    *,
+    workers: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start: int = 0,
+) -> int:
+    """
+    Splits the proof space from start onwards into consecutive chunks and searches
+    them on the given executor, keeping a couple of chunks per worker in flight.
+
+    Once a proof is found, chunks after it are cancelled, but chunks before it are
+    still searched to completion. The result is therefore always the lowest valid
+    proof, exactly as ProofOfWork.search would return.
+    """
+    in_flight = workers * 2
+    pending: dict[Future[Optional[int]], int] = {}
+    next_start = start
+    best: Optional[int] = None
+
+    def submit() -> None:
+        nonlocal next_start
+        future = executor.submit(pow_engine.search, next_start, next_start + chunk_size)
+        pending[future] = next_start
+        next_start += chunk_size
+
+    for _ in range(in_flight):
+        submit()
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            del pending[future]
+            proof = future.result()
+            if proof is not None and (best is None or proof < best):
+                best = proof
+
+        if best is None:
+            while len(pending) < in_flight:
+                submit()
+            continue
+
+        # nothing in a chunk that starts after the best proof can beat it.
+        # chunks that are already running can't be cancelled; they finish on their
+        # own and their results are ignored.
+        for future, chunk_start in list(pending.items()):
+            if chunk_start > best:
+                future.cancel()
+                del pending[future]
+
+    # the loop only ends once a proof has been found
+    assert best is not None
+    return best
+
+
+def mine_parallel(
+    pow_engine: ProofOfWork,
+    *,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start: int = 0,
+    executor: Optional[Executor] = None,
+) -> MiningResult:
+    """
+    Like ProofOfWork.mine, but spreads the search over multiple processes.
+    Pass an executor to reuse a worker pool across blocks.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    began = time.perf_counter()
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            proof = search_parallel(
+                pow_engine, pool, workers=workers, chunk_size=chunk_size, start=start
+            )
+    else:
+        proof = search_parallel(
+            pow_engine, executor, workers=workers, chunk_size=chunk_size, start=start
+        )
+    seconds = time.perf_counter() - began
+
+    # proofs in chunks running alongside the winner were tried too, but the lowest
+    # proof is the only meaningful count that doesn't depend on scheduling.
+    return MiningResult(proof=proof, attempts=proof - start + 1, seconds=seconds)
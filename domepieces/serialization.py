@@ -0,0 +1,224 @@
+from typing import Any, Callable, Iterable, TypeVar
+
+import msgpack
+
+from .block import Block, BlockHeader
+from .encoding import DIGEST_SIZE, MAX_INT, Digest
+from .transaction import Coin, Transaction, TransactionInput, TransactionOutput
+
+# the compact binary format for blocks and transactions on disk and on the wire.
+#
+# every record starts with a single format version byte, followed by msgpack data.
+# records are packed as plain tuples rather than dicts, so field names aren't repeated
+# in every record, and msgpack packs integers in as few bytes as they need.
+#
+# version 1:
+#   transaction = (height, [(input transaction digest, output index)...],
+#                  [(recipient, amount)...])
+#   block = (height, proof, previous digest, timestamp, [transaction...])
+#   header = (height, proof, previous digest, merkle root, timestamp)
+#   headers = [header...]
+#   coins = [(transaction digest, output index, recipient, amount, height)...]
+
+FORMAT_VERSION = 1
+
+T = TypeVar("T")
+
+
+class SerializationError(Exception):
+    pass
+
+
+def _int(value: Any) -> int:
+    # msgpack decodes booleans as bools, which are also ints. every integer is hashed
+    # as 8 unsigned bytes, so it has to fit in them.
+    if type(value) is not int or not 0 <= value <= MAX_INT:
+        raise SerializationError(
+            f"expected an integer from 0 to {MAX_INT}, got {value!r}"
+        )
+    return value
+
+
+def _str(value: Any) -> str:
+    if type(value) is not str:
+        raise SerializationError(f"expected a string, got {value!r}")
+    return value
+
+
+def _digest(value: Any) -> Digest:
+    # Digest() would also accept an int, and build that many zero bytes
+    if type(value) is not bytes or len(value) != DIGEST_SIZE:
+        raise SerializationError(f"expected a {DIGEST_SIZE} byte digest, got {value!r}")
+    return Digest(value)
+
+
+def _transaction_to_tuple(transaction: Transaction) -> tuple[Any, ...]:
+    return (
+        transaction.height,
+        [
+            (tx_input.transaction, tx_input.output_index)
+            for tx_input in transaction.inputs
+        ],
+        [(output.recipient, output.amount) for output in transaction.outputs],
+    )
+
+
+def _transaction_from_tuple(data: tuple[Any, ...]) -> Transaction:
+    height, inputs, outputs = data
+    return Transaction(
+        height=_int(height),
+        inputs=[
+            TransactionInput(_digest(transaction), _int(output_index))
+            for transaction, output_index in inputs
+        ],
+        outputs=[
+            TransactionOutput(_str(recipient), _int(amount))
+            for recipient, amount in outputs
+        ],
+    )
+
+
+def _pack(data: tuple[Any, ...]) -> bytes:
+    packed: bytes = msgpack.packb(data)
+    return bytes((FORMAT_VERSION,)) + packed
+
+
+def _unpack(data: bytes) -> Any:
+    if not data or data[0] != FORMAT_VERSION:
+        version = data[0] if data else None
+        raise SerializationError(f"unsupported format version {version}")
+
+    try:
+        # tuples are cheaper to build than lists
+        return msgpack.unpackb(memoryview(data)[1:], use_list=False)
+    except (ValueError, msgpack.UnpackException) as ex:
+        raise SerializationError(f"malformed record: {ex}") from ex
+
+
+def _decode(data: bytes, build: Callable[[Any], T]) -> T:
+    """
+    Unpacks a record and builds it into a model, rejecting records that aren't shaped
+    the way the builder expects.
+    """
+    record = _unpack(data)
+    try:
+        return build(record)
+    except (TypeError, ValueError) as ex:
+        raise SerializationError(f"malformed record: {ex}") from ex
+
+
+def encode_transaction(transaction: Transaction) -> bytes:
+    return _pack(_transaction_to_tuple(transaction))
+
+
+def decode_transaction(data: bytes) -> Transaction:
+    return _decode(data, _transaction_from_tuple)
+
+
+def encode_block(block: Block) -> bytes:
+    return _pack(
+        (
+            block.height,
+            block.proof,
+            block.previous,
+            block.timestamp,
+            [_transaction_to_tuple(transaction) for transaction in block.transactions],
+        )
+    )
+
+
+def _block_from_tuple(data: tuple[Any, ...]) -> Block:
+    height, proof, previous, timestamp, transactions = data
+    return Block(
+        height=_int(height),
+        proof=_int(proof),
+        transactions=[_transaction_from_tuple(tx) for tx in transactions],
+        previous=_digest(previous),
+        timestamp=_int(timestamp),
+    )
+
+
+def decode_block(data: bytes) -> Block:
+    return _decode(data, _block_from_tuple)
+
+
+def _header_to_tuple(header: BlockHeader) -> tuple[Any, ...]:
+    return (
+        header.height,
+        header.proof,
+        header.previous,
+        header.merkle_root,
+        header.timestamp,
+    )
+
+
+def _header_from_tuple(data: tuple[Any, ...]) -> BlockHeader:
+    height, proof, previous, merkle_root, timestamp = data
+    return BlockHeader(
+        height=_int(height),
+        proof=_int(proof),
+        previous=_digest(previous),
+        merkle_root=_digest(merkle_root),
+        timestamp=_int(timestamp),
+    )
+
+
+def encode_header(header: BlockHeader) -> bytes:
+    return _pack(_header_to_tuple(header))
+
+
+def decode_header(data: bytes) -> BlockHeader:
+    return _decode(data, _header_from_tuple)
+
+
+def encode_headers(headers: Iterable[BlockHeader]) -> bytes:
+    """
+    Packs a run of headers into a single record, as sent during a header sync.
+    """
+    return _pack(tuple(_header_to_tuple(header) for header in headers))
+
+
+def decode_headers(data: bytes) -> list[BlockHeader]:
+    return _decode(
+        data, lambda headers: [_header_from_tuple(header) for header in headers]
+    )
+
+
+def coin_to_tuple(coin: Coin) -> tuple[Any, ...]:
+    """
+    Returns the fields a coin is packed as, here and in utxo snapshots.
+    """
+    return (
+        coin.transaction_hash,
+        coin.output_index,
+        coin.recipient,
+        coin.amount,
+        coin.height,
+    )
+
+
+def coin_from_tuple(data: Any) -> Coin:
+    """
+    Builds a coin from the fields it was packed as, raising SerializationError if
+    they aren't a valid coin.
+    """
+    try:
+        transaction_hash, output_index, recipient, amount, height = data
+    except (TypeError, ValueError) as ex:
+        raise SerializationError(f"malformed coin: {ex}") from ex
+
+    return Coin(
+        _digest(transaction_hash),
+        _int(output_index),
+        _str(recipient),
+        _int(amount),
+        _int(height),
+    )
+
+
+def encode_coins(coins: Iterable[Coin]) -> bytes:
+    return _pack(tuple(coin_to_tuple(coin) for coin in coins))
+
+
+def decode_coins(data: bytes) -> list[Coin]:
+    return _decode(data, lambda coins: [coin_from_tuple(coin) for coin in coins])
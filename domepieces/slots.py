@@ -0,0 +1,83 @@
+import dataclasses
+from typing import Any, Callable, Generic, Optional, TypeVar, overload
+
+T = TypeVar("T")
+C = TypeVar("C", bound=type)
+
+
+class cached_slot(Generic[T]):
+    """
+    Like functools.cached_property, but stores the value in a slot instead of the
+    instance __dict__, so it works on classes built with `slotted`.
+    The value is stored in a slot named after the property with a leading underscore.
+    """
+
+    def __init__(self, func: Callable[[Any], T]) -> None:
+        self.func = func
+        self.slot = f"_{func.__name__}"
+        self.__doc__ = func.__doc__
+
+    @overload
+    def __get__(self, instance: None, owner: Optional[type] = None) -> "cached_slot[T]":
+        ...
+
+    @overload
+    def __get__(self, instance: object, owner: Optional[type] = None) -> T:
+        ...
+
+    def __get__(self, instance: Optional[object], owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self
+
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            value = self.func(instance)
+            # bypasses the frozen dataclass __setattr__
+            object.__setattr__(instance, self.slot, value)
+            return value
+
+    def set(self, instance: object, value: T) -> None:
+        """
+        Caches a value that was computed elsewhere, such as in another process.
+        """
+        object.__setattr__(instance, self.slot, value)
+
+
+def _getstate(self: Any) -> dict[str, Any]:
+    # unset slots (such as a cached value that was never computed) are left out
+    return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+
+def _setstate(self: Any, state: dict[str, Any]) -> None:
+    for name, value in state.items():
+        object.__setattr__(self, name, value)
+
+
+def slotted(cls: C) -> C:
+    """
+    Rebuilds a frozen dataclass with __slots__, so its instances have no __dict__.
+
+    This is what dataclass(slots=True) does on python 3.10 and above. A slot is also
+    added for each cached_slot on the class, and pickling copies the slots directly
+    since frozen dataclasses can't be restored through setattr.
+    """
+    names = [field.name for field in dataclasses.fields(cls)]
+    names += [
+        value.slot for value in cls.__dict__.values() if isinstance(value, cached_slot)
+    ]
+
+    namespace = dict(cls.__dict__)
+    # the slots replace the class-level defaults and the instance __dict__
+    for name in names:
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+
+    namespace["__slots__"] = tuple(names)
+    namespace["__getstate__"] = _getstate
+    namespace["__setstate__"] = _setstate
+
+    new_cls: C = type(cls)(cls.__name__, cls.__bases__, namespace)
+    new_cls.__qualname__ = cls.__qualname__
+    return new_cls
@@ -0,0 +1,193 @@
+import hashlib
+import itertools
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+import msgpack
+
+from .encoding import DIGEST_SIZE, Digest
+from .serialization import SerializationError, coin_from_tuple, coin_to_tuple
+from .transaction import Coin
+from .utxo_store import UTXOStore
+
+# a snapshot of the utxo set as of one block, so a node can be bootstrapped without
+# replaying every block before it.
+#
+# version 1:
+#   the magic bytes, then a format version byte
+#   a 4-byte big-endian length, then the msgpack header (block hash, coin count)
+#   chunks, each a 4-byte big-endian length followed by that many bytes of msgpack
+#     coins packed back to back, each (transaction digest, output index, recipient,
+#     amount, height). coins are in outpoint order.
+#   a zero length, ending the chunks
+#   the commitment: the blake2b digest of the bytes of every chunk, in order
+#
+# coins are packed one after another rather than as one msgpack array per chunk, so
+# the commitment doesn't depend on how the coins were split up. any two stores holding
+# the same coins have the same commitment.
+
+SNAPSHOT_MAGIC = b"dps"
+SNAPSHOT_VERSION = 1
+
+# how many coins go in each chunk. importing only holds about one chunk in memory.
+DEFAULT_SNAPSHOT_CHUNK_SIZE = 10_000
+
+_LENGTH_SIZE = 4
+
+
+class SnapshotError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SnapshotInfo:
+    # the block the snapshot was taken at
+    block_hash: Digest
+    coin_count: int
+    commitment: Digest
+
+
+def _pack_coin(coin: Coin) -> bytes:
+    packed: bytes = msgpack.packb(coin_to_tuple(coin))
+    return packed
+
+
+def _write_record(file: BinaryIO, data: bytes) -> None:
+    file.write(len(data).to_bytes(_LENGTH_SIZE, "big"))
+    file.write(data)
+
+
+def _read_exact(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise SnapshotError("snapshot is truncated")
+    return data
+
+
+def _read_record(file: BinaryIO) -> bytes:
+    return _read_exact(file, int.from_bytes(_read_exact(file, _LENGTH_SIZE), "big"))
+
+
+def _unpack_coins(chunk: bytes) -> Iterator[Coin]:
+    unpacker = msgpack.Unpacker(use_list=False)
+    unpacker.feed(chunk)
+    try:
+        for data in unpacker:
+            yield coin_from_tuple(data)
+    except (ValueError, msgpack.UnpackException, SerializationError) as ex:
+        raise SnapshotError(f"malformed chunk: {ex}") from ex
+
+
+def utxo_commitment(utxos: UTXOStore) -> Digest:
+    """
+    Returns the commitment a snapshot of the store would have, such as to check a
+    store rebuilt by replaying blocks against the snapshot it was bootstrapped from.
+    """
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for coin in utxos.iter_sorted():
+        hasher.update(_pack_coin(coin))
+    return Digest(hasher.digest())
+
+
+def export_snapshot(
+    utxos: UTXOStore,
+    file: BinaryIO,
+    *,
+    chunk_size: int = DEFAULT_SNAPSHOT_CHUNK_SIZE,
+) -> SnapshotInfo:
+    """
+    Writes the utxo set as of the store's best block to a snapshot file, one chunk of
+    coins at a time.
+    """
+    block_hash = utxos.best_block
+    if block_hash is None:
+        raise SnapshotError("can't snapshot a utxo store without a best block")
+
+    coin_count = len(utxos)
+    file.write(SNAPSHOT_MAGIC + bytes((SNAPSHOT_VERSION,)))
+    _write_record(file, msgpack.packb((block_hash, coin_count)))
+
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    coins = utxos.iter_sorted()
+    written = 0
+
+    while True:
+        packed = [_pack_coin(coin) for coin in itertools.islice(coins, chunk_size)]
+        if not packed:
+            break
+
+        chunk = b"".join(packed)
+        hasher.update(chunk)
+        _write_record(file, chunk)
+        written += len(packed)
+
+    if written != coin_count:
+        raise SnapshotError("the utxo store changed while it was being exported")
+
+    commitment = Digest(hasher.digest())
+    file.write(bytes(_LENGTH_SIZE))
+    file.write(commitment)
+
+    return SnapshotInfo(block_hash, coin_count, commitment)
+
+
+def import_snapshot(
+    file: BinaryIO, utxos: UTXOStore, *, commitment: Optional[Digest] = None
+) -> SnapshotInfo:
+    """
+    Loads a snapshot file into an empty utxo store one chunk at a time, making the
+    snapshot's block the store's best block.
+
+    Pass the commitment of a snapshot from a trusted source to check the coins
+    against it. A SnapshotError is raised if the file is malformed, or its coins
+    don't match its own commitment or the given one. The best block is only set once
+    every check has passed, so a store that failed to import is left without one and
+    should be discarded.
+    """
+    if len(utxos) or utxos.best_block is not None:
+        raise SnapshotError("snapshots can only be imported into an empty utxo store")
+
+    magic = _read_exact(file, len(SNAPSHOT_MAGIC) + 1)
+    if magic[:-1] != SNAPSHOT_MAGIC:
+        raise SnapshotError("not a snapshot file")
+    if magic[-1] != SNAPSHOT_VERSION:
+        raise SnapshotError(f"unsupported snapshot version {magic[-1]}")
+
+    try:
+        block_hash, coin_count = msgpack.unpackb(_read_record(file))
+    except (ValueError, TypeError, msgpack.UnpackException) as ex:
+        raise SnapshotError(f"malformed header: {ex}") from ex
+    if type(block_hash) is not bytes or len(block_hash) != DIGEST_SIZE:
+        raise SnapshotError(f"malformed header: bad block hash {block_hash!r}")
+    if type(coin_count) is not int:
+        raise SnapshotError(f"malformed header: bad coin count {coin_count!r}")
+
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    loaded = 0
+
+    while True:
+        chunk = _read_record(file)
+        if not chunk:
+            break
+
+        hasher.update(chunk)
+        coins = list(_unpack_coins(chunk))
+        utxos.load(coins)
+        loaded += len(coins)
+
+    info = SnapshotInfo(Digest(block_hash), coin_count, Digest(hasher.digest()))
+
+    if loaded != coin_count:
+        raise SnapshotError(f"snapshot has {loaded} coins, but claims {coin_count}")
+
+    if _read_exact(file, DIGEST_SIZE) != info.commitment:
+        raise SnapshotError("snapshot doesn't match its commitment")
+
+    if commitment is not None and commitment != info.commitment:
+        raise SnapshotError(
+            f"snapshot commitment {info.commitment.hex()[:8]} isn't the expected "
+            f"{commitment.hex()[:8]}"
+        )
+
+    utxos.load([], info.block_hash)
+    return info
@@ -1,37 +1,50 @@
 from dataclasses import dataclass
+from typing import Protocol, Sequence
 
-from .encoding import Encoder
+from .encoding import Digest, Encoder
+from .slots import cached_slot, slotted
 
 
+@slotted
 @dataclass(frozen=True)
 class TransactionInput:
-    transaction: str
+    transaction: Digest
     output_index: int
 
 
+@slotted
 @dataclass(frozen=True)
 class TransactionOutput:
     recipient: str
     amount: int
 
 
+@slotted
 @dataclass(frozen=True)
 class Transaction:
     height: int
-    inputs: list[TransactionInput]
-    outputs: list[TransactionOutput]
+
+    # any sequence is accepted, but inputs and outputs are always stored as tuples
+    inputs: Sequence[TransactionInput]
+    outputs: Sequence[TransactionOutput]
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "inputs", tuple(self.inputs))
+        object.__setattr__(self, "outputs", tuple(self.outputs))
 
     def __str__(self) -> str:
-        return f"transaction {self.hash[:8]} @ height {self.height}"
+        return f"transaction {self.hash.hex()[:8]} @ height {self.height}"
 
-    @property
-    def hash(self) -> str:
+    # frozen dataclasses can't change after construction, so the hash is computed once
+    # and stored in a slot (which also survives pickling).
+    @cached_slot
+    def hash(self) -> Digest:
         enc = Encoder()
 
         enc.add_int(self.height)
 
         for transaction_input in self.inputs:
-            enc.add_str(transaction_input.transaction)
+            enc.add_digest(transaction_input.transaction)
             enc.add_int(transaction_input.output_index)
 
         for transaction_output in self.outputs:
@@ -41,6 +54,7 @@ class Transaction:
         return enc.digest()
 
 
+@slotted
 @dataclass(frozen=True)
 class UTXO:
     transaction: Transaction
@@ -52,3 +66,55 @@ class UTXO:
     @property
     def output(self) -> TransactionOutput:
         return self.transaction.outputs[self.output_index]
+
+
+@slotted
+@dataclass(frozen=True)
+class Coin:
+    """
+    A compact unspent output: everything needed to spend it, without its parent
+    transaction.
+    """
+
+    transaction_hash: Digest
+    output_index: int
+    recipient: str
+    amount: int
+
+    # the height of the transaction that created this output
+    height: int
+
+    def __str__(self) -> str:
+        return (
+            f"coin for output #{self.output_index} of transaction "
+            f"{self.transaction_hash.hex()[:8]} ({self.amount})"
+        )
+
+    @staticmethod
+    def from_transaction(transaction: Transaction, output_index: int) -> "Coin":
+        output = transaction.outputs[output_index]
+        return Coin(
+            transaction_hash=transaction.hash,
+            output_index=output_index,
+            recipient=output.recipient,
+            amount=output.amount,
+            height=transaction.height,
+        )
+
+    @property
+    def outpoint(self) -> tuple[Digest, int]:
+        return (self.transaction_hash, self.output_index)
+
+    @property
+    def output(self) -> TransactionOutput:
+        return TransactionOutput(self.recipient, self.amount)
+
+
+class Spendable(Protocol):
+    """
+    Anything with an output that can be spent, such as a UTXO or a Coin.
+    """
+
+    @property
+    def output(self) -> TransactionOutput:
+        ...
@@ -0,0 +1,485 @@
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, Optional, Protocol
+
+import msgpack
+import plyvel
+
+from .encoding import Digest
+from .serialization import decode_coins, encode_coins
+from .transaction import Coin
+
+# identifies an output by the hash of its transaction and its index within it
+Outpoint = tuple[Digest, int]
+
+# how many of the latest blocks keep an undo record, which is as deep as the chain can
+# reorganize
+DEFAULT_MAX_UNDO_DEPTH = 100
+
+
+class UTXOStore(Protocol):
+    """
+    Holds the set of unspent outputs, indexed by outpoint and by address.
+    """
+
+    # undo records are only kept for this many of the latest blocks
+    max_undo_depth: int
+
+    def __len__(self) -> int:
+        ...
+
+    def __iter__(self) -> Iterator[Coin]:
+        ...
+
+    def __contains__(self, outpoint: object) -> bool:
+        ...
+
+    def iter_sorted(self) -> Iterator[Coin]:
+        """
+        Iterates over every coin in outpoint order, which is the same for any store
+        holding the same coins.
+        """
+
+    @property
+    def best_block(self) -> Optional[Digest]:
+        """
+        The hash of the last block applied to the store, if any.
+        """
+
+    @property
+    def undo_depth(self) -> int:
+        """
+        How many of the latest blocks have an undo record, and so can be reverted.
+        A store loaded from a snapshot starts with none.
+        """
+
+    def get(self, outpoint: Outpoint) -> Optional[Coin]:
+        ...
+
+    def coins_for(self, address: str) -> Iterator[Coin]:
+        ...
+
+    def balance(self, address: str) -> int:
+        ...
+
+    def balances(self) -> dict[str, int]:
+        ...
+
+    def apply(
+        self, spent: Iterable[Outpoint], created: Iterable[Coin], best_block: Digest
+    ) -> None:
+        """
+        Removes the spent outpoints and adds the created coins in one step, making
+        best_block the new best block. Every spent outpoint must already be in the
+        store, or nothing is changed.
+
+        The spent coins are kept as an undo record for best_block, so it can be reverted.
+        Once there are more than max_undo_depth undo records the oldest is dropped.
+        """
+
+    def revert(self, created: Iterable[Outpoint], best_block: Digest) -> None:
+        """
+        Undoes the changes made by the current best block in one step: the coins it
+        created are removed, the coins in its undo record are restored, and best_block
+        becomes the new best block.
+        """
+
+    def load(self, coins: Iterable[Coin], best_block: Optional[Digest] = None) -> None:
+        """
+        Adds coins in one step without an undo record, as when loading a snapshot.
+        If best_block is given it becomes the new best block.
+        """
+
+
+def _check_undo_depth(max_undo_depth: int) -> None:
+    if max_undo_depth < 1:
+        raise ValueError("max undo depth must be at least 1 block")
+
+
+class MemoryUTXOStore:
+    def __init__(self, *, max_undo_depth: int = DEFAULT_MAX_UNDO_DEPTH) -> None:
+        _check_undo_depth(max_undo_depth)
+        self.max_undo_depth = max_undo_depth
+
+        self.coins: dict[Outpoint, Coin] = {}
+
+        # maps address to the outpoints of its coins
+        self.outpoints_by_address: dict[str, set[Outpoint]] = {}
+
+        # running total of each address's coins
+        self.balance_by_address: dict[str, int] = {}
+
+        self._best_block: Optional[Digest] = None
+
+        # maps block hash to the coins that block spent, oldest block first
+        self.undo: dict[Digest, list[Coin]] = {}
+
+    def __len__(self) -> int:
+        return len(self.coins)
+
+    def __iter__(self) -> Iterator[Coin]:
+        return iter(self.coins.values())
+
+    def __contains__(self, outpoint: object) -> bool:
+        return outpoint in self.coins
+
+    def iter_sorted(self) -> Iterator[Coin]:
+        return (self.coins[outpoint] for outpoint in sorted(self.coins))
+
+    @property
+    def best_block(self) -> Optional[Digest]:
+        return self._best_block
+
+    @property
+    def undo_depth(self) -> int:
+        return len(self.undo)
+
+    def get(self, outpoint: Outpoint) -> Optional[Coin]:
+        return self.coins.get(outpoint)
+
+    def coins_for(self, address: str) -> Iterator[Coin]:
+        outpoints = self.outpoints_by_address.get(address, set())
+        return (self.coins[outpoint] for outpoint in outpoints)
+
+    def balance(self, address: str) -> int:
+        return self.balance_by_address.get(address, 0)
+
+    def balances(self) -> dict[str, int]:
+        return dict(self.balance_by_address)
+
+    def apply(
+        self, spent: Iterable[Outpoint], created: Iterable[Coin], best_block: Digest
+    ) -> None:
+        # look everything up before changing anything, so a missing coin leaves the
+        # store untouched
+        spent_coins = [self._get(outpoint) for outpoint in spent]
+
+        for coin in spent_coins:
+            self._remove(coin.outpoint)
+
+        for coin in created:
+            self._add(coin)
+
+        self.undo[best_block] = spent_coins
+        self._best_block = best_block
+
+        # blocks are only ever reverted from the end, so the first record is the oldest
+        while len(self.undo) > self.max_undo_depth:
+            del self.undo[next(iter(self.undo))]
+
+    def revert(self, created: Iterable[Outpoint], best_block: Digest) -> None:
+        if self._best_block is None:
+            raise KeyError("nothing to revert")
+
+        spent_coins = self.undo[self._best_block]
+        created_coins = [self._get(outpoint) for outpoint in created]
+
+        for coin in created_coins:
+            self._remove(coin.outpoint)
+
+        for coin in spent_coins:
+            self._add(coin)
+
+        del self.undo[self._best_block]
+        self._best_block = best_block
+
+    def load(self, coins: Iterable[Coin], best_block: Optional[Digest] = None) -> None:
+        for coin in coins:
+            self._add(coin)
+
+        if best_block is not None:
+            self._best_block = best_block
+
+    def _get(self, outpoint: Outpoint) -> Coin:
+        coin = self.coins.get(outpoint)
+        if coin is None:
+            raise KeyError(outpoint)
+        return coin
+
+    def _add(self, coin: Coin) -> None:
+        self.coins[coin.outpoint] = coin
+        self.outpoints_by_address.setdefault(coin.recipient, set()).add(coin.outpoint)
+        self.balance_by_address[coin.recipient] = (
+            self.balance(coin.recipient) + coin.amount
+        )
+
+    def _remove(self, outpoint: Outpoint) -> None:
+        coin = self.coins.pop(outpoint)
+        outpoints = self.outpoints_by_address[coin.recipient]
+        outpoints.remove(outpoint)
+        self.balance_by_address[coin.recipient] -= coin.amount
+
+        # don't keep addresses around once they've spent everything
+        if not outpoints:
+            del self.outpoints_by_address[coin.recipient]
+            del self.balance_by_address[coin.recipient]
+
+
+# key prefixes for each kind of record in the database
+COIN_PREFIX = b"c"
+ADDRESS_PREFIX = b"a"
+BALANCE_PREFIX = b"b"
+UNDO_PREFIX = b"u"
+UNDO_ORDER_PREFIX = b"o"
+COUNT_KEY = b"m:count"
+UNDO_TOP_KEY = b"m:undo"
+BEST_BLOCK_KEY = b"m:best"
+
+
+def _outpoint_key(outpoint: Outpoint) -> bytes:
+    transaction_hash, output_index = outpoint
+    return transaction_hash + output_index.to_bytes(4, "big")
+
+
+def _undo_order_key(number: int) -> bytes:
+    # big-endian, so records sort in the order they were applied
+    return number.to_bytes(8, "big")
+
+
+def _address_key(address: str) -> bytes:
+    # addresses never contain a nul byte, so it safely terminates them
+    return address.encode() + b"\0"
+
+
+class LevelDBUTXOStore:
+    """
+    Keeps the UTXO set in LevelDB so it can outgrow memory and survive restarts.
+
+    Coins are stored as msgpack-encoded (recipient, amount, height) tuples keyed by a
+    binary outpoint. Each block's changes are written in a single batch, along with
+    the address index, balances and coin count, so the store is always consistent with
+    its best block. The coins each block spent are kept in the same batch as its undo
+    record. Undo records are numbered in the order they were applied, so once there
+    are more than max_undo_depth the oldest can be found and deleted in the same
+    batch. Recently used coins are kept in an optional LRU cache.
+    """
+
+    def __init__(
+        self,
+        db: plyvel.DB,
+        *,
+        cache_size: int = 0,
+        max_undo_depth: int = DEFAULT_MAX_UNDO_DEPTH,
+    ) -> None:
+        _check_undo_depth(max_undo_depth)
+        self.max_undo_depth = max_undo_depth
+        self.db = db
+        self.cache_size = cache_size
+        self.cache: OrderedDict[Outpoint, Coin] = OrderedDict()
+
+        self.coins_db = db.prefixed_db(COIN_PREFIX)
+        self.address_db = db.prefixed_db(ADDRESS_PREFIX)
+        self.balance_db = db.prefixed_db(BALANCE_PREFIX)
+        self.undo_db = db.prefixed_db(UNDO_PREFIX)
+        self.undo_order_db = db.prefixed_db(UNDO_ORDER_PREFIX)
+
+    def __len__(self) -> int:
+        data = self.db.get(COUNT_KEY)
+        return 0 if data is None else int(msgpack.unpackb(data))
+
+    def __iter__(self) -> Iterator[Coin]:
+        with self.coins_db.snapshot() as snapshot:
+            for key, data in snapshot.iterator():
+                yield self._decode(key, data)
+
+    def __contains__(self, outpoint: object) -> bool:
+        if not isinstance(outpoint, tuple):
+            return False
+        return self.get(outpoint) is not None
+
+    def iter_sorted(self) -> Iterator[Coin]:
+        # coins are keyed by transaction hash then big-endian output index, so leveldb
+        # already keeps them in outpoint order
+        return iter(self)
+
+    @property
+    def best_block(self) -> Optional[Digest]:
+        data = self.db.get(BEST_BLOCK_KEY)
+        return None if data is None else Digest(data)
+
+    @property
+    def undo_depth(self) -> int:
+        # records are only added and reverted at the top and pruned from the bottom,
+        # so their numbers are always a run ending at the top
+        oldest = next(self.undo_order_db.iterator(include_value=False), None)
+        if oldest is None:
+            return 0
+        return self._undo_top() - int.from_bytes(oldest, "big") + 1
+
+    def get(self, outpoint: Outpoint) -> Optional[Coin]:
+        coin = self.cache.get(outpoint)
+        if coin is not None:
+            self.cache.move_to_end(outpoint)
+            return coin
+
+        data = self.coins_db.get(_outpoint_key(outpoint))
+        if data is None:
+            return None
+
+        coin = self._decode(_outpoint_key(outpoint), data)
+        self._cache(coin)
+        return coin
+
+    def coins_for(self, address: str) -> Iterator[Coin]:
+        prefix = _address_key(address)
+        outpoint_keys = list(
+            self.address_db.iterator(prefix=prefix, include_value=False)
+        )
+
+        for key in outpoint_keys:
+            outpoint_key = key[len(prefix) :]
+            data = self.coins_db.get(outpoint_key)
+            if data is not None:
+                yield self._decode(outpoint_key, data)
+
+    def balance(self, address: str) -> int:
+        data = self.balance_db.get(_address_key(address))
+        return 0 if data is None else int(msgpack.unpackb(data))
+
+    def balances(self) -> dict[str, int]:
+        return {
+            key[:-1].decode(): int(msgpack.unpackb(data))
+            for key, data in self.balance_db.iterator()
+        }
+
+    def apply(
+        self, spent: Iterable[Outpoint], created: Iterable[Coin], best_block: Digest
+    ) -> None:
+        spent_coins = [self._get(outpoint) for outpoint in spent]
+        created_coins = list(created)
+
+        top = self._undo_top() + 1
+
+        with self.db.write_batch(transaction=True) as batch:
+            self._write(batch, spent_coins, created_coins, best_block)
+            batch.put(UNDO_PREFIX + bytes(best_block), encode_coins(spent_coins))
+            batch.put(UNDO_ORDER_PREFIX + _undo_order_key(top), bytes(best_block))
+            batch.put(UNDO_TOP_KEY, msgpack.packb(top))
+
+            # the record may already be gone if blocks were reverted in between
+            oldest = top - self.max_undo_depth
+            oldest_block = (
+                self.undo_order_db.get(_undo_order_key(oldest)) if oldest > 0 else None
+            )
+            if oldest_block is not None:
+                batch.delete(UNDO_PREFIX + oldest_block)
+                batch.delete(UNDO_ORDER_PREFIX + _undo_order_key(oldest))
+
+        self._update_cache(spent_coins, created_coins)
+
+    def revert(self, created: Iterable[Outpoint], best_block: Digest) -> None:
+        current = self.best_block
+        if current is None:
+            raise KeyError("nothing to revert")
+
+        data = self.undo_db.get(bytes(current))
+        if data is None:
+            raise KeyError(current)
+
+        restored_coins = decode_coins(data)
+        removed_coins = [self._get(outpoint) for outpoint in created]
+        top = self._undo_top()
+
+        with self.db.write_batch(transaction=True) as batch:
+            self._write(batch, removed_coins, restored_coins, best_block)
+            batch.delete(UNDO_PREFIX + bytes(current))
+            if top > 0:
+                batch.delete(UNDO_ORDER_PREFIX + _undo_order_key(top))
+                batch.put(UNDO_TOP_KEY, msgpack.packb(top - 1))
+
+        self._update_cache(removed_coins, restored_coins)
+
+    def load(self, coins: Iterable[Coin], best_block: Optional[Digest] = None) -> None:
+        added_coins = list(coins)
+
+        with self.db.write_batch(transaction=True) as batch:
+            self._write(batch, [], added_coins, best_block)
+
+        self._update_cache([], added_coins)
+
+    def _undo_top(self) -> int:
+        """
+        Returns the number of the latest undo record, or 0 if none were applied.
+        """
+        data = self.db.get(UNDO_TOP_KEY)
+        return 0 if data is None else int(msgpack.unpackb(data))
+
+    def _get(self, outpoint: Outpoint) -> Coin:
+        coin = self.get(outpoint)
+        if coin is None:
+            raise KeyError(outpoint)
+        return coin
+
+    def _write(
+        self,
+        # a plyvel write batch, which plyvel doesn't export a type for
+        batch: Any,
+        removed_coins: list[Coin],
+        added_coins: list[Coin],
+        best_block: Optional[Digest],
+    ) -> None:
+        """
+        Writes the removal and addition of coins to the batch, along with the address
+        index, balances, coin count and best block, if one is given.
+        """
+        balance_changes: dict[str, int] = {}
+        for coin in removed_coins:
+            balance_changes[coin.recipient] = (
+                balance_changes.get(coin.recipient, 0) - coin.amount
+            )
+        for coin in added_coins:
+            balance_changes[coin.recipient] = (
+                balance_changes.get(coin.recipient, 0) + coin.amount
+            )
+
+        for coin in removed_coins:
+            outpoint_key = _outpoint_key(coin.outpoint)
+            batch.delete(COIN_PREFIX + outpoint_key)
+            batch.delete(ADDRESS_PREFIX + _address_key(coin.recipient) + outpoint_key)
+
+        for coin in added_coins:
+            outpoint_key = _outpoint_key(coin.outpoint)
+            batch.put(
+                COIN_PREFIX + outpoint_key,
+                msgpack.packb((coin.recipient, coin.amount, coin.height)),
+            )
+            batch.put(ADDRESS_PREFIX + _address_key(coin.recipient) + outpoint_key, b"")
+
+        for address, change in balance_changes.items():
+            balance = self.balance(address) + change
+            key = BALANCE_PREFIX + _address_key(address)
+            if balance:
+                batch.put(key, msgpack.packb(balance))
+            else:
+                batch.delete(key)
+
+        count = len(self) - len(removed_coins) + len(added_coins)
+        batch.put(COUNT_KEY, msgpack.packb(count))
+        if best_block is not None:
+            batch.put(BEST_BLOCK_KEY, bytes(best_block))
+
+    def _update_cache(self, removed_coins: list[Coin], added_coins: list[Coin]) -> None:
+        # only touch the cache once the batch has been written
+        for coin in removed_coins:
+            self.cache.pop(coin.outpoint, None)
+        for coin in added_coins:
+            self._cache(coin)
+
+    def _cache(self, coin: Coin) -> None:
+        if self.cache_size <= 0:
+            return
+
+        self.cache[coin.outpoint] = coin
+        self.cache.move_to_end(coin.outpoint)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    @staticmethod
+    def _decode(outpoint_key: bytes, data: bytes) -> Coin:
+        recipient, amount, height = msgpack.unpackb(data)
+        return Coin(
+            transaction_hash=Digest(outpoint_key[:-4]),
+            output_index=int.from_bytes(outpoint_key[-4:], "big"),
+            recipient=recipient,
+            amount=amount,
+            height=height,
+        )
@@ -1,7 +1,10 @@
-import itertools
-import string
+import os
+import time
+from typing import Optional
 
-from domepieces import Block, Transaction, TransactionOutput, zero_hash
+from domepieces import Block, Target, Transaction, TransactionOutput, zero_hash
+from domepieces.merkle import merkle_root
+from domepieces.proof_of_work import ProofOfWork, mine_parallel
 
 # who should receive the coinbase reward from this genesis transaction
 REWARD_RECIPIENT = "dca:ci368r7jmB2uDLRwdMpzntSF4vqfKCgU"
@@ -9,13 +12,43 @@ REWARD_RECIPIENT = "dca:ci368r7jmB2uDLRwdMpzntSF4vqfKCgU"
 # how much to give the reward recipient
 REWARD_AMOUNT = 50_00000000
 
-# which characters should prefix the hash
-# longer string = longer time to find a valid hash
-HASH_PREFIX = "0000"
+# how many leading zero bits the hash must have
+# more bits = longer time to find a valid hash
+DIFFICULTY_BITS = 16
+
+# when the genesis block was created
+TIMESTAMP = int(time.time())
+
+# how many processes to mine with
+# with a single worker, progress is printed while mining
+WORKERS = os.cpu_count() or 1
+
+# how many proofs to try between progress updates
+PROGRESS_INTERVAL = 100_000
+
+
+def mine_with_progress(pow_engine: ProofOfWork) -> int:
+    start = 0
+    proof: Optional[int] = None
+    while proof is None:
+        result = pow_engine.mine(start, start + PROGRESS_INTERVAL)
+        print(
+            f"{start + result.attempts} proofs tried ({result.hashrate:,.0f} H/s)",
+            end="\r",
+        )
+
+        proof = result.proof
+        start += PROGRESS_INTERVAL
+
+    return proof
 
 
 def mine_genesis_block(
-    reward_recipient: str, reward_amount: int, difficulty: str
+    reward_recipient: str,
+    reward_amount: int,
+    timestamp: int,
+    target: Target,
+    workers: int,
 ) -> Block:
     transactions = [
         Transaction(
@@ -32,34 +65,45 @@ def mine_genesis_block(
 
     previous = zero_hash()
 
-    for i, proof in enumerate(itertools.count()):
-        block = Block(
-            height=0,
-            proof=proof,
-            transactions=transactions,
-            previous=previous,
-        )
-
-        if i % 1000 == 0:
-            print(f"{proof} {block.hash}", end="\r")
-
-        if block.hash.startswith(difficulty):
-            break
-
-    print(f"{proof} {block.hash}")
+    pow_engine = ProofOfWork(
+        height=0,
+        previous=previous,
+        merkle_root=merkle_root([transaction.hash for transaction in transactions]),
+        timestamp=timestamp,
+        target=target,
+    )
+
+    if workers > 1:
+        result = mine_parallel(pow_engine, workers=workers)
+        print(f"{result.attempts} proofs tried ({result.hashrate:,.0f} H/s)", end="")
+        # parallel mining always runs until it finds a proof
+        assert result.proof is not None
+        proof = result.proof
+    else:
+        proof = mine_with_progress(pow_engine)
+
+    block = Block(
+        height=0,
+        proof=proof,
+        transactions=transactions,
+        previous=previous,
+        timestamp=timestamp,
+    )
+
+    print()
+    print(f"{block.proof} {block.hash}")
 
     return block
 
 
 def main() -> None:
-    if any(c not in string.hexdigits for c in HASH_PREFIX):
-        print(
-            f'hash prefix "{HASH_PREFIX}" is invalid. '
-            "it must be a valid hexadecimal string."
-        )
-        return
-
-    block = mine_genesis_block(REWARD_RECIPIENT, REWARD_AMOUNT, HASH_PREFIX)
+    block = mine_genesis_block(
+        REWARD_RECIPIENT,
+        REWARD_AMOUNT,
+        TIMESTAMP,
+        Target.from_bits(DIFFICULTY_BITS),
+        WORKERS,
+    )
     print(repr(block))
 
 
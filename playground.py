@@ -1,6 +1,4 @@
-from collections import defaultdict
 from decimal import Decimal
-from typing import DefaultDict
 
 from domepieces import Blockchain, Mempool, Miner, generate_address
 
@@ -12,7 +10,7 @@ def to_dpc(amount: int) -> Decimal:
 
 
 def print_mempool(mempool: Mempool) -> None:
-    if len(list(mempool)) == 0:
+    if len(mempool) == 0:
         print("(empty)")
         return
 
@@ -24,7 +22,7 @@ def print_mempool(mempool: Mempool) -> None:
 
 def print_chain(blockchain: Blockchain) -> None:
     for block in blockchain.blocks:
-        print(f"---- block {block.hash[:8]} ----")
+        print(f"---- block {block.hash.hex()[:8]} ----")
         for transaction in block.transactions:
             for output in transaction.outputs:
                 print(f"{output.recipient} +{to_dpc(output.amount):.8f} DPC")
@@ -39,8 +37,9 @@ def main() -> None:
 
     print("")
 
-    with Mempool("mempool.db") as pool:
-        chain = Blockchain()
+    chain = Blockchain()
+
+    with Mempool("mempool.db", blockchain=chain) as pool:
         miner = Miner(mempool=pool, blockchain=chain, address=wallet)
 
         print("mining new block...")
@@ -88,18 +87,14 @@ def main() -> None:
     print("UTXOs:")
     for utxo in chain.iter_utxos():
         print(
-            f"output #{utxo.output_index} of transaction {utxo.transaction.hash[:8]} ({to_dpc(utxo.output.amount):.8f} DPC)"
+            f"output #{utxo.output_index} of transaction {utxo.transaction_hash.hex()[:8]} ({to_dpc(utxo.output.amount):.8f} DPC)"
         )
 
     print()
 
     print("balances:")
 
-    balances: DefaultDict[str, int] = defaultdict(int)
-    for utxo in chain.iter_utxos():
-        balances[utxo.output.recipient] += utxo.output.amount
-
-    for address, balance in balances.items():
+    for address, balance in chain.balances().items():
         print(f"{address} has {to_dpc(balance):.8f} DPC")
 
 
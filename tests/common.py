@@ -0,0 +1,33 @@
+from domepieces import (
+    BLOCK_REWARD,
+    Block,
+    Difficulty,
+    Target,
+    Transaction,
+    TransactionOutput,
+    generate_address,
+)
+
+# lets tests add blocks without mining them
+NO_DIFFICULTY = Difficulty(initial_target=Target.from_bits(0))
+
+
+def child(parent: Block, *transactions: Transaction) -> Block:
+    """
+    Builds an unmined child of the given block with a fresh coinbase, so siblings
+    always have different hashes. Blocks are timestamped exactly on schedule, so the
+    target never changes.
+    """
+    height = parent.height + 1
+    coinbase = Transaction(
+        height=height,
+        inputs=[],
+        outputs=[TransactionOutput(generate_address(), BLOCK_REWARD)],
+    )
+    return Block(
+        height=height,
+        proof=0,
+        transactions=[coinbase, *transactions],
+        previous=parent.hash,
+        timestamp=parent.timestamp + NO_DIFFICULTY.block_time,
+    )
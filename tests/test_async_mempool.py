@@ -0,0 +1,161 @@
+import asyncio
+from typing import Iterable
+
+import pytest
+
+from domepieces import (
+    AsyncMempool,
+    Mempool,
+    MempoolBusyError,
+    PendingTransaction,
+    SubscriberLaggedError,
+    generate_address,
+)
+
+
+class RecordingMempool(Mempool):
+    """
+    A mempool that remembers the size of every write batch.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        super().__init__(db_path, order="arrival")
+        self.batch_sizes: list[int] = []
+
+    def create_transactions(
+        self, transactions: Iterable[PendingTransaction], *, sync: bool = False
+    ) -> list[PendingTransaction]:
+        transactions = list(transactions)
+        self.batch_sizes.append(len(transactions))
+        return super().create_transactions(transactions, sync=sync)
+
+
+def make_transactions(count: int) -> list[PendingTransaction]:
+    alice = generate_address()
+    bob = generate_address()
+    return [PendingTransaction(alice, bob, amount) for amount in range(count)]
+
+
+def test_submit_and_subscribe(db_path: str) -> None:
+    """
+    Tests that submitted transactions are written in batches and handed to
+    subscribers, whose iterators end when the async pool closes.
+    """
+    transactions = make_transactions(10)
+
+    async def run(pool: Mempool) -> list[PendingTransaction]:
+        async with AsyncMempool(pool, batch_size=4) as async_pool:
+            subscription = async_pool.subscribe()
+            for transaction in transactions:
+                async_pool.submit_nowait(transaction)
+            await async_pool.flush()
+
+        return [transaction async for transaction in subscription]
+
+    pool = RecordingMempool(db_path)
+    with pool:
+        assert asyncio.run(run(pool)) == transactions
+        assert list(pool) == transactions
+        assert pool.batch_sizes == [4, 4, 2]
+
+
+def test_lagging_subscribers(db_path: str) -> None:
+    """
+    Tests that a subscriber that falls too far behind is disconnected after handing
+    out what it already had, and that a subscription dropped without being iterated
+    isn't kept.
+    """
+    transactions = make_transactions(5)
+
+    async def run(pool: Mempool) -> list[PendingTransaction]:
+        received: list[PendingTransaction] = []
+        async with AsyncMempool(pool, subscriber_queue_size=3) as async_pool:
+            lagging = async_pool.subscribe()
+            dropped = async_pool.subscribe()
+            del dropped
+            assert len(async_pool._subscribers) == 1
+
+            for transaction in transactions:
+                async_pool.submit_nowait(transaction)
+            await async_pool.flush()
+            assert len(async_pool._subscribers) == 0
+
+            with pytest.raises(SubscriberLaggedError):
+                async for transaction in lagging:
+                    received.append(transaction)
+
+        return received
+
+    with Mempool(db_path, order="arrival") as pool:
+        assert asyncio.run(run(pool)) == transactions[:3]
+        assert list(pool) == transactions
+
+
+def test_backpressure(db_path: str) -> None:
+    """
+    Tests that a full queue makes submit_nowait fail and submit wait for room.
+    """
+    transactions = make_transactions(3)
+
+    async def run(pool: Mempool) -> None:
+        async with AsyncMempool(pool, queue_size=2) as async_pool:
+            # the writer doesn't get to run until something is awaited
+            async_pool.submit_nowait(transactions[0])
+            async_pool.submit_nowait(transactions[1])
+            with pytest.raises(MempoolBusyError):
+                async_pool.submit_nowait(transactions[2])
+
+            await async_pool.submit(transactions[2])
+
+    with Mempool(db_path, order="arrival") as pool:
+        asyncio.run(run(pool))
+        assert list(pool) == transactions
+
+
+def test_write_errors(db_path: str) -> None:
+    """
+    Tests that bad submissions are rejected up front, and that a failed write stops
+    the async pool from taking more.
+    """
+    transaction = make_transactions(1)[0]
+
+    async def run(pool: Mempool) -> None:
+        async with AsyncMempool(pool) as async_pool:
+            with pytest.raises(ValueError):
+                await async_pool.submit(
+                    PendingTransaction(transaction.sender, transaction.recipient, 1, -1)
+                )
+
+            # the mempool itself was never opened
+            await async_pool.submit(transaction)
+            with pytest.raises(RuntimeError):
+                await async_pool.flush()
+            with pytest.raises(RuntimeError):
+                await async_pool.submit(transaction)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run(Mempool(db_path)))
+
+
+def test_remove_and_run(db_path: str) -> None:
+    """
+    Tests that transactions are removed, and functions run, on the writer's executor,
+    and only while the async pool is running.
+    """
+    transactions = make_transactions(3)
+
+    async def run(pool: Mempool) -> None:
+        async with AsyncMempool(pool) as async_pool:
+            for transaction in transactions:
+                await async_pool.submit(transaction)
+            await async_pool.flush()
+
+            await async_pool.remove(transactions[:2])
+            assert await async_pool.run(lambda: list(pool)) == transactions[2:]
+
+        with pytest.raises(RuntimeError):
+            await async_pool.remove(transactions[2:])
+
+    with Mempool(db_path, order="arrival") as pool:
+        asyncio.run(run(pool))
+        assert list(pool) == transactions[2:]
@@ -0,0 +1,187 @@
+from typing import Iterator
+
+import pytest
+
+from domepieces import (
+    Block,
+    Blockchain,
+    BlockStore,
+    LevelDBBlockStore,
+    LevelDBUTXOStore,
+    MemoryBlockStore,
+    Target,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    block_store,
+    generate_address,
+    serialization,
+)
+from domepieces.storage import open_db
+
+from .common import NO_DIFFICULTY, child
+
+
+@pytest.fixture(params=["memory", "leveldb"])
+def store(request: pytest.FixtureRequest, db_path: str) -> Iterator[BlockStore]:
+    if request.param == "memory":
+        yield MemoryBlockStore()
+        return
+
+    with open_db(db_path) as db:
+        yield LevelDBBlockStore(db)
+
+
+def test_append(store: BlockStore) -> None:
+    """
+    Tests that blocks can be found by height, hash and transaction once appended.
+    """
+    genesis = Block.genesis()
+    block = child(genesis)
+
+    assert store.tip is None
+    assert len(store) == 0
+
+    store.append(genesis, Target.from_bits(16))
+    store.append(block, Target.from_bits(8))
+
+    assert len(store) == 2
+    assert store.tip == block
+    assert list(store) == [genesis, block]
+    assert store[1] == block
+    assert store.get(genesis.hash) == genesis
+    assert store.get(Block.genesis().previous) is None
+    assert store.height_of(block.hash) == 1
+    assert store.target_at(0) == Target.from_bits(16)
+    assert store.target_at(1) == Target.from_bits(8)
+    assert store.transaction_location(block.transactions[0].hash) == (block.hash, 0)
+    assert store.transaction_location(block.hash) is None
+
+
+def test_pop(store: BlockStore) -> None:
+    """
+    Tests that popping the tip removes it and its indexes, leaving its parent as tip.
+    """
+    genesis = Block.genesis()
+    block = child(genesis)
+    store.append(genesis, Target.from_bits(16))
+    store.append(block, Target.from_bits(16))
+
+    assert store.pop() == block
+
+    assert len(store) == 1
+    assert store.tip == genesis
+    assert store.get(block.hash) is None
+    assert store.transaction_location(block.transactions[0].hash) is None
+
+    assert store.pop() == genesis
+    assert store.tip is None
+
+
+def test_get_transaction() -> None:
+    """
+    Tests that transactions can be looked up by hash on the chain.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    block = child(chain.head)
+    chain.add_block(block)
+
+    transaction = block.transactions[0]
+    assert chain.get_transaction(transaction.hash) == transaction
+    assert chain.get_block(block.hash) == block
+    assert chain.get_transaction(block.hash) is None
+
+
+def test_restart(db_path: str) -> None:
+    """
+    Tests that a chain resumes from its stored tip after a restart.
+    """
+    with open_db(db_path) as db:
+        chain = Blockchain(
+            NO_DIFFICULTY,
+            block_store=LevelDBBlockStore(db),
+            utxo_store=LevelDBUTXOStore(db),
+        )
+        for _ in range(5):
+            chain.add_block(child(chain.head))
+
+        head = chain.head
+        balances = chain.balances()
+
+    with open_db(db_path) as db:
+        chain = Blockchain(
+            NO_DIFFICULTY,
+            block_store=LevelDBBlockStore(db),
+            utxo_store=LevelDBUTXOStore(db),
+        )
+
+        assert chain.head == head
+        assert len(chain) == 6
+        assert chain.balances() == balances
+
+        # an in-memory utxo set is rebuilt from the stored blocks
+        chain = Blockchain(NO_DIFFICULTY, block_store=LevelDBBlockStore(db))
+        assert chain.balances() == balances
+
+
+def test_add_block_without_decoding(
+    db_path: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Tests that adding children of the tip doesn't decode any stored blocks, since
+    heights, targets and work are read from the index and the tip is kept in memory.
+    """
+    decoded: list[bytes] = []
+
+    def decode_block(data: bytes) -> Block:
+        decoded.append(data)
+        return serialization.decode_block(data)
+
+    with open_db(db_path) as db:
+        chain = Blockchain(NO_DIFFICULTY, block_store=LevelDBBlockStore(db))
+        monkeypatch.setattr(block_store, "decode_block", decode_block)
+
+        for _ in range(3):
+            chain.add_block(child(chain.head))
+
+        assert decoded == []
+        assert chain.blocks.height_of(chain.head.hash) == 3
+        assert chain.blocks.work_at(3) == 4 * NO_DIFFICULTY.initial_target.work
+
+
+def test_catch_up_interrupted_block(db_path: str) -> None:
+    """
+    Tests that utxos are caught up if a block was stored but never applied.
+    """
+    with open_db(db_path) as db:
+        chain = Blockchain(
+            NO_DIFFICULTY,
+            block_store=LevelDBBlockStore(db),
+            utxo_store=LevelDBUTXOStore(db),
+        )
+        genesis_coinbase = chain.head.transactions[0]
+        alice = generate_address()
+
+        # simulate stopping after the block was stored but before utxos were updated
+        block = Block(
+            height=1,
+            proof=0,
+            transactions=[
+                Transaction(
+                    height=1,
+                    inputs=[TransactionInput(genesis_coinbase.hash, 0)],
+                    outputs=[TransactionOutput(alice, 50_00000000)],
+                )
+            ],
+            previous=chain.head.hash,
+        )
+        chain.blocks.append(block, NO_DIFFICULTY.initial_target)
+
+    with open_db(db_path) as db:
+        utxo_store = LevelDBUTXOStore(db)
+        chain = Blockchain(
+            NO_DIFFICULTY, block_store=LevelDBBlockStore(db), utxo_store=utxo_store
+        )
+
+        assert utxo_store.best_block == block.hash
+        assert chain.balances() == {alice: 50_00000000}
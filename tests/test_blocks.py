@@ -1,15 +1,27 @@
+import pickle
+
 import pytest
 
 from domepieces import (
+    BLOCK_REWARD,
+    UTXO,
     Block,
     Blockchain,
     BlockMismatchError,
+    Coin,
+    Difficulty,
+    ProofOfWorkError,
+    Target,
     Transaction,
     TransactionError,
     TransactionInput,
     TransactionOutput,
     generate_address,
+    zero_hash,
 )
+from domepieces.coin_selection import largest_first, smallest_first
+
+from .common import NO_DIFFICULTY, child
 
 
 def test_valid_chain() -> None:
@@ -20,7 +32,7 @@ def test_valid_chain() -> None:
     alice = generate_address()
     bob = generate_address()
 
-    chain = Blockchain()
+    chain = Blockchain(NO_DIFFICULTY)
 
     chain.add_block(
         Block(
@@ -34,6 +46,7 @@ def test_valid_chain() -> None:
                 )
             ],
             previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
         )
     )
 
@@ -57,6 +70,7 @@ def test_valid_chain() -> None:
                 )
             ],
             previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
         )
     )
 
@@ -86,11 +100,11 @@ def test_block_str() -> None:
     Tests that the string representation of a block is correct.
     """
     block = Block.genesis()
-    short_hash = block.hash[:8]
+    short_hash = block.hash.hex()[:8]
     assert str(block) == f"block {short_hash} @ 0"
 
-    block = Block(height=1, proof=12345, transactions=[], previous="")
-    short_hash = block.hash[:8]
+    block = Block(height=1, proof=12345, transactions=[], previous=zero_hash())
+    short_hash = block.hash.hex()[:8]
     assert str(block) == f"block {short_hash} @ 1"
 
 
@@ -103,7 +117,7 @@ def test_add_block_with_incorrect_parent() -> None:
     with pytest.raises(BlockMismatchError) as exc:
         chain.add_block(block)
 
-    assert str(exc.value) == f"{block} must have {chain.head} as its parent."
+    assert str(exc.value) == f"{block} must have a known block as its parent."
 
 
 def test_add_block_with_incorrect_height() -> None:
@@ -111,13 +125,38 @@ def test_add_block_with_incorrect_height() -> None:
     Tests that a block with an incorrect height cannot be added to the chain.
     """
     chain = Blockchain()
-    block = Block(height=100, proof=0, transactions=[], previous=chain.head.hash)
+    block = Block(
+        height=100,
+        proof=0,
+        transactions=[],
+        previous=chain.head.hash,
+        timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+    )
     with pytest.raises(BlockMismatchError) as exc:
         chain.add_block(block)
 
     assert str(exc.value) == f"{block} must have height {len(chain)}"
 
 
+def test_add_block_without_proof_of_work() -> None:
+    """
+    Tests that a block that doesn't meet the chain's target cannot be added.
+    """
+    chain = Blockchain(Difficulty(initial_target=Target.from_bits(64)))
+    block = Block(
+        height=1,
+        proof=0,
+        transactions=[],
+        previous=chain.head.hash,
+        timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+    )
+    with pytest.raises(ProofOfWorkError) as exc:
+        chain.add_block(block)
+
+    assert str(exc.value) == f"{block} does not meet the required target"
+    assert len(chain) == 1
+
+
 def test_spend_already_spent_output() -> None:
     """
     Tests that a transaction cannot be created that spends an already spent output.
@@ -125,7 +164,7 @@ def test_spend_already_spent_output() -> None:
     """
     alice = generate_address()
     bob = generate_address()
-    chain = Blockchain()
+    chain = Blockchain(NO_DIFFICULTY)
 
     chain.add_block(
         Block(
@@ -139,6 +178,7 @@ def test_spend_already_spent_output() -> None:
                 )
             ],
             previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
         )
     )
 
@@ -161,6 +201,7 @@ def test_spend_already_spent_output() -> None:
             proof=0,
             transactions=[transaction],
             previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
         )
     )
 
@@ -171,8 +212,408 @@ def test_spend_already_spent_output() -> None:
                 proof=0,
                 transactions=[transaction],
                 previous=chain.head.hash,
+                timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
             )
         )
 
-    short_hash = chain.head.transactions[0].hash[:8]
+    short_hash = chain.head.transactions[0].hash.hex()[:8]
     assert str(exc.value) == f"transaction {short_hash} output #0 is already spent."
+
+
+def test_repeated_transaction() -> None:
+    """
+    Tests that a transaction can't be repeated in a later block, where it would
+    overwrite its own unspent coins.
+    """
+    alice = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    transaction = Transaction(
+        height=1, inputs=[], outputs=[TransactionOutput(alice, 10)]
+    )
+    first = Block(
+        height=1,
+        proof=0,
+        transactions=[transaction],
+        previous=chain.head.hash,
+        timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+    )
+    chain.add_block(first)
+
+    repeated = child(first, transaction)
+    with pytest.raises(TransactionError) as exc:
+        chain.add_block(repeated)
+    assert str(exc.value) == "transaction #1 of block @ 2 is at height 1."
+
+    assert chain.utxos.balance(alice) == 10
+    assert [coin.amount for coin in chain.utxos.coins_for(alice)] == [10]
+
+    chain.disconnect_block()
+    assert chain.utxos.balance(alice) == 0
+    assert len(chain.utxos) == 1
+
+
+def test_hash_is_cached() -> None:
+    """
+    Tests that block and transaction hashes are computed once and survive pickling.
+    """
+    block = Block.genesis()
+    transaction = block.transactions[0]
+
+    assert block.hash is block.hash
+    assert transaction.hash is transaction.hash
+
+    unpickled = pickle.loads(pickle.dumps(block))
+    assert unpickled == block
+    assert unpickled.hash == block.hash
+    assert unpickled.transactions[0].hash == transaction.hash
+
+
+def test_models_are_slotted() -> None:
+    """
+    Tests that models have no instance dict and keep their sequences as tuples.
+    """
+    coinbase = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[TransactionOutput(generate_address(), 10)],
+    )
+    block = Block(height=1, proof=0, transactions=[coinbase], previous=zero_hash())
+    utxo = UTXO(coinbase, 0)
+
+    for model in (block, coinbase, coinbase.outputs[0], utxo):
+        assert not hasattr(model, "__dict__")
+
+    assert block.transactions == (coinbase,)
+    assert coinbase.inputs == ()
+    assert coinbase == Transaction(height=1, inputs=(), outputs=tuple(coinbase.outputs))
+    assert pickle.loads(pickle.dumps(utxo)) == utxo
+
+
+def test_utxos_by_address() -> None:
+    """
+    Tests that UTXOs can be looked up by address as they are created and spent.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+
+    coinbase = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[
+            TransactionOutput(recipient=alice, amount=10),
+            TransactionOutput(recipient=alice, amount=20),
+        ],
+    )
+    chain.add_block(
+        Block(
+            height=1,
+            proof=0,
+            transactions=[coinbase],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+
+    assert {utxo.output.amount for utxo in chain.iter_utxos(alice)} == {10, 20}
+    assert list(chain.iter_utxos(bob)) == []
+
+    spend = Transaction(
+        height=2,
+        inputs=[TransactionInput(transaction=coinbase.hash, output_index=0)],
+        outputs=[TransactionOutput(recipient=bob, amount=10)],
+    )
+    chain.add_block(
+        Block(
+            height=2,
+            proof=0,
+            transactions=[spend],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+
+    assert [utxo.output.amount for utxo in chain.iter_utxos(alice)] == [20]
+    assert [utxo.output.amount for utxo in chain.iter_utxos(bob)] == [10]
+    assert chain.find_utxos(bob, 10) == [Coin.from_transaction(spend, 0)]
+
+    with pytest.raises(TransactionError):
+        chain.find_utxos(bob, 11)
+
+
+def test_balances() -> None:
+    """
+    Tests that balances follow outputs as they are created and spent.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis_recipient = chain.head.transactions[0].outputs[0].recipient
+
+    coinbase = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[
+            TransactionOutput(recipient=alice, amount=10),
+            TransactionOutput(recipient=alice, amount=20),
+        ],
+    )
+    chain.add_block(
+        Block(
+            height=1,
+            proof=0,
+            transactions=[coinbase],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+
+    assert chain.balance(alice) == 30
+    assert chain.balance(bob) == 0
+
+    spend = Transaction(
+        height=2,
+        inputs=[
+            TransactionInput(transaction=coinbase.hash, output_index=0),
+            TransactionInput(transaction=coinbase.hash, output_index=1),
+        ],
+        outputs=[TransactionOutput(recipient=bob, amount=30)],
+    )
+    chain.add_block(
+        Block(
+            height=2,
+            proof=0,
+            transactions=[spend],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+
+    assert chain.balance(alice) == 0
+    assert chain.balance(bob) == 30
+    assert chain.balances() == {genesis_recipient: 50_00000000, bob: 30}
+
+
+def test_find_utxos_with_coin_selector() -> None:
+    """
+    Tests that find_utxos uses the chain's coin selector unless given another one.
+    """
+    alice = generate_address()
+    chain = Blockchain(NO_DIFFICULTY, coin_selector=largest_first)
+
+    coinbase = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[
+            TransactionOutput(recipient=alice, amount=amount) for amount in (5, 10, 20)
+        ],
+    )
+    chain.add_block(
+        Block(
+            height=1,
+            proof=0,
+            transactions=[coinbase],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+
+    assert chain.find_utxos(alice, 15) == [Coin.from_transaction(coinbase, 2)]
+    assert chain.find_utxos(alice, 15, coin_selector=smallest_first) == [
+        Coin.from_transaction(coinbase, 0),
+        Coin.from_transaction(coinbase, 1),
+    ]
+
+    # the largest coin is promised elsewhere
+    excluded = {Coin.from_transaction(coinbase, 2).outpoint}
+    assert chain.find_utxos(alice, 15, exclude=excluded) == [
+        Coin.from_transaction(coinbase, 1),
+        Coin.from_transaction(coinbase, 0),
+    ]
+    with pytest.raises(TransactionError):
+        chain.find_utxos(alice, 20, exclude=excluded)
+
+
+def test_double_spend_within_block() -> None:
+    """
+    Tests that a block spending the same output twice is rejected without changing
+    the utxo set.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis_coinbase = chain.head.transactions[0]
+    balances = chain.balances()
+
+    spends = [
+        Transaction(
+            height=1,
+            inputs=[TransactionInput(genesis_coinbase.hash, 0)],
+            outputs=[TransactionOutput(recipient, 50_00000000)],
+        )
+        for recipient in (alice, bob)
+    ]
+    block = Block(
+        height=1,
+        proof=0,
+        transactions=spends,
+        previous=chain.head.hash,
+        timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+    )
+
+    with pytest.raises(TransactionError) as exc:
+        chain.add_block(block)
+
+    assert str(exc.value) == f"{spends[1]} output #0 is spent twice in {block}."
+    assert len(chain) == 1
+    assert chain.balances() == balances
+
+
+def test_spend_output_created_in_same_block() -> None:
+    """
+    Tests that an output can be spent by a later transaction in the block that
+    created it, and never reaches the utxo set.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+
+    coinbase = Transaction(height=1, inputs=[], outputs=[TransactionOutput(alice, 10)])
+    spend = Transaction(
+        height=1,
+        inputs=[TransactionInput(coinbase.hash, 0)],
+        outputs=[TransactionOutput(bob, 10)],
+    )
+    chain.add_block(
+        Block(
+            height=1,
+            proof=0,
+            transactions=[coinbase, spend],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+
+    assert (coinbase.hash, 0) not in chain.utxos
+    assert chain.balance(alice) == 0
+    assert chain.balance(bob) == 10
+
+
+def test_outputs_exceed_inputs() -> None:
+    """
+    Tests that a transaction can't spend more than its inputs are worth.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis_coinbase = chain.head.transactions[0]
+
+    transaction = Transaction(
+        height=1,
+        inputs=[TransactionInput(genesis_coinbase.hash, 0)],
+        outputs=[
+            TransactionOutput(generate_address(), 50_00000000),
+            TransactionOutput(generate_address(), 1),
+        ],
+    )
+
+    with pytest.raises(TransactionError) as exc:
+        chain.add_block(
+            Block(
+                height=1,
+                proof=0,
+                transactions=[transaction],
+                previous=chain.head.hash,
+                timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+            )
+        )
+
+    assert str(exc.value) == (
+        f"{transaction} spends 5000000001 but its inputs are only worth 5000000000."
+    )
+
+
+def test_coinbase() -> None:
+    """
+    Tests that only a block's first transaction can pay out new coins, and no more
+    than the block reward and the fees of the block's other transactions.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis = chain.head
+    miner = generate_address()
+
+    def coinbase(amount: int) -> Transaction:
+        return Transaction(
+            height=1, inputs=[], outputs=[TransactionOutput(miner, amount)]
+        )
+
+    # pays a fee of 7
+    spend = Transaction(
+        height=1,
+        inputs=[TransactionInput(genesis.transactions[0].hash, 0)],
+        outputs=[TransactionOutput(generate_address(), BLOCK_REWARD - 7)],
+    )
+
+    def block(*transactions: Transaction) -> Block:
+        return Block(
+            height=1,
+            proof=0,
+            transactions=transactions,
+            previous=genesis.hash,
+            timestamp=genesis.timestamp + NO_DIFFICULTY.block_time,
+        )
+
+    greedy = block(coinbase(BLOCK_REWARD + 8), spend)
+    with pytest.raises(TransactionError) as exc:
+        chain.add_block(greedy)
+    assert str(exc.value) == (
+        f"the coinbase of {greedy} pays {BLOCK_REWARD + 8}, but the block reward and "
+        f"fees are only worth {BLOCK_REWARD + 7}."
+    )
+
+    second = coinbase(1)
+    with pytest.raises(TransactionError) as exc:
+        chain.add_block(block(spend, second))
+    assert str(exc.value).startswith(f"{second} has no inputs")
+
+    chain.add_block(block(coinbase(BLOCK_REWARD + 7), spend))
+    assert chain.balance(miner) == BLOCK_REWARD + 7
+
+
+def test_disconnect_block() -> None:
+    """
+    Tests that disconnecting the head block restores the utxo set from before it.
+    """
+    alice = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis = chain.head
+    utxos = sorted(chain.iter_utxos(), key=lambda coin: coin.amount)
+
+    spend = Transaction(
+        height=1,
+        inputs=[TransactionInput(genesis.transactions[0].hash, 0)],
+        outputs=[
+            TransactionOutput(alice, 20_00000000),
+            TransactionOutput(alice, 30_00000000),
+        ],
+    )
+    block = Block(
+        height=1,
+        proof=0,
+        transactions=[spend],
+        previous=genesis.hash,
+        timestamp=genesis.timestamp + NO_DIFFICULTY.block_time,
+    )
+    chain.add_block(block)
+
+    assert chain.disconnect_block() == block
+    assert chain.head == genesis
+    assert chain.utxos.best_block == genesis.hash
+    assert sorted(chain.iter_utxos(), key=lambda coin: coin.amount) == utxos
+    assert chain.balance(alice) == 0
+
+    # the block can be connected again once it's been disconnected
+    chain.add_block(block)
+    assert chain.balance(alice) == 50_00000000
+
+    chain.disconnect_block()
+    with pytest.raises(BlockMismatchError):
+        chain.disconnect_block()
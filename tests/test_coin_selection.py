@@ -1,12 +1,22 @@
 import random
 
+import pytest
+
 from domepieces import (
+    STRATEGIES,
     UTXO,
     Transaction,
     TransactionOutput,
     generate_address,
     select_coins,
 )
+from domepieces.coin_selection import (
+    _single_random_draw,
+    change_avoiding,
+    knapsack,
+    largest_first,
+    smallest_first,
+)
 
 
 def sorted_utxos(utxos: list[UTXO]) -> list[UTXO]:
@@ -120,3 +130,141 @@ def test_select_coins_random_series() -> None:
             assert sum(utxo.output.amount for utxo in selected_utxos) >= spend_target
         else:
             assert len(selected_utxos) == 0
+
+
+def test_select_coins_seeded() -> None:
+    address = generate_address()
+    all_utxos = [
+        UTXO(
+            Transaction(
+                height=0,
+                inputs=[],
+                outputs=[TransactionOutput(address, random.randint(1, 100))],
+            ),
+            output_index=0,
+        )
+        for _ in range(50)
+    ]
+
+    first = select_coins(
+        spend_target=250, available_utxos=all_utxos, rng=random.Random(1234)
+    )
+    second = select_coins(
+        spend_target=250, available_utxos=all_utxos, rng=random.Random(1234)
+    )
+
+    assert first == second
+
+
+def test_select_coins_large_wallet() -> None:
+    address = generate_address()
+    all_utxos = [
+        UTXO(
+            Transaction(height=0, inputs=[], outputs=[TransactionOutput(address, 1)]),
+            output_index=0,
+        )
+        for _ in range(5000)
+    ]
+
+    # needs nearly every utxo, which used to exceed the recursion limit
+    selected_utxos = select_coins(spend_target=4990, available_utxos=all_utxos)
+
+    assert sum(utxo.output.amount for utxo in selected_utxos) == 4990
+
+
+def test_single_random_draw() -> None:
+    address = generate_address()
+    transaction = Transaction(
+        height=0,
+        inputs=[],
+        outputs=[TransactionOutput(address, amount) for amount in range(1, 101)],
+    )
+    all_utxos = [UTXO(transaction, output_index=i) for i in range(100)]
+
+    selected_utxos = _single_random_draw(1000, all_utxos, random.Random(1234))
+
+    assert len({utxo.output_index for utxo in selected_utxos}) == len(selected_utxos)
+    assert sum(utxo.output.amount for utxo in selected_utxos) >= 1000
+
+    # dropping the last draw must take us back under the target
+    assert sum(utxo.output.amount for utxo in selected_utxos[:-1]) < 1000
+
+    assert _single_random_draw(10_000, all_utxos, random.Random(1234)) == []
+
+
+def make_utxos(address: str, amounts: list[int]) -> list[UTXO]:
+    return [
+        UTXO(
+            Transaction(
+                height=0, inputs=[], outputs=[TransactionOutput(address, amount)]
+            ),
+            output_index=0,
+        )
+        for amount in amounts
+    ]
+
+
+def amounts_of(utxos: list[UTXO]) -> list[int]:
+    return sorted(utxo.output.amount for utxo in utxos)
+
+
+def test_largest_first() -> None:
+    all_utxos = make_utxos(generate_address(), [30, 10, 15])
+
+    assert amounts_of(largest_first(25, all_utxos)) == [30]
+    assert amounts_of(largest_first(40, all_utxos)) == [15, 30]
+    assert largest_first(100, all_utxos) == []
+
+
+def test_smallest_first() -> None:
+    all_utxos = make_utxos(generate_address(), [30, 10, 15])
+
+    assert amounts_of(smallest_first(25, all_utxos)) == [10, 15]
+    assert amounts_of(smallest_first(26, all_utxos)) == [10, 15, 30]
+    assert smallest_first(100, all_utxos) == []
+
+
+def test_knapsack() -> None:
+    all_utxos = make_utxos(generate_address(), [30, 10, 15, 100])
+
+    # exact subsets of the smaller utxos are found
+    assert amounts_of(knapsack(40, all_utxos, random.Random(1))) == [10, 30]
+
+    # a single larger utxo wins when the smaller ones can't get close enough
+    assert amounts_of(knapsack(60, all_utxos, random.Random(1))) == [100]
+
+
+def test_change_avoiding() -> None:
+    all_utxos = make_utxos(generate_address(), [30, 10, 15, 100])
+
+    # 30 + 10 is an exact match, even though 30 + 15 is found first
+    assert amounts_of(change_avoiding(cost_of_change=10)(40, all_utxos)) == [10, 30]
+
+    # 30 + 15 overshoots by 2, which is within the cost of change
+    assert amounts_of(change_avoiding(cost_of_change=5)(43, all_utxos)) == [15, 30]
+
+    # nothing lands within 1 of 60, so this falls back to knapsack
+    assert amounts_of(change_avoiding(cost_of_change=1)(60, all_utxos)) == [100]
+
+
+@pytest.mark.parametrize("name", STRATEGIES)
+def test_strategies_random_series(name: str) -> None:
+    ITERATIONS = 2_000
+
+    coin_selector = STRATEGIES[name]
+    address = generate_address()
+
+    for _ in range(ITERATIONS):
+        all_utxos = make_utxos(
+            address, [random.randint(1, 100) for _ in range(random.randint(1, 10))]
+        )
+        spend_target = random.randint(1, 100)
+
+        selected_utxos = coin_selector(spend_target, all_utxos)
+
+        assert len(selected_utxos) <= len(all_utxos)
+
+        if sum(amounts_of(all_utxos)) >= spend_target:
+            assert sum(amounts_of(selected_utxos)) >= spend_target
+        else:
+            assert len(selected_utxos) == 0
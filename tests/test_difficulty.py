@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+from domepieces import Block, Blockchain, Difficulty, Target, TimestampError
+from domepieces.difficulty import MAX_TARGET
+
+
+def test_target_from_bits() -> None:
+    """
+    Tests that targets built from leading zero bits accept exactly the right digests.
+    """
+    target = Target.from_bits(12)
+
+    assert target.is_met_by(bytes.fromhex("000f" + "ff" * 62))
+    assert not target.is_met_by(bytes.fromhex("0010" + "00" * 62))
+    assert Target.from_bits(0).is_met_by(b"\xff" * 64)
+    assert Target.from_bits(13) < target
+
+
+def test_target_out_of_range() -> None:
+    """
+    Tests that targets outside of the digest range are rejected.
+    """
+    with pytest.raises(ValueError):
+        Target(MAX_TARGET + 1)
+
+    with pytest.raises(ValueError):
+        Target(-1)
+
+
+def test_retarget() -> None:
+    """
+    Tests that the target follows the observed block interval within the limits.
+    """
+    difficulty = Difficulty(interval=5, block_time=60, max_adjustment=4)
+    target = Target.from_bits(16)
+    expected = 4 * 60
+
+    # on schedule
+    assert difficulty.retarget(target, expected) == target
+
+    # twice as slow means twice as easy
+    assert difficulty.retarget(target, expected * 2).value == target.value * 2
+
+    # twice as fast means twice as hard
+    assert difficulty.retarget(target, expected // 2).value == target.value // 2
+
+    # adjustments are clamped
+    assert difficulty.retarget(target, expected * 100).value == target.value * 4
+    assert difficulty.retarget(target, 0).value == target.value // 4
+
+    # and never go past the easiest target
+    assert difficulty.retarget(Target.from_bits(0), expected * 2).value == MAX_TARGET
+
+
+def test_chain_retargets() -> None:
+    """
+    Tests that the chain adjusts its target every interval.
+    """
+    difficulty = Difficulty(
+        initial_target=Target.from_bits(0), interval=4, block_time=60
+    )
+    chain = Blockchain(difficulty)
+    start = chain.head.timestamp
+
+    for height in range(1, 4):
+        assert chain.next_target() == Target.from_bits(0)
+        # blocks arrive twice as fast as they should
+        chain.add_block(
+            Block(
+                height=height,
+                proof=0,
+                transactions=[],
+                previous=chain.head.hash,
+                timestamp=start + height * 30,
+            )
+        )
+
+    assert chain.next_target().value == MAX_TARGET // 2
+
+
+def test_block_timestamps() -> None:
+    """
+    Tests that a block must be timestamped after the median of the blocks before it,
+    on its own branch, and no more than the allowed drift ahead of the clock.
+    """
+    difficulty = Difficulty(initial_target=Target.from_bits(0), median_time_span=3)
+    chain = Blockchain(difficulty)
+    genesis = chain.head
+    start = genesis.timestamp
+
+    def block_at(parent: Block, timestamp: int) -> Block:
+        return Block(
+            height=parent.height + 1,
+            proof=0,
+            transactions=[],
+            previous=parent.hash,
+            timestamp=timestamp,
+        )
+
+    first = block_at(genesis, start + 100)
+    chain.add_block(first)
+    second = block_at(first, start + 200)
+    chain.add_block(second)
+    assert chain.median_time_past() == start + 100
+
+    at_median = block_at(second, start + 100)
+    with pytest.raises(TimestampError) as exc:
+        chain.add_block(at_median)
+    assert str(exc.value) == (
+        f"{at_median} must have a timestamp after {start + 100}, the median of the "
+        "blocks before it."
+    )
+
+    # earlier than its parent, but still after the median
+    chain.add_block(block_at(second, start + 101))
+
+    # a side branch is checked against its own ancestors
+    side = block_at(genesis, start + 10)
+    chain.add_block(side)
+    with pytest.raises(TimestampError):
+        chain.add_block(block_at(side, start + 5))
+
+    drift = difficulty.max_future_drift
+    future = block_at(chain.head, int(time.time()) + drift + 60)
+    with pytest.raises(TimestampError) as exc:
+        chain.add_block(future)
+    assert str(exc.value) == (
+        f"{future} has a timestamp more than {drift} seconds in the future."
+    )
+
+    chain.add_block(block_at(chain.head, int(time.time())))
+    assert chain.head.height == 4
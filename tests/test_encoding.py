@@ -0,0 +1,28 @@
+import pickle
+
+from domepieces import Block, Digest, zero_hash
+from domepieces.encoding import DIGEST_SIZE
+
+
+def test_digest_is_raw_bytes() -> None:
+    """
+    Tests that hashes are raw digest bytes, rendered as hex only when displayed.
+    """
+    digest = Block.genesis().hash
+
+    assert isinstance(digest, Digest)
+    assert len(digest) == DIGEST_SIZE
+    assert str(digest) == digest.hex()
+    assert f"{digest}" == digest.hex()
+    assert Digest.fromhex(str(digest)) == digest
+
+
+def test_digest_survives_pickling() -> None:
+    """
+    Tests that digests keep their type when pickled, as they are when mining in
+    worker processes.
+    """
+    unpickled = pickle.loads(pickle.dumps(zero_hash()))
+
+    assert isinstance(unpickled, Digest)
+    assert unpickled == bytes(DIGEST_SIZE)
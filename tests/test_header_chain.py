@@ -0,0 +1,190 @@
+import time
+
+import pytest
+
+from domepieces import (
+    Block,
+    Blockchain,
+    BlockHeader,
+    BlockMismatchError,
+    Difficulty,
+    Digest,
+    HeaderChain,
+    ProofOfWorkError,
+    Target,
+    TimestampError,
+)
+from domepieces.serialization import decode_headers, encode_headers
+
+from .common import NO_DIFFICULTY, child
+
+
+def build_branch(parent: Block, length: int) -> list[Block]:
+    blocks = [parent]
+    for _ in range(length):
+        blocks.append(child(blocks[-1]))
+    return blocks[1:]
+
+
+def test_header_hash_matches_block_hash() -> None:
+    """
+    Tests that a block and its header have the same hash.
+    """
+    block = child(Block.genesis())
+
+    assert block.header.hash == block.hash
+    assert block.header.merkle_root == block.merkle_root
+    assert Block.genesis().header.hash == Block.genesis().hash
+
+
+def test_wrong_length_digests() -> None:
+    """
+    Tests that headers and blocks refuse digests that aren't DIGEST_SIZE bytes, rather
+    than hashing them padded or truncated.
+    """
+    genesis = Block.genesis()
+    short = Digest(genesis.hash[:-1])
+    long = Digest(genesis.hash + b"\x00")
+
+    for digest in (short, long, Digest(b"")):
+        with pytest.raises(ValueError):
+            Block(height=1, proof=0, transactions=[], previous=digest)
+        with pytest.raises(ValueError):
+            BlockHeader(
+                height=1,
+                proof=0,
+                previous=digest,
+                merkle_root=genesis.merkle_root,
+            )
+        with pytest.raises(ValueError):
+            BlockHeader(
+                height=1,
+                proof=0,
+                previous=genesis.hash,
+                merkle_root=digest,
+            )
+
+
+def test_sync_headers_then_blocks() -> None:
+    """
+    Tests that a header chain follows the same chain as a blockchain, and that the
+    full blocks can be added afterwards in the order it gives.
+    """
+    blocks = build_branch(Block.genesis(), 25)
+    by_hash = {block.hash: block for block in blocks}
+
+    headers = HeaderChain(NO_DIFFICULTY)
+    added = headers.add_headers(
+        decode_headers(encode_headers(block.header for block in blocks))
+    )
+
+    assert added == 25
+    assert len(headers) == 26
+    assert headers.tip.hash == blocks[-1].hash
+    assert headers.height_of(blocks[10].hash) == 11
+    assert headers.work == 26
+
+    chain = Blockchain(NO_DIFFICULTY)
+    for header in list(headers)[1:]:
+        chain.add_block(by_hash[header.hash])
+
+    assert chain.head.hash == headers.tip.hash
+    assert chain.work == headers.work
+
+
+def test_invalid_headers() -> None:
+    """
+    Tests that headers with unknown parents, wrong heights, repeated hashes or
+    insufficient proof of work are rejected, and earlier headers are kept.
+    """
+    genesis = Block.genesis()
+    headers = HeaderChain(NO_DIFFICULTY)
+    first = child(genesis).header
+    headers.add_header(first)
+
+    with pytest.raises(BlockMismatchError) as exc:
+        headers.add_header(first)
+    assert str(exc.value) == f"{first} is already in the header tree."
+
+    orphan = child(child(genesis)).header
+    with pytest.raises(BlockMismatchError) as exc:
+        headers.add_header(orphan)
+    assert str(exc.value) == f"{orphan} must have a known block as its parent."
+
+    wrong_height = BlockHeader(
+        height=5, proof=0, previous=first.hash, merkle_root=first.merkle_root
+    )
+    with pytest.raises(BlockMismatchError):
+        headers.add_header(wrong_height)
+
+    # no header can meet a target of zero
+    strict = HeaderChain(Difficulty(initial_target=Target(0)))
+    blocks = build_branch(genesis, 2)
+    with pytest.raises(ProofOfWorkError):
+        strict.add_headers(block.header for block in blocks)
+    assert strict.tip == genesis.header
+
+    with pytest.raises(BlockMismatchError):
+        headers.add_headers([blocks[0].header, orphan])
+    assert headers.get(blocks[0].hash) == blocks[0].header
+
+
+def test_header_reorganization() -> None:
+    """
+    Tests that the header chain switches to a branch once it has more work.
+    """
+    genesis = Block.genesis()
+    main = build_branch(genesis, 3)
+    side = build_branch(main[0], 3)
+
+    headers = HeaderChain(NO_DIFFICULTY)
+    headers.add_headers(block.header for block in main)
+    headers.add_headers(block.header for block in side[:2])
+
+    # equal work doesn't replace the branch seen first
+    assert headers.tip.hash == main[-1].hash
+    assert headers.height_of(side[0].hash) is None
+
+    headers.add_header(side[2].header)
+
+    assert headers.tip.hash == side[-1].hash
+    assert [header.hash for header in headers] == [
+        block.hash for block in [genesis, main[0], *side]
+    ]
+    assert headers.height_of(main[1].hash) is None
+    assert headers.get(main[1].hash) == main[1].header
+
+
+def test_header_timestamps() -> None:
+    """
+    Tests that headers follow the same timestamp rules as blocks.
+    """
+    difficulty = Difficulty(initial_target=Target.from_bits(0), median_time_span=3)
+    headers = HeaderChain(difficulty)
+    genesis = headers.tip
+    start = genesis.timestamp
+
+    def header_at(parent: BlockHeader, timestamp: int) -> BlockHeader:
+        return Block(
+            height=parent.height + 1,
+            proof=0,
+            transactions=[],
+            previous=parent.hash,
+            timestamp=timestamp,
+        ).header
+
+    first = header_at(genesis, start + 100)
+    headers.add_header(first)
+    second = header_at(first, start + 200)
+    headers.add_header(second)
+    assert headers.median_time_past() == start + 100
+
+    with pytest.raises(TimestampError):
+        headers.add_header(header_at(second, start + 100))
+    with pytest.raises(TimestampError):
+        headers.add_header(
+            header_at(second, int(time.time()) + difficulty.max_future_drift + 60)
+        )
+
+    headers.add_header(header_at(second, start + 101))
+    assert len(headers) == 4
@@ -1,6 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import pytest
 
-from domepieces import Mempool, MempoolClosedError, generate_address
+from domepieces import (
+    Block,
+    Blockchain,
+    Coin,
+    Mempool,
+    MempoolClosedError,
+    MempoolFullError,
+    PendingTransaction,
+    Transaction,
+    TransactionError,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.coin_selection import largest_first
+
+from .common import NO_DIFFICULTY
+
+
+def fund(address: str, *amounts: int) -> tuple[Blockchain, list[Coin]]:
+    """
+    Returns a chain where the address has been paid the given amounts, and its coins.
+    """
+    chain = Blockchain(NO_DIFFICULTY, coin_selector=largest_first)
+    coinbase = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[TransactionOutput(address, amount) for amount in amounts],
+    )
+    chain.add_block(
+        Block(
+            height=1,
+            proof=0,
+            transactions=[coinbase],
+            previous=chain.head.hash,
+            timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+        )
+    )
+    return chain, [Coin.from_transaction(coinbase, i) for i in range(len(amounts))]
 
 
 def test_create_pending_transactions(db_path: str) -> None:
@@ -41,6 +80,230 @@ def test_consume_pending_transactions(db_path: str) -> None:
         assert len(list(pool)) == 0
 
 
+def test_fee_order(db_path: str) -> None:
+    """
+    Tests that the pool hands out the highest fees first, oldest first among equal
+    fees.
+    """
+    alice = generate_address()
+    bob = generate_address()
+
+    with Mempool(db_path) as pool:
+        low = pool.create_transaction(alice, bob, 10, fee=1)
+        high = pool.create_transaction(alice, bob, 10, fee=9)
+        first_mid = pool.create_transaction(alice, bob, 10, fee=5)
+        free = pool.create_transaction(alice, bob, 10)
+        second_mid = pool.create_transaction(alice, bob, 10, fee=5)
+
+        assert len(pool) == 5
+        assert list(pool) == [high, first_mid, second_mid, low, free]
+
+        pool.delete_transaction(first_mid)
+        pool.delete_transaction(first_mid)
+
+        assert len(pool) == 4
+        assert list(pool) == [high, second_mid, low, free]
+
+
+def test_arrival_order(db_path: str) -> None:
+    """
+    Tests that a first-in first-out pool ignores fees.
+    """
+    alice = generate_address()
+    bob = generate_address()
+
+    with Mempool(db_path, order="arrival") as pool:
+        transactions = [
+            pool.create_transaction(alice, bob, 10, fee=fee) for fee in (3, 1, 2)
+        ]
+
+        assert list(pool) == transactions
+
+
+def test_eviction(db_path: str) -> None:
+    """
+    Tests that a full pool evicts its cheapest transaction for a better paying one,
+    and turns away transactions that pay no more than the cheapest.
+    """
+    alice = generate_address()
+    bob = generate_address()
+
+    with Mempool(db_path, max_size=2) as pool:
+        cheap = pool.create_transaction(alice, bob, 10, fee=1)
+        mid = pool.create_transaction(alice, bob, 10, fee=5)
+
+        with pytest.raises(MempoolFullError):
+            pool.create_transaction(alice, bob, 10, fee=1)
+        assert list(pool) == [mid, cheap]
+
+        high = pool.create_transaction(alice, bob, 10, fee=9)
+        assert len(pool) == 2
+        assert list(pool) == [high, mid]
+
+
+def test_bulk_create_and_delete(db_path: str) -> None:
+    """
+    Tests adding and removing many transactions at once, skipping ones already in
+    the pool or repeated, and ignoring ones that aren't in it.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    transactions = [PendingTransaction(alice, bob, 10, fee=fee) for fee in range(5)]
+
+    with Mempool(db_path) as pool:
+        existing = pool.create_transaction(alice, bob, 10, fee=9)
+
+        added = pool.create_transactions(
+            [*transactions, transactions[0], existing], sync=True
+        )
+        assert added == transactions
+        assert len(pool) == 6
+        assert list(pool) == [existing, *reversed(transactions)]
+
+        pool.delete_transactions(
+            [existing, transactions[1], existing, PendingTransaction(alice, bob, 1)]
+        )
+        assert len(pool) == 4
+        assert list(pool) == [transactions[4], transactions[3], *transactions[2::-2]]
+
+
+def test_bulk_eviction(db_path: str) -> None:
+    """
+    Tests that adding more than a full pool holds keeps the best paying transactions,
+    whether they were already in the pool or not.
+    """
+    alice = generate_address()
+    bob = generate_address()
+
+    with Mempool(db_path, max_size=4) as pool:
+        old = [pool.create_transaction(alice, bob, 10, fee=fee) for fee in (2, 6)]
+        new = [PendingTransaction(alice, bob, 10, fee=fee) for fee in (1, 5, 2, 8)]
+
+        added = pool.create_transactions(new)
+
+        # the old transaction with a fee of 2 wins the tie against the new one
+        assert added == [new[1], new[3]]
+        assert len(pool) == 4
+        assert list(pool) == [new[3], old[1], new[1], old[0]]
+
+
+def test_lookups(db_path: str) -> None:
+    """
+    Tests that counting and looking up transactions follows writes, and survives
+    reopening the pool.
+    """
+    alice = generate_address()
+    bob = generate_address()
+
+    with Mempool(db_path, max_size=2) as pool:
+        cheap = pool.create_transaction(alice, bob, 10, fee=1)
+        kept = pool.create_transaction(alice, bob, 20, fee=5)
+        pool.create_transaction(alice, bob, 30, fee=3)
+
+        assert len(pool) == 2
+        assert cheap not in pool
+        assert pool.get(cheap.hash) is None
+        assert kept in pool
+        assert kept.hash in pool
+        assert pool.get(kept.hash) == kept
+
+        pool.delete_transaction(kept)
+        assert kept not in pool
+        assert len(pool) == 1
+
+    with Mempool(db_path) as pool:
+        assert len(pool) == 1
+        assert [transaction.amount for transaction in pool] == [30]
+
+
+def test_admission(db_path: str) -> None:
+    """
+    Tests that a pool with a blockchain only admits transactions the sender can pay
+    for with coins no other pending transaction holds.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain, (small, large) = fund(alice, 10, 20)
+
+    with Mempool(db_path, blockchain=chain) as pool:
+        first = pool.create_transaction(alice, bob, 15)
+        assert first.inputs == (large.outpoint,)
+        assert first.input_amount == 20
+
+        second = pool.create_transaction(alice, bob, 5, fee=2)
+        assert second.inputs == (small.outpoint,)
+
+        # every coin is reserved
+        with pytest.raises(TransactionError):
+            pool.create_transaction(alice, bob, 1)
+        with pytest.raises(TransactionError):
+            pool.create_transaction(bob, alice, 1)
+
+        pool.delete_transaction(first)
+        pool.create_transaction(alice, bob, 20)
+
+    with Mempool(db_path, blockchain=chain) as pool:
+        assert len(pool) == 2
+        with pytest.raises(TransactionError):
+            pool.create_transaction(alice, bob, 1)
+
+
+def test_admission_with_inputs(db_path: str) -> None:
+    """
+    Tests that transactions naming their inputs are only kept if they spend unspent,
+    unreserved coins of their sender, and are worth what they claim.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain, (small, large) = fund(alice, 10, 20)
+    _, (unknown,) = fund(alice, 30)
+
+    def spend(sender: str, *coins: Coin, claim: int = 0) -> PendingTransaction:
+        worth = sum(coin.amount for coin in coins)
+        return PendingTransaction(
+            sender,
+            bob,
+            5,
+            inputs=tuple(coin.outpoint for coin in coins),
+            input_amount=claim or worth,
+        )
+
+    valid = spend(alice, large)
+    rejected = [
+        # a coin the first one already reserved
+        spend(alice, small, large),
+        spend(alice, small, small),
+        spend(bob, small),
+        spend(alice, small, claim=11),
+        spend(alice, unknown),
+    ]
+
+    with Mempool(db_path, blockchain=chain) as pool:
+        assert pool.create_transactions([valid, *rejected]) == [valid]
+        assert pool.create_transactions(rejected) == []
+        assert list(pool) == [valid]
+
+
+def test_admission_waits_for_chain_changes(db_path: str) -> None:
+    """
+    Tests that a pool admitting transactions on another thread waits for the chain's
+    lock, so it never reads the utxo set while a block is being added.
+    """
+    alice = generate_address()
+    chain, _ = fund(alice, 10)
+
+    with Mempool(db_path, blockchain=chain) as pool:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with chain.lock:
+                future = executor.submit(
+                    pool.create_transaction, alice, generate_address(), 5
+                )
+                done, _ = wait([future], timeout=0.1)
+                assert not done
+
+            assert future.result(timeout=5).inputs
+
+
 def test_create_transaction_on_closed_pool(db_path: str) -> None:
     """
     Tests creation of a pending transaction outside of the context manager.
@@ -70,3 +333,20 @@ def test_iterate_closed_pool(db_path: str) -> None:
     pool = Mempool(db_path)
     with pytest.raises(MempoolClosedError):
         list(pool)
+
+
+def test_count_closed_pool(db_path: str) -> None:
+    """
+    Tests counting and looking up transactions outside of the context manager.
+    """
+    pool = Mempool(db_path)
+
+    with pool:
+        transaction = pool.create_transaction(generate_address(), generate_address(), 0)
+
+    with pytest.raises(MempoolClosedError):
+        len(pool)
+    with pytest.raises(MempoolClosedError):
+        transaction in pool
+    with pytest.raises(MempoolClosedError):
+        pool.get(transaction.hash)
@@ -0,0 +1,106 @@
+import hashlib
+
+import pytest
+
+from domepieces import (
+    Block,
+    MerkleProof,
+    Transaction,
+    TransactionOutput,
+    generate_address,
+    merkle_proof,
+    merkle_root,
+    zero_hash,
+)
+
+
+def leaves(count: int) -> list[bytes]:
+    return [hashlib.blake2b(bytes([i])).digest() for i in range(count)]
+
+
+def test_merkle_root() -> None:
+    """
+    Tests that roots depend on every leaf and their order, and that an odd leaf isn't
+    treated like a duplicated one.
+    """
+    a, b, c = leaves(3)
+
+    assert merkle_root([]) == zero_hash()
+    assert merkle_root([a]) != a
+    assert merkle_root([a, b]) != merkle_root([b, a])
+    assert merkle_root([a, b, c]) != merkle_root([a, b, c, c])
+    assert merkle_root([a, b, c]) != merkle_root([a, b])
+
+
+@pytest.mark.parametrize("count", range(1, 12))
+def test_proofs_verify(count: int) -> None:
+    """
+    Tests that a proof for every leaf verifies against the root, and only for the
+    leaf it was made for.
+    """
+    hashes = leaves(count)
+    root = merkle_root(hashes)
+
+    for index, leaf in enumerate(hashes):
+        proof = merkle_proof(hashes, index)
+
+        assert proof.verify(leaf, root)
+        assert not proof.verify(leaves(count + 1)[-1], root)
+        assert not proof.verify(leaf, zero_hash())
+
+
+def test_tampered_proofs_fail() -> None:
+    """
+    Tests that proofs with a changed index, size or sibling list are rejected.
+    """
+    hashes = leaves(5)
+    root = merkle_root(hashes)
+    proof = merkle_proof(hashes, 2)
+    assert proof.verify(hashes[2], root)
+
+    assert not MerkleProof(3, 5, proof.siblings).verify(hashes[2], root)
+    assert not MerkleProof(2, 3, proof.siblings).verify(hashes[2], root)
+    assert not MerkleProof(5, 5, proof.siblings).verify(hashes[2], root)
+    assert not MerkleProof(2, 5, proof.siblings[1:]).verify(hashes[2], root)
+    assert not MerkleProof(2, 5, [*proof.siblings, root]).verify(hashes[2], root)
+
+    with pytest.raises(IndexError):
+        merkle_proof(hashes, 5)
+
+
+def test_block_merkle_proof() -> None:
+    """
+    Tests that a block commits to its transactions through its merkle root, and can
+    prove that a transaction is in it.
+    """
+    transactions = [
+        Transaction(
+            height=1, inputs=[], outputs=[TransactionOutput(generate_address(), 10)]
+        )
+        for _ in range(5)
+    ]
+    block = Block(
+        height=1,
+        proof=0,
+        transactions=transactions,
+        previous=Block.genesis().hash,
+    )
+
+    assert block.merkle_root == merkle_root([t.hash for t in transactions])
+
+    for transaction in transactions:
+        proof = block.merkle_proof(transaction.hash)
+        assert proof.verify(transaction.hash, block.merkle_root)
+
+    with pytest.raises(ValueError):
+        block.merkle_proof(Block.genesis().transactions[0].hash)
+
+    # any change to the transactions changes the root, and so the block hash
+    reordered = Block(
+        height=1,
+        proof=0,
+        transactions=transactions[::-1],
+        previous=Block.genesis().hash,
+    )
+    assert reordered.merkle_root != block.merkle_root
+    assert reordered.hash != block.hash
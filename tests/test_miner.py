@@ -0,0 +1,154 @@
+import pytest
+
+from domepieces import (
+    Block,
+    Blockchain,
+    Mempool,
+    Miner,
+    Transaction,
+    TransactionError,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+
+from .common import NO_DIFFICULTY
+
+
+def test_mine_highest_fees(db_path: str) -> None:
+    """
+    Tests that the miner takes the best paying transactions from the pool, and
+    collects their fees in its coinbase.
+    """
+    # the genesis reward is the only money there is
+    sender = Block.genesis().transactions[0].outputs[0].recipient
+    miner_address = generate_address()
+    bob = generate_address()
+    carol = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+
+    with Mempool(db_path) as pool:
+        pool.create_transaction(sender, bob, 10, fee=1)
+        pool.create_transaction(sender, carol, 20, fee=7)
+
+        miner = Miner(
+            mempool=pool,
+            blockchain=chain,
+            address=miner_address,
+            max_transactions=1,
+        )
+        chain.add_block(miner.mine())
+
+        assert chain.balance(carol) == 20
+        assert chain.balance(bob) == 0
+        assert chain.balance(miner_address) == 50_00000000 + 7
+        assert chain.balance(sender) == 50_00000000 - 20 - 7
+
+        # the cheaper transaction is still waiting
+        assert [transaction.recipient for transaction in pool] == [bob]
+
+
+def test_mine_reserved_coins(db_path: str) -> None:
+    """
+    Tests that transactions from one sender spend the coins reserved for them, so a
+    block holding several of them is valid.
+    """
+    sender = Block.genesis().transactions[0].outputs[0].recipient
+    bob = generate_address()
+    carol = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    miner_address = generate_address()
+
+    with Mempool(db_path, blockchain=chain) as pool:
+        miner = Miner(mempool=pool, blockchain=chain, address=sender)
+        chain.add_block(miner.mine())
+
+        # the sender now has the genesis coin and a block reward
+        pool.create_transaction(sender, bob, 10, fee=1)
+        pool.create_transaction(sender, carol, 20, fee=2)
+        with pytest.raises(TransactionError):
+            pool.create_transaction(sender, carol, 1)
+
+        miner = Miner(mempool=pool, blockchain=chain, address=miner_address)
+        chain.add_block(miner.mine())
+
+        assert len(pool) == 0
+        assert chain.balance(bob) == 10
+        assert chain.balance(carol) == 20
+        assert chain.balance(miner_address) == 50_00000000 + 3
+        assert chain.balance(sender) == 2 * 50_00000000 - 30 - 3
+
+
+def test_mine_without_stale_transactions(db_path: str) -> None:
+    """
+    Tests that the miner drops transactions whose coins were spent since they were
+    admitted, and leaves ones an unchecked pool can't pay for yet.
+    """
+    sender = Block.genesis().transactions[0].outputs[0].recipient
+    genesis_coinbase = Block.genesis().transactions[0]
+    bob = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+
+    with Mempool(db_path, blockchain=chain) as pool:
+        pool.create_transaction(sender, bob, 10)
+
+        # a block from elsewhere spends the reserved coin
+        spend = Transaction(
+            height=1,
+            inputs=[TransactionInput(genesis_coinbase.hash, 0)],
+            outputs=[TransactionOutput(bob, 50_00000000)],
+        )
+        coinbase = Transaction(
+            height=1, inputs=[], outputs=[TransactionOutput(generate_address(), 1)]
+        )
+        chain.add_block(
+            Block(
+                height=1,
+                proof=0,
+                transactions=[coinbase, spend],
+                previous=chain.head.hash,
+                timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+            )
+        )
+
+        miner = Miner(mempool=pool, blockchain=chain, address=generate_address())
+        block = miner.mine()
+        assert len(block.transactions) == 1
+        assert len(pool) == 0
+
+    # a pool that doesn't check funds hands the miner a transaction nobody can pay
+    with Mempool(db_path) as pool:
+        broke = pool.create_transaction(generate_address(), bob, 10, fee=5)
+        paid = pool.create_transaction(bob, sender, 10)
+
+        miner = Miner(mempool=pool, blockchain=chain, address=generate_address())
+        chain.add_block(miner.mine())
+
+        assert chain.balance(sender) == 10
+        assert list(pool) == [broke]
+        assert paid not in pool
+
+
+def test_mine_parallel_reuses_pool(db_path: str) -> None:
+    """
+    Tests that a parallel miner searches every block on the same worker pool, and
+    shuts it down when closed.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+
+    with Mempool(db_path) as pool:
+        with Miner(
+            mempool=pool, blockchain=chain, address=generate_address(), workers=2
+        ) as miner:
+            chain.add_block(miner.mine())
+            executor = miner._executor
+            assert executor is not None
+
+            chain.add_block(miner.mine())
+            assert miner._executor is executor
+
+        assert miner._executor is None
+        with pytest.raises(RuntimeError):
+            executor.submit(int)
+
+    assert len(chain) == 3
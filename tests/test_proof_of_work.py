@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from domepieces import (
+    Block,
+    Digest,
+    Target,
+    Transaction,
+    TransactionOutput,
+    generate_address,
+    merkle_root,
+)
+from domepieces.proof_of_work import ProofOfWork, mine_parallel, search_parallel
+
+
+def make_transactions() -> list[Transaction]:
+    return [
+        Transaction(
+            height=1,
+            inputs=[],
+            outputs=[TransactionOutput(recipient=generate_address(), amount=amount)],
+        )
+        for amount in (10, 20, 30)
+    ]
+
+
+def test_digest_matches_block_hash() -> None:
+    """
+    Tests that the proof of work engine hashes headers exactly like Block.hash.
+    """
+    previous = Block.genesis().hash
+    transactions = make_transactions()
+    pow_engine = ProofOfWork(
+        height=1,
+        previous=previous,
+        merkle_root=merkle_root([transaction.hash for transaction in transactions]),
+        timestamp=1234,
+    )
+
+    for proof in (0, 1, 12345, 2 ** 40):
+        block = Block(
+            height=1,
+            proof=proof,
+            transactions=transactions,
+            previous=previous,
+            timestamp=1234,
+        )
+        assert pow_engine.digest(proof) == block.hash
+
+
+def test_genesis_proof() -> None:
+    """
+    Tests that the engine finds the genesis block's proof at the default difficulty.
+    """
+    genesis = Block.genesis()
+    pow_engine = ProofOfWork(
+        height=0,
+        previous=genesis.previous,
+        merkle_root=genesis.merkle_root,
+        timestamp=genesis.timestamp,
+    )
+
+    result = pow_engine.mine()
+
+    assert result.proof == genesis.proof
+    assert result.attempts == genesis.proof + 1
+    assert genesis.hash.hex().startswith("0000")
+
+
+def test_search_finds_lowest_proof() -> None:
+    """
+    Tests that the search returns the lowest proof meeting the target in its range.
+    """
+    pow_engine = ProofOfWork(
+        height=1,
+        previous=Block.genesis().hash,
+        merkle_root=merkle_root(
+            [transaction.hash for transaction in make_transactions()]
+        ),
+        timestamp=0,
+        target=Target.from_bits(6),
+    )
+    target = Target.from_bits(6)
+
+    valid = [
+        proof for proof in range(1000) if target.is_met_by(pow_engine.digest(proof))
+    ]
+    assert valid
+
+    assert pow_engine.search() == valid[0]
+    assert pow_engine.search(valid[0] + 1, 1000) == valid[1]
+    assert pow_engine.search(valid[-1] + 1, 1000) is None
+
+
+def test_zero_difficulty() -> None:
+    """
+    Tests that every proof is valid when no leading zero bits are required.
+    """
+    pow_engine = ProofOfWork(
+        height=1,
+        previous=Block.genesis().hash,
+        merkle_root=merkle_root([]),
+        timestamp=0,
+        target=Target.from_bits(0),
+    )
+
+    assert pow_engine.search(5, 10) == 5
+
+
+def test_parallel_search_matches_serial_search() -> None:
+    """
+    Tests that splitting the search into chunks still finds the lowest valid proof.
+    """
+    pow_engine = ProofOfWork(
+        height=1,
+        previous=Block.genesis().hash,
+        merkle_root=merkle_root(
+            [transaction.hash for transaction in make_transactions()]
+        ),
+        timestamp=0,
+        target=Target.from_bits(10),
+    )
+    expected = pow_engine.search()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for chunk_size in (1, 7, 100, 5000):
+            proof = search_parallel(
+                pow_engine, executor, workers=4, chunk_size=chunk_size
+            )
+            assert proof == expected
+
+
+def test_mine_parallel() -> None:
+    """
+    Tests mining across worker processes.
+    """
+    transactions = make_transactions()
+    previous = Block.genesis().hash
+    pow_engine = ProofOfWork(
+        height=1,
+        previous=previous,
+        merkle_root=merkle_root([transaction.hash for transaction in transactions]),
+        timestamp=0,
+        target=Target.from_bits(8),
+    )
+
+    result = mine_parallel(pow_engine, workers=2, chunk_size=64)
+
+    assert result.proof == pow_engine.search()
+    assert result.proof is not None
+
+    block = Block(
+        height=1, proof=result.proof, transactions=transactions, previous=previous
+    )
+    assert Target.from_bits(8).is_met_by(block.hash)
+
+
+def test_wrong_length_digest() -> None:
+    """
+    Tests that the proof of work engine refuses digests of the wrong length.
+    """
+    previous = Block.genesis().hash
+    with pytest.raises(ValueError):
+        ProofOfWork(
+            height=1,
+            previous=Digest(previous[:32]),
+            merkle_root=previous,
+            timestamp=0,
+        )
@@ -0,0 +1,231 @@
+import pytest
+
+from domepieces import (
+    Block,
+    Blockchain,
+    BlockMismatchError,
+    LevelDBBlockStore,
+    LevelDBUTXOStore,
+    MemoryUTXOStore,
+    Transaction,
+    TransactionError,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.storage import open_db
+
+from .common import NO_DIFFICULTY, child
+
+
+def spend_genesis(recipient: str) -> Transaction:
+    return Transaction(
+        height=1,
+        inputs=[TransactionInput(Block.genesis().transactions[0].hash, 0)],
+        outputs=[TransactionOutput(recipient, 50_00000000)],
+    )
+
+
+def test_side_branch_is_kept() -> None:
+    """
+    Tests that a block on a lighter branch is kept without changing the main chain.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis = chain.head
+    a1 = child(genesis)
+    a2 = child(a1)
+    chain.add_block(a1)
+    chain.add_block(a2)
+
+    b1 = child(genesis)
+    chain.add_block(b1)
+
+    assert chain.head == a2
+    assert chain.work == 3
+    assert chain.side_blocks[b1.hash].work == 2
+
+    # a branch with equal work doesn't replace the branch we saw first
+    chain.add_block(child(b1))
+    assert chain.head == a2
+
+
+def test_reorganize_to_heavier_branch() -> None:
+    """
+    Tests that the chain switches to a branch with more work, and back again.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis = chain.head
+
+    a1 = child(genesis, spend_genesis(alice))
+    chain.add_block(a1)
+    assert chain.balance(alice) == 50_00000000
+
+    b1 = child(genesis, spend_genesis(bob))
+    b2 = child(b1)
+    chain.add_block(b1)
+    chain.add_block(b2)
+
+    assert chain.head == b2
+    assert list(chain.blocks) == [genesis, b1, b2]
+    assert chain.balance(alice) == 0
+    assert chain.balance(bob) == 50_00000000
+    assert chain.get_transaction(a1.transactions[1].hash) is None
+    assert a1.hash in chain.side_blocks
+    assert b1.hash not in chain.side_blocks
+
+    a2 = child(a1)
+    a3 = child(a2)
+    chain.add_block(a2)
+    chain.add_block(a3)
+
+    assert chain.head == a3
+    assert chain.balance(alice) == 50_00000000
+    assert chain.balance(bob) == 0
+    assert set(chain.side_blocks) == {b1.hash, b2.hash}
+
+
+def test_invalid_branch_is_rolled_back() -> None:
+    """
+    Tests that a reorganization onto a branch with an invalid block is undone, and
+    the invalid block and its descendants are forgotten.
+    """
+    alice = generate_address()
+    chain = Blockchain(NO_DIFFICULTY)
+    genesis = chain.head
+
+    a1 = child(genesis, spend_genesis(alice))
+    chain.add_block(a1)
+    balances = chain.balances()
+
+    b1 = child(genesis)
+    chain.add_block(b1)
+
+    # spends an output that only exists on the other branch
+    b2 = child(
+        b1,
+        Transaction(
+            height=2,
+            inputs=[TransactionInput(a1.transactions[0].hash, 0)],
+            outputs=[TransactionOutput(alice, 50_00000000)],
+        ),
+    )
+    with pytest.raises(TransactionError):
+        chain.add_block(b2)
+
+    assert chain.head == a1
+    assert chain.balances() == balances
+    assert b1.hash in chain.side_blocks
+    assert b2.hash not in chain.side_blocks
+
+    with pytest.raises(BlockMismatchError):
+        chain.add_block(child(b2))
+
+
+def test_reorganization_depth_is_limited() -> None:
+    """
+    Tests that blocks forking deeper than the utxo store can undo are rejected, and
+    that a reorganization as deep as it can undo still happens.
+    """
+    chain = Blockchain(NO_DIFFICULTY, utxo_store=MemoryUTXOStore(max_undo_depth=2))
+    genesis = chain.head
+    a1 = child(genesis)
+    a2 = child(a1)
+    a3 = child(a2)
+    for block in (a1, a2, a3):
+        chain.add_block(block)
+
+    too_deep = child(genesis)
+    with pytest.raises(BlockMismatchError) as exc:
+        chain.add_block(too_deep)
+    assert str(exc.value) == (
+        f"{too_deep} forks 3 blocks below the head, deeper than the 2 blocks that "
+        "can be undone."
+    )
+    assert too_deep.hash not in chain.side_blocks
+
+    b2 = child(a1)
+    b3 = child(b2)
+    b4 = child(b3)
+    for block in (b2, b3, b4):
+        chain.add_block(block)
+
+    assert chain.head == b4
+
+    # the old branch now forks too deep to come back to
+    assert chain.side_blocks == {}
+
+
+def test_side_blocks_are_pruned() -> None:
+    """
+    Tests that side blocks are forgotten, along with their descendants, once the head
+    has moved too far past their fork to ever reorganize onto them.
+    """
+    chain = Blockchain(NO_DIFFICULTY, utxo_store=MemoryUTXOStore(max_undo_depth=2))
+    genesis = chain.head
+    a1 = child(genesis)
+    a2 = child(a1)
+    chain.add_block(a1)
+    chain.add_block(a2)
+
+    b1 = child(genesis)
+    b2 = child(b1)
+    c2 = child(a1)
+    for block in (b1, b2, c2):
+        chain.add_block(block)
+    assert chain.side_blocks.keys() == {b1.hash, b2.hash, c2.hash}
+
+    # b2 is as high as c2, but forks from the genesis block
+    chain.add_block(child(a2))
+    assert chain.side_blocks.keys() == {c2.hash}
+
+    """
+    Tests that blocks already in the tree, or with unknown parents, are rejected.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    a1 = child(chain.head)
+    chain.add_block(a1)
+
+    with pytest.raises(BlockMismatchError) as exc:
+        chain.add_block(a1)
+    assert str(exc.value) == f"{a1} is already in the block tree."
+
+    orphan = child(child(a1))
+    with pytest.raises(BlockMismatchError) as exc:
+        chain.add_block(orphan)
+    assert str(exc.value) == f"{orphan} must have a known block as its parent."
+
+
+def test_reorganize_persists(db_path: str) -> None:
+    """
+    Tests that a reorganization is written through to the leveldb stores.
+    """
+    bob = generate_address()
+
+    with open_db(db_path) as db:
+        chain = Blockchain(
+            NO_DIFFICULTY,
+            block_store=LevelDBBlockStore(db),
+            utxo_store=LevelDBUTXOStore(db),
+        )
+        genesis = chain.head
+        chain.add_block(child(genesis, spend_genesis(generate_address())))
+
+        b1 = child(genesis, spend_genesis(bob))
+        b2 = child(b1)
+        chain.add_block(b1)
+        chain.add_block(b2)
+        balances = chain.balances()
+
+    with open_db(db_path) as db:
+        chain = Blockchain(
+            NO_DIFFICULTY,
+            block_store=LevelDBBlockStore(db),
+            utxo_store=LevelDBUTXOStore(db),
+        )
+
+        assert chain.head == b2
+        assert chain.work == 3
+        assert chain.balances() == balances
+        assert chain.balance(bob) == 50_00000000
@@ -0,0 +1,190 @@
+import pytest
+
+from domepieces import (
+    Block,
+    Coin,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    generate_address,
+)
+from domepieces.serialization import (
+    SerializationError,
+    _pack,
+    decode_block,
+    decode_coins,
+    decode_header,
+    decode_headers,
+    decode_transaction,
+    encode_block,
+    encode_coins,
+    encode_header,
+    encode_headers,
+    encode_transaction,
+)
+
+
+def make_block() -> Block:
+    genesis = Block.genesis()
+    coinbase = genesis.transactions[0]
+    return Block(
+        height=1,
+        proof=2 ** 40,
+        transactions=[
+            Transaction(
+                height=1,
+                inputs=[],
+                outputs=[TransactionOutput(generate_address(), 50_00000000)],
+            ),
+            Transaction(
+                height=1,
+                inputs=[TransactionInput(coinbase.hash, 0)],
+                outputs=[
+                    TransactionOutput(generate_address(), 1),
+                    TransactionOutput(generate_address(), 49_99999999),
+                ],
+            ),
+        ],
+        previous=genesis.hash,
+        timestamp=1633046460,
+    )
+
+
+def test_transaction_round_trip() -> None:
+    """
+    Tests that transactions decode to exactly what was encoded.
+    """
+    for transaction in make_block().transactions:
+        decoded = decode_transaction(encode_transaction(transaction))
+        assert decoded == transaction
+        assert decoded.hash == transaction.hash
+
+
+def test_block_round_trip() -> None:
+    """
+    Tests that blocks decode to exactly what was encoded, including the genesis block.
+    """
+    for block in (Block.genesis(), make_block()):
+        decoded = decode_block(encode_block(block))
+        assert decoded == block
+        assert decoded.hash == block.hash
+
+
+def test_header_round_trip() -> None:
+    """
+    Tests that headers decode to exactly what was encoded, singly and in bulk.
+    """
+    headers = [Block.genesis().header, make_block().header]
+
+    for header in headers:
+        decoded = decode_header(encode_header(header))
+        assert decoded == header
+        assert decoded.hash == header.hash
+
+    assert decode_headers(encode_headers(headers)) == headers
+    assert decode_headers(encode_headers([])) == []
+
+
+def test_coins_round_trip() -> None:
+    """
+    Tests that a list of coins decodes to exactly the coins that were encoded.
+    """
+    block = make_block()
+    coins = [
+        Coin.from_transaction(transaction, output_index)
+        for transaction in block.transactions
+        for output_index in range(len(transaction.outputs))
+    ]
+
+    assert decode_coins(encode_coins(coins)) == coins
+    assert decode_coins(encode_coins([])) == []
+
+
+def test_digests_are_raw_bytes() -> None:
+    """
+    Tests that hashes take up their digest size rather than their hex length.
+    """
+    block = Block(height=1, proof=0, transactions=[], previous=Block.genesis().hash)
+
+    # version byte, array header, 3 single-byte ints, an empty transaction array and
+    # a 2-byte bin header in front of the digest
+    assert len(encode_block(block)) == 1 + 1 + 3 + 1 + 2 + 64
+
+
+def test_unsupported_version() -> None:
+    """
+    Tests that records from an unknown format version are rejected.
+    """
+    data = bytearray(encode_block(make_block()))
+    data[0] = 99
+
+    with pytest.raises(SerializationError):
+        decode_block(bytes(data))
+
+    with pytest.raises(SerializationError):
+        decode_block(b"")
+
+
+def test_malformed_record() -> None:
+    """
+    Tests that truncated records are rejected.
+    """
+    with pytest.raises(SerializationError):
+        decode_block(encode_block(make_block())[:50])
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        (1,),
+        ("a", 0, b"", 0, []),
+        (1, 0, b"\x01" * 64, 0, [(1, 2, 3)]),
+        (1, 0, b"\x01" * 64, 0, [(1, [(b"\x01" * 64, 0)], [("x", 5, 6)])]),
+        (1, 0, b"\x01" * 64, 0, [(1, [], [(5, "x")])]),
+        (1, 0, b"\x01" * 64, True, []),
+    ],
+)
+def test_wrong_shape_record(record: tuple[object, ...]) -> None:
+    """
+    Tests that records that unpack but don't have the fields of a block are rejected.
+    """
+    with pytest.raises(SerializationError):
+        decode_block(_pack(record))
+
+
+def test_wrong_length_digest() -> None:
+    """
+    Tests that digests of the wrong length are rejected rather than padded.
+    """
+    with pytest.raises(SerializationError):
+        decode_block(_pack((1, 0, b"\x01", 0, [])))
+
+    with pytest.raises(SerializationError):
+        decode_block(_pack((1, 0, b"\x01" * 64, 0, [(1, [(b"ab", 0)], [("x", 5)])])))
+
+    with pytest.raises(SerializationError):
+        decode_header(_pack((1, 0, b"\x01" * 64, b"\x01" * 63, 0)))
+
+    with pytest.raises(SerializationError):
+        decode_coins(_pack(((b"", 0, "x", 5, 1),)))
+
+    # an int would otherwise be taken as a count of zero bytes
+    with pytest.raises(SerializationError):
+        decode_headers(_pack(((1, 0, 64, b"\x01" * 64, 0),)))
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        (1, 0, b"\x01" * 64, -5, []),
+        (1, 0, b"\x01" * 64, 0, [(1, [(b"\x01" * 64, -1)], [("x", 5)])]),
+        (1, 0, b"\x01" * 64, 0, [(1, [], [("x", -1)])]),
+    ],
+)
+def test_out_of_range_integer(record: tuple[object, ...]) -> None:
+    """
+    Tests that integers that don't fit the 8 unsigned bytes they're hashed as are
+    rejected.
+    """
+    with pytest.raises(SerializationError):
+        decode_block(_pack(record))
@@ -0,0 +1,235 @@
+import hashlib
+import io
+from typing import Iterator, Optional
+
+import msgpack
+import pytest
+
+from domepieces import (
+    Blockchain,
+    BlockMismatchError,
+    Digest,
+    LevelDBUTXOStore,
+    MemoryBlockStore,
+    MemoryUTXOStore,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    UTXOStore,
+    generate_address,
+)
+from domepieces.snapshot import (
+    SNAPSHOT_MAGIC,
+    SNAPSHOT_VERSION,
+    SnapshotError,
+    export_snapshot,
+    import_snapshot,
+    utxo_commitment,
+)
+from domepieces.storage import open_db
+
+from .common import NO_DIFFICULTY, child
+
+
+@pytest.fixture(params=["memory", "leveldb"])
+def store(request: pytest.FixtureRequest, db_path: str) -> Iterator[UTXOStore]:
+    if request.param == "memory":
+        yield MemoryUTXOStore()
+        return
+
+    with open_db(db_path) as db:
+        yield LevelDBUTXOStore(db)
+
+
+def build_chain() -> Blockchain:
+    """
+    Builds a chain where each block also spends one output of its parent's coinbase.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    chain.add_block(child(chain.head))
+    for _ in range(5):
+        parent = chain.head
+        spend = Transaction(
+            height=parent.height + 1,
+            inputs=[TransactionInput(parent.transactions[0].hash, 0)],
+            outputs=[TransactionOutput(generate_address(), 10)],
+        )
+        chain.add_block(child(parent, spend))
+    return chain
+
+
+def export(utxos: UTXOStore, chunk_size: int = 3) -> bytes:
+    file = io.BytesIO()
+    export_snapshot(utxos, file, chunk_size=chunk_size)
+    return file.getvalue()
+
+
+def test_round_trip(store: UTXOStore) -> None:
+    """
+    Tests that importing a snapshot recreates the exported utxo set.
+    """
+    chain = build_chain()
+    file = io.BytesIO()
+    info = export_snapshot(chain.utxos, file, chunk_size=3)
+
+    assert info.block_hash == chain.head.hash
+    assert info.coin_count == len(chain.utxos)
+    assert info.commitment == utxo_commitment(chain.utxos)
+
+    file.seek(0)
+    assert import_snapshot(file, store, commitment=info.commitment) == info
+
+    assert store.best_block == chain.head.hash
+    assert list(store.iter_sorted()) == list(chain.utxos.iter_sorted())
+    assert store.balances() == chain.balances()
+    assert utxo_commitment(store) == info.commitment
+
+
+def test_commitment_ignores_chunk_size() -> None:
+    """
+    Tests that the commitment only depends on the coins, not how they were chunked.
+    """
+    chain = build_chain()
+    one = export(chain.utxos, chunk_size=1)
+    many = export(chain.utxos, chunk_size=1000)
+
+    assert one != many
+    assert one[-64:] == many[-64:]
+
+
+def test_bootstrap_from_snapshot() -> None:
+    """
+    Tests that a chain bootstrapped from a snapshot starts at the snapshot's block,
+    can keep adding blocks, and matches a chain that replayed every block.
+    """
+    source = build_chain()
+    snapshot = export(source.utxos)
+
+    # the blocks themselves, without having applied any of them to a utxo set
+    blocks = MemoryBlockStore()
+    for block in source.blocks:
+        blocks.append(block, NO_DIFFICULTY.initial_target)
+
+    utxos = MemoryUTXOStore()
+    info = import_snapshot(io.BytesIO(snapshot), utxos)
+    chain = Blockchain(NO_DIFFICULTY, block_store=blocks, utxo_store=utxos)
+
+    assert chain.head == source.head
+    assert chain.balances() == source.balances()
+
+    block = child(chain.head)
+    chain.add_block(block)
+    source.add_block(block)
+    assert utxo_commitment(chain.utxos) == utxo_commitment(source.utxos)
+
+    # validating the history later, by replaying it into a fresh store
+    replayed = MemoryUTXOStore()
+    Blockchain(NO_DIFFICULTY, block_store=blocks, utxo_store=replayed)
+    assert utxo_commitment(replayed) == utxo_commitment(chain.utxos)
+    assert utxo_commitment(replayed) != info.commitment
+
+
+def test_reorganize_after_bootstrap() -> None:
+    """
+    Tests that a chain bootstrapped from a snapshot refuses forks below the blocks it
+    has undo records for, rather than failing partway through a reorganization.
+    """
+    source = build_chain()
+    blocks = MemoryBlockStore()
+    for block in source.blocks:
+        blocks.append(block, NO_DIFFICULTY.initial_target)
+
+    utxos = MemoryUTXOStore()
+    import_snapshot(io.BytesIO(export(source.utxos)), utxos)
+    chain = Blockchain(NO_DIFFICULTY, block_store=blocks, utxo_store=utxos)
+    snapshot_block = chain.head
+
+    fork = child(chain.blocks[snapshot_block.height - 1])
+    with pytest.raises(BlockMismatchError) as exc:
+        chain.add_block(fork)
+    assert str(exc.value) == (
+        f"{fork} forks 1 blocks below the head, deeper than the 0 blocks that can "
+        "be undone."
+    )
+    assert chain.side_blocks == {}
+
+    # blocks added since the snapshot can be undone
+    chain.add_block(child(snapshot_block))
+    branch = child(snapshot_block)
+    chain.add_block(branch)
+    tip = child(branch)
+    chain.add_block(tip)
+    assert chain.head == tip
+
+
+def test_bad_snapshots() -> None:
+    """
+    Tests that corrupted, truncated or unexpected snapshots are rejected, and leave
+    the store without a best block.
+    """
+    chain = build_chain()
+    snapshot = export(chain.utxos)
+
+    def load(data: bytes, commitment: Optional[Digest] = None) -> None:
+        utxos = MemoryUTXOStore()
+        with pytest.raises(SnapshotError):
+            import_snapshot(io.BytesIO(data), utxos, commitment=commitment)
+        assert utxos.best_block is None
+
+    # a recipient's address changed in the first chunk
+    position = snapshot.index(b"dca:") + 5
+    corrupted = bytearray(snapshot)
+    corrupted[position] ^= 1
+    load(bytes(corrupted))
+
+    load(snapshot[:-10])
+    load(b"not" + snapshot[3:])
+    load(snapshot, commitment=utxo_commitment(MemoryUTXOStore()))
+
+    # importing into a store that already has coins
+    utxos = MemoryUTXOStore()
+    import_snapshot(io.BytesIO(snapshot), utxos)
+    with pytest.raises(SnapshotError):
+        import_snapshot(io.BytesIO(snapshot), utxos)
+
+
+def test_invalid_coins() -> None:
+    """
+    Tests that a snapshot matching its own commitment is still rejected if a coin in
+    it isn't valid.
+    """
+
+    def snapshot(*coins: tuple[object, ...]) -> bytes:
+        chunk = b"".join(msgpack.packb(coin) for coin in coins)
+        header = msgpack.packb((b"\x01" * 64, len(coins)))
+        commitment = hashlib.blake2b(chunk, digest_size=64).digest()
+        return b"".join(
+            [
+                SNAPSHOT_MAGIC + bytes((SNAPSHOT_VERSION,)),
+                len(header).to_bytes(4, "big"),
+                header,
+                len(chunk).to_bytes(4, "big"),
+                chunk,
+                bytes(4),
+                commitment,
+            ]
+        )
+
+    address = generate_address()
+    valid = (b"\x02" * 64, 0, address, 10, 1)
+    utxos = MemoryUTXOStore()
+    import_snapshot(io.BytesIO(snapshot(valid)), utxos)
+    assert utxos.balance(address) == 10
+
+    for coin in [
+        # an int would otherwise be taken as a count of zero bytes
+        (5, 0, address, 10, 1),
+        (b"\x02" * 63, 0, address, 10, 1),
+        (b"\x02" * 64, -1, address, 10, 1),
+        (b"\x02" * 64, 0, 7, 10, 1),
+        (b"\x02" * 64, 0, address),
+    ]:
+        utxos = MemoryUTXOStore()
+        with pytest.raises(SnapshotError):
+            import_snapshot(io.BytesIO(snapshot(coin)), utxos)
+        assert utxos.best_block is None
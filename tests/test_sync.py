@@ -0,0 +1,159 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import pytest
+
+from domepieces import (
+    Block,
+    Blockchain,
+    Transaction,
+    TransactionError,
+    TransactionInput,
+    TransactionOutput,
+    check_block,
+    generate_address,
+)
+from domepieces.serialization import decode_block, encode_block
+
+from .common import NO_DIFFICULTY, child
+
+
+def build_chain(blocks: int) -> Blockchain:
+    """
+    Builds a chain where each block spends the previous block's coinbase.
+    """
+    chain = Blockchain(NO_DIFFICULTY)
+    for _ in range(blocks):
+        parent = chain.head
+        spend = Transaction(
+            height=parent.height + 1,
+            inputs=[TransactionInput(parent.transactions[0].hash, 0)],
+            outputs=[TransactionOutput(generate_address(), 5)],
+        )
+        chain.add_block(child(parent, spend))
+    return chain
+
+
+@pytest.mark.parametrize(
+    "make_executor",
+    [
+        lambda: None,
+        lambda: ThreadPoolExecutor(2),
+        lambda: ProcessPoolExecutor(2),
+    ],
+    ids=["sequential", "threads", "processes"],
+)
+def test_sync(make_executor: Callable[[], Optional[Executor]]) -> None:
+    """
+    Tests that syncing serialized blocks builds the same chain as adding them.
+    """
+    source = build_chain(12)
+    encoded = [encode_block(block) for block in list(source.blocks)[1:]]
+
+    chain = Blockchain(NO_DIFFICULTY)
+    executor = make_executor()
+    try:
+        added = chain.sync(encoded, executor=executor, batch_size=5, chunk_size=2)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    assert added == 12
+    assert list(chain.blocks) == list(source.blocks)
+    assert chain.balances() == source.balances()
+
+    # the hashes set from the workers match ones computed from scratch
+    for block in chain.blocks:
+        assert block.hash == decode_block(encode_block(block)).hash
+
+
+def test_sync_stops_at_invalid_block() -> None:
+    """
+    Tests that blocks before an invalid block are kept when syncing.
+    """
+    source = build_chain(3)
+    blocks = list(source.blocks)[1:]
+    # negative amounts can't even be decoded, so this one is at the wrong height
+    invalid = Block(
+        height=4,
+        proof=0,
+        transactions=[
+            Transaction(
+                height=3,
+                inputs=[],
+                outputs=[TransactionOutput(generate_address(), 1)],
+            )
+        ],
+        previous=blocks[-1].hash,
+    )
+
+    chain = Blockchain(NO_DIFFICULTY)
+    with ThreadPoolExecutor(2) as executor, pytest.raises(TransactionError):
+        chain.sync(
+            [encode_block(block) for block in blocks + [invalid]], executor=executor
+        )
+
+    assert chain.head == blocks[-1]
+
+
+def test_check_block() -> None:
+    """
+    Tests that check_block rejects negative outputs without needing a chain.
+    """
+    transaction = Transaction(
+        height=1,
+        inputs=[],
+        outputs=[TransactionOutput(generate_address(), -1)],
+    )
+    block = Block(
+        height=1,
+        proof=0,
+        transactions=[transaction],
+        previous=Block.genesis().hash,
+    )
+
+    with pytest.raises(TransactionError) as exc:
+        check_block(block)
+
+    assert str(exc.value) == "transaction #0 of block @ 1 has a negative output."
+
+
+def test_check_block_ranges() -> None:
+    """
+    Tests that check_block and add_block reject integers that don't fit the 8 bytes
+    they're hashed as.
+    """
+    genesis = Block.genesis()
+    address = generate_address()
+
+    def block(*, timestamp: int = 0, output_index: int = 0, amount: int = 1) -> Block:
+        transaction = Transaction(
+            height=1,
+            inputs=[TransactionInput(genesis.transactions[0].hash, output_index)],
+            outputs=[TransactionOutput(address, amount)],
+        )
+        return Block(
+            height=1,
+            proof=0,
+            transactions=[transaction],
+            previous=genesis.hash,
+            timestamp=timestamp,
+        )
+
+    with pytest.raises(TransactionError) as exc:
+        check_block(block(timestamp=-5))
+    assert str(exc.value) == (
+        "block @ 1 has a height, proof or timestamp out of range."
+    )
+
+    with pytest.raises(TransactionError) as exc:
+        check_block(block(output_index=-1))
+    assert str(exc.value) == (
+        "transaction #0 of block @ 1 has an input with an output index out of range."
+    )
+
+    with pytest.raises(TransactionError) as exc:
+        Blockchain(NO_DIFFICULTY).add_block(block(amount=2 ** 64))
+    assert str(exc.value) == (
+        "transaction #0 of block @ 1 has an output too large to hash."
+    )
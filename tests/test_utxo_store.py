@@ -0,0 +1,251 @@
+from typing import Iterator
+
+import pytest
+
+from domepieces import (
+    Block,
+    Blockchain,
+    Coin,
+    Digest,
+    LevelDBBlockStore,
+    LevelDBUTXOStore,
+    MemoryUTXOStore,
+    Transaction,
+    TransactionInput,
+    TransactionOutput,
+    UTXOStore,
+    generate_address,
+    zero_hash,
+)
+from domepieces.storage import open_db
+
+from .common import NO_DIFFICULTY
+
+BLOCK_HASH = Digest.fromhex("ab" * 64)
+OTHER_BLOCK_HASH = Digest.fromhex("cd" * 64)
+
+
+@pytest.fixture(params=["memory", "leveldb"])
+def store(request: pytest.FixtureRequest, db_path: str) -> Iterator[UTXOStore]:
+    if request.param == "memory":
+        yield MemoryUTXOStore()
+        return
+
+    with open_db(db_path) as db:
+        yield LevelDBUTXOStore(db, cache_size=2)
+
+
+def make_coins(address: str, amounts: list[int]) -> list[Coin]:
+    transaction = Transaction(
+        height=3,
+        inputs=[],
+        outputs=[TransactionOutput(address, amount) for amount in amounts],
+    )
+    return [Coin.from_transaction(transaction, i) for i in range(len(amounts))]
+
+
+def test_apply(store: UTXOStore) -> None:
+    """
+    Tests that coins can be added, looked up and spent.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    alice_coins = make_coins(alice, [10, 20, 30])
+    bob_coins = make_coins(bob, [5])
+
+    assert store.best_block is None
+
+    store.apply([], alice_coins + bob_coins, BLOCK_HASH)
+
+    assert len(store) == 4
+    assert store.best_block == BLOCK_HASH
+    assert store.get(alice_coins[1].outpoint) == alice_coins[1]
+    assert alice_coins[2].outpoint in store
+    assert sorted(store, key=lambda coin: coin.amount) == sorted(
+        alice_coins + bob_coins, key=lambda coin: coin.amount
+    )
+    assert store.balances() == {alice: 60, bob: 5}
+
+    store.apply([alice_coins[0].outpoint, bob_coins[0].outpoint], [], BLOCK_HASH)
+
+    assert len(store) == 2
+    assert store.get(alice_coins[0].outpoint) is None
+    assert alice_coins[0].outpoint not in store
+    assert sorted(coin.amount for coin in store.coins_for(alice)) == [20, 30]
+    assert list(store.coins_for(bob)) == []
+    assert store.balance(alice) == 50
+    assert store.balance(bob) == 0
+    assert store.balances() == {alice: 50}
+
+
+def test_leveldb_store_persists(db_path: str) -> None:
+    """
+    Tests that a LevelDB store picks up where it left off when reopened.
+    """
+    alice = generate_address()
+
+    with open_db(db_path) as db:
+        chain = Blockchain(
+            NO_DIFFICULTY,
+            utxo_store=LevelDBUTXOStore(db),
+            block_store=LevelDBBlockStore(db),
+        )
+        genesis_coinbase = chain.head.transactions[0]
+
+        chain.add_block(
+            Block(
+                height=1,
+                proof=0,
+                transactions=[
+                    Transaction(
+                        height=1,
+                        inputs=[TransactionInput(genesis_coinbase.hash, 0)],
+                        outputs=[TransactionOutput(alice, 50_00000000)],
+                    )
+                ],
+                previous=chain.head.hash,
+                timestamp=chain.head.timestamp + NO_DIFFICULTY.block_time,
+            )
+        )
+        head_hash = chain.head.hash
+
+    with open_db(db_path) as db:
+        store = LevelDBUTXOStore(db)
+
+        # the genesis block must not be applied to the store a second time
+        chain = Blockchain(
+            NO_DIFFICULTY, utxo_store=store, block_store=LevelDBBlockStore(db)
+        )
+
+        assert store.best_block == head_hash
+        assert len(store) == 1
+        assert chain.balances() == {alice: 50_00000000}
+
+
+def test_leveldb_cache_is_bounded(db_path: str) -> None:
+    """
+    Tests that the LRU cache never holds more than its size.
+    """
+    coins = make_coins(generate_address(), list(range(1, 11)))
+
+    with open_db(db_path) as db:
+        store = LevelDBUTXOStore(db, cache_size=3)
+        store.apply([], coins, BLOCK_HASH)
+
+        for coin in coins:
+            assert store.get(coin.outpoint) == coin
+            assert len(store.cache) <= 3
+
+        assert list(store.cache) == [coin.outpoint for coin in coins[-3:]]
+
+
+def test_apply_is_atomic(store: UTXOStore) -> None:
+    """
+    Tests that applying changes with an unknown spent outpoint changes nothing.
+    """
+    alice = generate_address()
+    coins = make_coins(alice, [10, 20])
+    store.apply([], coins[:1], BLOCK_HASH)
+
+    with pytest.raises(KeyError):
+        store.apply([coins[0].outpoint, coins[1].outpoint], [], OTHER_BLOCK_HASH)
+
+    assert list(store) == coins[:1]
+    assert store.balance(alice) == 10
+    assert store.best_block == BLOCK_HASH
+
+
+def test_revert(store: UTXOStore) -> None:
+    """
+    Tests that reverting a block removes its coins and restores the coins it spent.
+    """
+    alice = generate_address()
+    bob = generate_address()
+    alice_coins = make_coins(alice, [10, 20])
+    bob_coins = make_coins(bob, [30])
+
+    store.apply([], alice_coins, BLOCK_HASH)
+    store.apply([alice_coins[0].outpoint], bob_coins, OTHER_BLOCK_HASH)
+    assert store.balances() == {alice: 20, bob: 30}
+
+    store.revert([coin.outpoint for coin in bob_coins], BLOCK_HASH)
+
+    assert store.best_block == BLOCK_HASH
+    assert len(store) == 2
+    assert store.get(alice_coins[0].outpoint) == alice_coins[0]
+    assert bob_coins[0].outpoint not in store
+    assert store.balances() == {alice: 30}
+
+    store.revert([coin.outpoint for coin in alice_coins], zero_hash())
+    assert len(store) == 0
+
+    # there's no undo record for a block that was never applied
+    with pytest.raises(KeyError):
+        store.revert([], BLOCK_HASH)
+
+
+@pytest.mark.parametrize("kind", ["memory", "leveldb"])
+def test_undo_records_are_pruned(kind: str, db_path: str) -> None:
+    """
+    Tests that only the latest max_undo_depth blocks keep an undo record, including
+    after blocks are reverted and applied again.
+    """
+    with open_db(db_path) as db:
+        store: UTXOStore = (
+            MemoryUTXOStore(max_undo_depth=2)
+            if kind == "memory"
+            else LevelDBUTXOStore(db, max_undo_depth=2)
+        )
+        alice = generate_address()
+        coins = make_coins(alice, [10, 20, 30, 40])
+        hashes = [Digest(bytes([i]) * 64) for i in range(1, 6)]
+
+        assert store.undo_depth == 0
+        for coin, block_hash in zip(coins[:3], hashes):
+            store.apply([], [coin], block_hash)
+        assert store.undo_depth == 2
+
+        # replacing the last block doesn't prune the block before it
+        store.revert([coins[2].outpoint], hashes[1])
+        assert store.undo_depth == 1
+        store.apply([], [coins[3]], hashes[3])
+        store.apply([coins[0].outpoint], [], hashes[4])
+        assert store.undo_depth == 2
+
+        store.revert([], hashes[3])
+        store.revert([coins[3].outpoint], hashes[1])
+        assert store.balance(alice) == 30
+        assert store.undo_depth == 0
+        with pytest.raises(KeyError):
+            store.revert([coins[1].outpoint], hashes[0])
+
+        if isinstance(store, LevelDBUTXOStore):
+            assert list(store.undo_db.iterator(include_value=False)) == []
+            assert list(store.undo_order_db.iterator(include_value=False)) == []
+        else:
+            assert isinstance(store, MemoryUTXOStore)
+            assert store.undo == {}
+
+    with pytest.raises(ValueError):
+        MemoryUTXOStore(max_undo_depth=0)
+
+
+def test_load(store: UTXOStore) -> None:
+    """
+    Tests that loaded coins are indexed like applied ones, without an undo record,
+    and that sorted iteration follows outpoint order.
+    """
+    alice = generate_address()
+    coins = make_coins(alice, [10, 20]) + make_coins(generate_address(), [5, 6, 7])
+
+    store.load(coins[:2])
+    assert store.best_block is None
+
+    store.load(coins[2:], BLOCK_HASH)
+    assert store.best_block == BLOCK_HASH
+    assert len(store) == 5
+    assert store.balance(alice) == 30
+    assert list(store.iter_sorted()) == sorted(coins, key=lambda coin: coin.outpoint)
+
+    with pytest.raises(KeyError):
+        store.revert([], OTHER_BLOCK_HASH)